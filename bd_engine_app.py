@@ -1,134 +1,69 @@
-import streamlit as st
-import requests
-import pandas as pd
-import json
+import time
+_script_started = time.perf_counter()
+
 import os
 from datetime import datetime
-from urllib.parse import quote
-import pandas as pd
+
+import streamlit as st
 from dotenv import load_dotenv
 load_dotenv()
 
-from supabase import create_client, Client
-
-os.environ["STREAMLIT_WATCHDOG_USE_POLLING"] = "true"
-import json
-from supabase import create_client, Client
-from storage3.utils import StorageException
-
-from supabase_utils import supa_list_folders, supa_download_json, supa_upload_json, supa_upload_file, supa_upload_json, supa_upload_csv, supa_load_json
-
+from scrape_jobs import build_apollo_url, load_scrape_job, is_job_finished
+from lead_catalog import LeadCatalog
+from llm_utils import stream_chat_completion
+from lead_chat import load_chat, append_chat_turn, load_chat_summary, build_chat_context, fold_chat_history, CHAT_MODEL
+from job_queue import job_queue, ACTIVE_STATUSES, FINISHED_STATUSES, QUEUED, RUNNING, FAILED
+from photo_cache import photo_cache
+from metrics import metrics
 
+timings = {"imports": time.perf_counter() - _script_started}
+# Sessions share the process's metrics buffer; this session's calls carry its scope
+if "metrics_scope" not in st.session_state:
+    st.session_state["metrics_scope"] = os.urandom(8).hex()
+metrics.set_scope(st.session_state["metrics_scope"])
+metrics_mark = metrics.mark()
 
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-
-def supa_read_json(bucket: str, path: str):
-    try:
-        res = supabase.storage.from_(bucket).download(path)
-        return json.loads(res.decode("utf-8"))
-    except StorageException as e:
-        print(f"[supa_read_json] Failed to read {path}: {e}")
-        return None
-    except Exception as e:
-        print(f"[supa_read_json] Unknown error: {e}")
-        return None
-
-
-def supa_write_json(bucket: str, path: str, data: dict):
-    try:
-        return supabase.storage.from_(bucket).upload(
-            path,
-            json.dumps(data, indent=2),
-            {"content-type": "application/json"},
-            upsert=True
-        )
-    except Exception as e:
-        print(f"[supa_write_json] Failed to write {path}: {e}")
-        return None
-
-
-def supa_read_text(bucket: str, path: str):
-    try:
-        res = supabase.storage.from_(bucket).download(path)
-        return res.decode("utf-8")
-    except StorageException as e:
-        print(f"[supa_read_text] Failed to read {path}: {e}")
-        return None
-
-
-def supa_write_text(bucket: str, path: str, text: str):
-    try:
-        return supabase.storage.from_(bucket).upload(
-            path,
-            text,
-            {"content-type": "text/plain"},
-            upsert=True
-        )
-    except Exception as e:
-        print(f"[supa_write_text] Failed to write {path}: {e}")
-        return None
-
+st.set_page_config(page_title="BD Engine", layout="wide")
 
-def supa_list_folders(bucket: str, prefix: str = ""):
-    try:
-        response = supabase.storage.from_(bucket).list(path=prefix)
-        if response is None:
-            print(f"[supa_list_folders] Got None for prefix: {prefix}")
-            return []
-        
-        print(f"[supa_list_folders] Response for '{prefix}':", response)
+st.image("assets/tp_logo.svg")
 
-        # Treat items without a dot (.) as folders
-        folders = [item['name'] for item in response if '.' not in item['name']]
-        return folders
 
-    except Exception as e:
-        print(f"[supa_list_folders] Error: {e}")
-        return []
+# os.makedirs("leads", exist_ok=True)
 
 
+PAGE_SIZES = [10, 25, 50, 100]
 
-st.set_page_config(page_title="BD Engine", layout="wide")
 
-st.image("assets/tp_logo.svg")
+def paginate(items, key, default_page_size=int(os.getenv("BD_PAGE_SIZE", "25"))):
+    # Page number and size live in session_state so they survive reruns; the
+    # page is clamped when a filter shrinks the list underneath it.
+    if not items:
+        return items
+    size_key, page_key = f"{key}_page_size", f"{key}_page"
+    if size_key not in st.session_state:
+        st.session_state[size_key] = default_page_size if default_page_size in PAGE_SIZES else PAGE_SIZES[1]
+    page_size = st.session_state[size_key]
+    page_count = max(1, -(-len(items) // page_size))
+    page = min(st.session_state.get(page_key, 1), page_count)
 
+    nav = st.columns([1, 1, 3, 2])
+    if nav[0].button("◀ Prev", key=f"{key}_prev", disabled=page <= 1):
+        page -= 1
+    if nav[1].button("Next ▶", key=f"{key}_next", disabled=page >= page_count):
+        page += 1
+    st.session_state[page_key] = page
+    nav[2].markdown(f"Page **{page}** of **{page_count}** ({len(items)} leads)")
+    nav[3].selectbox("Per page", PAGE_SIZES, key=size_key, label_visibility="collapsed")
 
-# os.makedirs("leads", exist_ok=True)
+    start = (page - 1) * page_size
+    return items[start:start + page_size]
 
 
-def fetch_linkedin_posts(linkedin_url, lead_dir):
-    try:
-        AGENT_ID = os.getenv("AGENT_ID")
-        AUTH_TOKEN = os.getenv("AUTH_TOKEN")
-        if not AGENT_ID or not AUTH_TOKEN:
-            raise ValueError("Missing AGENT_ID or AUTH_TOKEN in environment variables")
-
-        endpoint = f"https://api.tryrelevance.com/latest/agents/{AGENT_ID}/query"
-
-        headers = {
-            "Authorization": f"Bearer {AUTH_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "inputs": {
-                "linkedin_url": linkedin_url
-            }
-        }
-
-        res = requests.post(endpoint, headers=headers, json=payload, timeout=30)
-        res.raise_for_status()
-        posts = res.json().get("posts", [])
-        # Save to file
-        with open(os.path.join(lead_dir, "linkedin_posts.json"), "w") as f:
-            json.dump(posts, f, indent=2)
-        return posts
-    except Exception as e:
-        print("Post fetch error:", e)
-        return []
+def lead_row_opened(label, key):
+    # Stand-in for st.expander, whose body runs even when collapsed: the
+    # details (photo, persona, email status) are only built once toggled open.
+    return st.toggle(label, key=key)
 
 
 def render_persona(persona):
@@ -170,7 +105,90 @@ def render_persona(persona):
     st.markdown(f"> {persona.get('summary', '-')}")
 
 
+# Scrapes and persona/email generation run in worker.py processes; the page
+# submits jobs and these fragments poll their status
+JOB_POLL_SECONDS = float(os.getenv("BD_JOB_POLL_SECONDS", "2"))
+JOB_LABELS = {"scrape": "Scrape", "persona": "Persona", "persona_batch": "Persona batch", "email": "Cold email", "email_batch": "Cold email batch"}
+
 
+def render_job(job, key):
+    progress = job.get("progress") or {}
+    label = f"{JOB_LABELS.get(job['kind'], job['kind'])} job #{job['id']}: {job['status']}"
+    if job["status"] == RUNNING and progress.get("total"):
+        st.progress(min(progress["done"] / progress["total"], 1.0), text=label)
+    else:
+        st.markdown(f"**{label}**")
+    if progress.get("message"):
+        st.caption(progress["message"])
+    if job["status"] == QUEUED and job["error"]:
+        st.caption(f"Retrying (attempt {job['attempts'] + 1} of {job['max_attempts']}) after: {job['error']}")
+    elif job["status"] == FAILED:
+        st.error(job["error"])
+    errors = (job.get("result") or {}).get("errors")
+    if errors:
+        with st.expander(f"Errors ({len(errors)})"):
+            for name, error in errors.items():
+                st.caption(f"{name}: {error}")
+    # A running job past its last cancel check reports cancellable: False
+    if job["status"] in ACTIVE_STATUSES and progress.get("cancellable", True):
+        if job["cancel_requested"]:
+            st.caption("Cancelling...")
+        elif st.button("Cancel", key=f"cancel_{key}_{job['id']}"):
+            job_queue.cancel(job["id"])
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_jobs(dedupe_key):
+    # Latest job for this key, refreshed in place while it runs
+    jobs = job_queue.list(dedupe_key=dedupe_key, limit=1)
+    if jobs:
+        render_job(jobs[0], dedupe_key)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def watch_jobs():
+    # When jobs finish, reloads the dates they wrote and reruns the page
+    checked_at = st.session_state.setdefault("jobs_checked_at", time.time())
+    finished = job_queue.list(statuses=FINISHED_STATUSES, since=checked_at, limit=200)
+    active = job_queue.list(statuses=ACTIVE_STATUSES, limit=200)
+    workers = job_queue.live_workers()
+
+    with st.expander(f"Background jobs ({len(active)} active, {len(workers)} worker(s))", expanded=bool(active)):
+        if active and not workers:
+            st.warning("Jobs are waiting but no worker is running. Start one with `python worker.py`.")
+        for job in active[:10]:
+            render_job(job, "sidebar")
+
+    if finished:
+        st.session_state["jobs_checked_at"] = max(job["finished_at"] for job in finished) + 1e-6
+        dates = {date for job in finished for date in ((job["result"] or {}).get("dates") or [job["payload"].get("date")]) if date}
+        for date in sorted(dates):
+            lead_catalog.reload(date, revalidate=True)
+        st.rerun()
+
+
+
+
+
+@st.cache_resource
+def get_lead_catalog():
+    return LeadCatalog("leads")
+
+
+# One catalog per process; every tab reads from it instead of walking the bucket
+catalog_started = time.perf_counter()
+lead_catalog = get_lead_catalog()
+lead_catalog.refresh()
+timings["catalog"] = time.perf_counter() - catalog_started
+
+if st.sidebar.button("Sync lead catalog"):
+    synced_dates = lead_catalog.sync_with_manifest()
+    st.sidebar.caption(f"Reloaded {len(synced_dates)} scrape date(s).")
+
+with st.sidebar:
+    watch_jobs()
+# Queued/running jobs by dedupe key, e.g. "persona:<path>", for per-lead state
+active_jobs = job_queue.active()
 
 
 tab1, tab2, tab3, tab4 = st.tabs(["Dashboard", "Scrape Leads", "Persona Dashboard", "Talk To Leads"])
@@ -179,135 +197,118 @@ tab1, tab2, tab3, tab4 = st.tabs(["Dashboard", "Scrape Leads", "Persona Dashboar
 with tab1:
     st.subheader("Scraped Leads Dashboard")
 
-    dates = sorted(supa_list_folders("leads"), reverse=True)
+    dates = lead_catalog.dates
 
     if not dates:
         st.info("No scrapes found. Run a scrape from the second tab.")
     else:
         selected_date = st.selectbox("Select Scrape Date", dates)
 
-        lead_dirs = sorted(supa_list_folders("leads", prefix=f"{selected_date}/"))
-
-        search_term = st.text_input("Search (name, email, company, title)", "").strip().lower()
-
-        if not lead_dirs:
+        index_entries = lead_catalog.index(selected_date)
+
+        missing_personas = [e for e in index_entries.values() if not e.get("has_persona")]
+        if missing_personas:
+            with st.expander(f"Build personas for all leads in this scrape ({len(missing_personas)} without one)"):
+                batch_cols = st.columns(3)
+                concurrency = batch_cols[0].number_input("Concurrency", 1, 32, 4)
+                rpm = batch_cols[1].number_input("Requests / min", 1, 10000, int(os.getenv("OPENAI_RPM", "60")))
+                tpm = batch_cols[2].number_input("Tokens / min", 1000, 10000000, int(os.getenv("OPENAI_TPM", "40000")))
+                persona_batch_key = f"persona_batch:{selected_date}"
+                if st.button("Build all personas", disabled=persona_batch_key in active_jobs):
+                    job_queue.submit(
+                        "persona_batch",
+                        {"date": selected_date, "concurrency": concurrency, "rpm": rpm, "tpm": tpm},
+                        dedupe_key=persona_batch_key
+                    )
+                render_jobs(persona_batch_key)
+
+        if st.toggle("Show lead analytics", key=f"analytics_{selected_date}"):
+            # Reads only these columns of the date's Parquet partition;
+            # pyarrow is imported on first use. Only the scrape's own rows:
+            # a CSV imported for the same date repeats its leads.
+            from lead_store import sync_partitions, build_partition, query_df, SCRAPE_SOURCE
+            analytics_columns = ["seniority", "industry"]
+            analytics_filters = {"source": SCRAPE_SOURCE}
+            sync_partitions([selected_date])
+            analytics_df = query_df(columns=analytics_columns, filters=analytics_filters, dates=[selected_date])
+            if analytics_df.empty:
+                build_partition(selected_date)
+                analytics_df = query_df(columns=analytics_columns, filters=analytics_filters, dates=[selected_date])
+            metric_cols = st.columns(3)
+            metric_cols[0].metric("Leads", len(analytics_df))
+            # Enrichment state changes after ingestion; the index is current
+            metric_cols[1].metric("With persona", sum(1 for e in index_entries.values() if e.get("has_persona")))
+            metric_cols[2].metric("With email", sum(1 for e in index_entries.values() if e.get("has_email_status")))
+            chart_cols = st.columns(2)
+            chart_cols[0].bar_chart(analytics_df["seniority"].fillna("unknown").value_counts())
+            chart_cols[1].bar_chart(analytics_df["industry"].fillna("unknown").value_counts().head(15))
+
+        search_index = lead_catalog.search_index(selected_date)
+        search_term = st.text_input("Search (name, email, company, title, skills, tags)", "").strip()
+
+        facet_filters = {}
+        facet_labels = {"seniority": "Seniority", "departments": "Department", "industry": "Industry", "city": "City", "country": "Country"}
+        facet_cols = st.columns(len(facet_labels))
+        for col, (facet, label) in zip(facet_cols, facet_labels.items()):
+            facet_filters[facet] = col.multiselect(label, sorted(search_index.facets[facet]), key=f"facet_{facet}")
+
+        search_started = time.perf_counter()
+        matched_entries, facet_counts = search_index.search(search_term, facet_filters)
+        search_ms = (time.perf_counter() - search_started) * 1000
+
+        if not index_entries:
             st.warning("No leads found in this folder.")
         else:
-            matches = 0
-            for lead_name in lead_dirs:
-                lead_path = f"{selected_date}/{lead_name}/lead.json"
-                persona_path = f"{selected_date}/{lead_name}/persona.json"
-
-                lead = supa_download_json("leads", lead_path)
-                persona = supa_download_json("leads", persona_path)
-
-                if not lead:
-                    continue
-
-                emp = next((e for e in lead.get("employment_history", []) if e.get("current")), {})
-                full_name = f"{lead.get('first_name', '')} {lead.get('last_name', '')}"
-                email = lead.get("email", "")
-                company = emp.get("organization_name", "")
-                title = emp.get("title", "")
-                searchable = f"{full_name} {email} {company} {title}".lower()
-
-                if search_term and search_term not in searchable:
-                    continue
-
-                matches += 1
-                photo = lead.get("photo_url", "")
-
-                with st.expander(f"{full_name} - {title} @ {company}"):
+            st.caption(f"{len(matched_entries)} of {len(index_entries)} leads match ({search_ms:.1f} ms)")
+            with st.expander("Facet counts"):
+                count_cols = st.columns(len(facet_labels))
+                for col, (facet, label) in zip(count_cols, facet_labels.items()):
+                    col.markdown(f"**{label}**")
+                    for value, count in sorted(facet_counts[facet].items(), key=lambda kv: -kv[1])[:10]:
+                        col.write(f"{value} ({count})")
+
+            matches = len(matched_entries)
+            page_entries = paginate(matched_entries, key=f"dashboard_{selected_date}")
+            photo_cache.prefetch(page_entries)
+            for entry in page_entries:
+                lead_name = entry["folder"]
+                persona = entry.get("persona")
+
+                full_name = entry["name"]
+                email = entry["email"]
+                company = entry["company"]
+                title = entry["title"]
+
+                with st.container(border=True):
+                    if not lead_row_opened(f"{full_name} - {title} @ {company}", key=f"open_{selected_date}_{lead_name}"):
+                        continue
                     cols = st.columns([1, 3])
                     with cols[0]:
+                        photo = photo_cache.get(entry["path"], entry.get("photo_url"), timeout=2)
                         if photo:
                             st.image(photo, width=100)
+                        elif entry.get("photo_url"):
+                            st.caption("Loading photo...")
                     with cols[1]:
                         st.markdown(f"**Email:** {email}")
-                        st.markdown(f"**LinkedIn:** [{lead.get('linkedin_url', '')}]({lead.get('linkedin_url', '')})")
-                        st.markdown(f"**Location:** {lead.get('city', '')}, {lead.get('state', '')}, {lead.get('country', '')}")
-                        st.markdown(f"**Seniority:** {lead.get('seniority', '')}")
-                        st.markdown(f"**Industry:** {lead.get('industry', '')}")
-                        st.markdown(f"**Departments:** {', '.join(lead.get('departments', []))}")
+                        st.markdown(f"**LinkedIn:** [{entry.get('linkedin_url', '')}]({entry.get('linkedin_url', '')})")
+                        st.markdown(f"**Location:** {entry.get('city', '')}, {entry.get('state', '')}, {entry.get('country', '')}")
+                        st.markdown(f"**Seniority:** {entry.get('seniority', '')}")
+                        st.markdown(f"**Industry:** {entry.get('industry', '')}")
+                        st.markdown(f"**Departments:** {', '.join(entry.get('departments', []))}")
 
                     if persona:
                         st.markdown("---")
                         st.markdown("**Persona:**")
                         render_persona(persona)
                     else:
-                        if st.button(f"Build Persona for {full_name}", key=f"btn_{lead_name}"):
-                            from dotenv import load_dotenv
-                            from openai import OpenAI
-                            load_dotenv()
-                            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-                            linkedin_url = lead.get("linkedin_url", "")
-                            posts = fetch_linkedin_posts(linkedin_url, f"{selected_date}/{lead_name}")
-                            post_snippets = "\n".join(posts[:5]) if posts else "No public posts available."
-
-                            org = lead.get("organization", {})
-                            skills = ', '.join(lead.get("skills", [])[:10])
-                            tags = ', '.join(lead.get("tags", [])[:10])
-                            keywords = ', '.join(org.get("keywords", [])[:15])
-                            bio = lead.get("summary", "") or lead.get("bio", "")
-
-                            prompt = f"""
-                                You are an advanced persona modeling system for B2B outreach.
-
-                                Given the full professional and public-facing information of a lead, construct a complete **behavioral persona** that can be used to simulate realistic conversations and generate personalized communication.
-
-                                --- Personal Info ---
-                                Name: {full_name}
-                                Title: {title}
-                                Seniority: {lead.get("seniority", "")}
-                                Department: {', '.join(lead.get("departments", []))}
-                                Skills: {skills}
-                                Tags: {tags}
-                                Bio: {bio}
-                                Location: {lead.get("city", "")}, {lead.get("state", "")}, {lead.get("country", "")}
-                                LinkedIn: {linkedin_url}
-
-                                --- Company Info ---
-                                Company: {company}
-                                Industry: {org.get("industry", "")}
-                                Company Size: {org.get("estimated_num_employees", "")} employees
-                                Company Keywords: {keywords}
-
-                                --- Writing Samples from LinkedIn Posts ---
-                                {post_snippets}
-
-                                --- Output Format ---
-                                {{
-                                "persona_type": "...",
-                                "communication_style": "...",
-                                "tone_profile": "...",
-                                "writing_style": "...",
-                                "key_interests": [...],
-                                "decision_drivers": [...],
-                                "objection_style": "...",
-                                "example_phrases": [...],
-                                "summary": "..."
-                                }}
-                            """
-
-                            try:
-                                response = client.chat.completions.create(
-                                    model="gpt-4",
-                                    messages=[{"role": "user", "content": prompt}],
-                                    temperature=0.7
-                                )
-
-                                content = response.choices[0].message.content
-                                persona = json.loads(content)
-
-                                # Save persona to Supabase
-                                supa_upload_json("leads", persona_path, persona)
-
-                                st.success("Persona generated and saved.")
-                                render_persona(persona)
-
-                            except Exception as e:
-                                st.error(f"Persona build failed: {e}")
+                        persona_key = f"persona:{entry['path']}"
+                        if persona_key in active_jobs:
+                            st.caption(f"Persona job {active_jobs[persona_key]['status']}; it appears here once built.")
+                        elif st.button(f"Build Persona for {full_name}", key=f"btn_{selected_date}/{lead_name}"):
+                            # Single leads jump ahead of batch work
+                            job_queue.submit("persona", {"date": selected_date, "folder": lead_name}, priority=10, dedupe_key=persona_key)
+                            st.info("Persona queued; it appears here once built.")
 
             if matches == 0:
                 st.warning("No leads matched your search.")
@@ -320,10 +321,14 @@ with tab1:
 with tab2:
     st.subheader("Scrape New Leads")
 
-    def add_query_param(name, values, query_parts):
-        for v in values:
-            encoded = quote(v.strip())
-            query_parts.append(f"{name}[]={encoded}")
+    def submit_scrape(date, search_url, total_records=500):
+        # The worker resumes the date's unfinished Apify run for the same search
+        job_queue.submit(
+            "scrape",
+            {"date": date, "search_url": search_url, "total_records": total_records},
+            priority=5,
+            dedupe_key=f"scrape:{date}"
+        )
 
     with st.form("lead_form"):
         locations = st.text_input("Locations (comma-separated)", "Mumbai, Bangalore")
@@ -331,148 +336,77 @@ with tab2:
         job_titles = st.text_input("Job Titles (comma-separated)", "Founder, CMO")
         submit = st.form_submit_button("Scrape Leads")
 
-    if submit:
-        with st.spinner("Scraping leads..."):
-
-            query = {
-                "location": [x.strip() for x in locations.split(",")],
-                "business": [x.strip() for x in businesses.split(",")],
-                "job_title": [x.strip() for x in job_titles.split(",")]
-            }
-
-            base_url = "https://app.apollo.io/#/people"
-            query_parts = []
-
-            add_query_param("personLocations", query["location"], query_parts)
-            add_query_param("qOrganizationKeywordTags", query["business"], query_parts)
-            add_query_param("personTitles", query["job_title"], query_parts)
-            query_parts += [
-                "sortByField=recommendations_score",
-                "sortAscending=false",
-                "page=1"
-            ]
-
-            final_url = f"{base_url}?{'&'.join(query_parts)}"
-            st.markdown(f"[Apollo Search URL]({final_url})")
-
-            TOKEN_APIFY = os.getenv("APIFY_TOKEN")
-
-            apify_url = f"https://api.apify.com/v2/acts/code_crafter~apollo-io-scraper/run-sync-get-dataset-items?token={TOKEN_APIFY}"
-
-            payload = {
-                "getPersonalEmails": True,
-                "getWorkEmails": True,
-                "totalRecords": 500,
-                "url": final_url
-            }
-
-            response = requests.post(apify_url, json=payload)
-
-            if response.ok:
-                leads = response.json()
-
-                # Create path prefix for today
-                today = datetime.now().strftime("%Y-%m-%d")
-                bucket = "leads"
-                prefix = f"{today}"
-
-                df_rows = []
-
-                for lead in leads:
-                    full_name = f"{lead.get('first_name', '')} {lead.get('last_name', '')}".replace("/", "-")
-                    emp = next((e for e in lead.get("employment_history", []) if e.get("current")), {})
-                    phone_list = [p.get("number", "") for p in lead.get("phone_numbers", [])]
-
-                    lead_subpath = f"{prefix}/{full_name}"
-
-                    # Upload lead.json
-                    supa_upload_json(bucket, f"{lead_subpath}/lead.json", lead)
-
-                    row = {
-                        "Full Name": full_name,
-                        "Title": emp.get("title", ""),
-                        "Company": emp.get("organization_name", ""),
-                        "Email": lead.get("email", ""),
-                        "LinkedIn": lead.get("linkedin_url", ""),
-                        "City": lead.get("city", ""),
-                        "State": lead.get("state", ""),
-                        "Country": lead.get("country", ""),
-                        "Seniority": lead.get("seniority", ""),
-                        "Department": ', '.join(lead.get("departments", [])),
-                        "Industry": lead.get("industry", ""),
-                        "Skills": ', '.join(lead.get("skills", [])),
-                        "Tags": ', '.join(lead.get("tags", [])),
-                        "Phone Numbers": ', '.join(phone_list)
-                    }
+    today = datetime.now().strftime("%Y-%m-%d")
+    scrape_key = f"scrape:{today}"
 
-                    df_rows.append(row)
-
-                    # Upload meta.csv for each lead
-                    meta_df = pd.DataFrame([row])
-                    supa_upload_csv(bucket, f"{lead_subpath}/meta.csv", meta_df)
-
-                # Upload combined CSV
-                full_df = pd.DataFrame(df_rows)
-                supa_upload_csv(bucket, f"{prefix}/combined.csv", full_df)
-
-                st.success(f"Scrape complete. {len(leads)} leads uploaded to Supabase under leads/{today}/")
+    if submit:
+        final_url = build_apollo_url(
+            [x.strip() for x in locations.split(",")],
+            [x.strip() for x in businesses.split(",")],
+            [x.strip() for x in job_titles.split(",")]
+        )
+        st.markdown(f"[Apollo Search URL]({final_url})")
+        if scrape_key in active_jobs:
+            st.warning(f"A scrape for {today} is already {active_jobs[scrape_key]['status']}.")
+        else:
+            submit_scrape(today, final_url)
+    elif scrape_key not in active_jobs:
+        # Offer to resume a scrape that was interrupted by a restart
+        pending_job = load_scrape_job(today)
+        if pending_job and not is_job_finished(pending_job):
+            st.info(f"An unfinished scrape for {today} stopped at {pending_job['offset']} leads.")
+            if st.button("Resume scrape"):
+                submit_scrape(today, pending_job["search_url"], pending_job.get("total_records", 500))
 
-            else:
-                st.error("Failed to fetch leads from Apify.")
-                st.text(response.text)
+    render_jobs(scrape_key)
 
 
 # -----------------------------------------
 # TAB 3: PERSONA DASHBOARD
 # -----------------------------------------
 with tab3:
-    case_study_df = pd.read_csv("case_studies.csv")
-
     st.subheader("All Leads with Personas")
 
     bucket = "leads"
-    all_entries = []
-
-    for date_folder in sorted(supa_list_folders(bucket), reverse=True):
-        for lead_folder in supa_list_folders(bucket, prefix=f"{date_folder}/"):
-            lead_path = f"{date_folder}/{lead_folder}/lead.json"
-            persona_path = f"{date_folder}/{lead_folder}/persona.json"
-
-            lead = supa_load_json("leads", lead_path)
-            persona = supa_load_json("leads", persona_path)
-
-            if lead and persona:
-                emp = next((e for e in lead.get("employment_history", []) if e.get("current")), {})
-                full_name = f"{lead.get('first_name', '')} {lead.get('last_name', '')}"
-                company = emp.get("organization_name", "")
-                title = emp.get("title", "")
-                email = lead.get("email", "")
-                photo_url = lead.get("photo_url") or ""
-                linkedin_url = lead.get("linkedin_url")
-
-                all_entries.append({
-                    "name": full_name,
-                    "title": title,
-                    "company": company,
-                    "email": email,
-                    "photo_url": photo_url,
-                    "linkedin_url": linkedin_url,
-                    "persona": persona,
-                    "date": date_folder
-                })
-
+    all_entries = lead_catalog.with_persona()
+
+    missing_emails = lead_catalog.without_email_status()
+    if missing_emails:
+        with st.expander(f"Generate emails for all leads without one ({len(missing_emails)})"):
+            email_cols = st.columns(3)
+            email_concurrency = email_cols[0].number_input("Concurrency", 1, 32, 4, key="email_concurrency")
+            email_rpm = email_cols[1].number_input("Requests / min", 1, 10000, int(os.getenv("OPENAI_RPM", "60")), key="email_rpm")
+            email_tpm = email_cols[2].number_input("Tokens / min", 1000, 10000000, int(os.getenv("OPENAI_TPM", "40000")), key="email_tpm")
+            email_batch_key = "email_batch:all"
+            if st.button("Generate all cold emails", disabled=email_batch_key in active_jobs):
+                job_queue.submit(
+                    "email_batch",
+                    {"date": None, "concurrency": email_concurrency, "rpm": email_rpm, "tpm": email_tpm},
+                    dedupe_key=email_batch_key
+                )
+            render_jobs(email_batch_key)
 
     if not all_entries:
         st.info("No personas found yet.")
     else:
-       for entry in all_entries:
-            with st.expander(f"{entry['name']} - {entry['title']} @ {entry['company']}"):
+        page_entries = paginate(all_entries, key="persona_dashboard")
+        photo_cache.prefetch(page_entries)
+        for entry in page_entries:
+            # Keyed by date/folder: names repeat, and an unchanged re-scrape
+            # shares its path with the earlier date's entry
+            row_key = f"{entry['date']}/{entry['folder']}"
+            with st.container(border=True):
+                if not lead_row_opened(f"{entry['name']} - {entry['title']} @ {entry['company']}", key=f"persona_open_{row_key}"):
+                    continue
                 cols = st.columns([1, 4])
 
                 # -- LEFT COLUMN: Profile Image --
                 with cols[0]:
-                    if entry.get("photo_url"):
-                        st.image(entry["photo_url"], width=100)
+                    photo = photo_cache.get(entry["path"], entry.get("photo_url"), timeout=2)
+                    if photo:
+                        st.image(photo, width=100)
+                    elif entry.get("photo_url"):
+                        st.caption("Loading photo...")
                     else:
                         st.write("No image available")
 
@@ -493,8 +427,7 @@ with tab3:
                 render_persona(entry['persona'])
 
                 # -- Email Generation Section --
-                email_status_path = f"{entry['date']}/{entry['name']}/email_status.json"
-                email_status = supa_load_json(bucket, email_status_path) or {}
+                email_status = entry.get("email_status") or {}
 
 
                 current_status = email_status.get("status", "Not started")
@@ -503,12 +436,12 @@ with tab3:
                 # If cold_email already exists
                 if "cold_email" in email_status:
                     st.markdown("**Cold Email:**")
-                    st.text_area("Cold Email", value=email_status["cold_email"], height=200, key=f"show_email_{entry['name']}")
+                    st.text_area("Cold Email", value=email_status["cold_email"], height=200, key=f"show_email_{row_key}")
                     st.download_button(
                         "Download Email",
                         email_status["cold_email"],
                         file_name=f"{entry['name'].replace(' ', '_')}_cold_email.txt",
-                        key=f"download_{entry['name']}"
+                        key=f"download_{row_key}"
                     )
 
                     # Show recommended deck if present
@@ -518,217 +451,61 @@ with tab3:
                         st.caption(email_status.get("deck_summary", ""))
 
                 else:
-                    if st.button(f"Generate Cold Email for {entry['name']}", key=f"email_btn_{entry['name']}"):
-                        try:
-                            from openai import OpenAI
-                            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-                            with open("case_studies.json", "r", encoding="utf-8") as f:
-                                case_studies = json.load(f)
-
-                                case_studies_str = json.dumps(case_studies, indent=2)
-
-
-
-                                prompt = f"""
-                                    You are a creative strategist and cold outreach expert working for Team Pumpkin, a high-performance digital marketing agency.
-
-                                    Team Pumpkin helps brands like Tata AIG, Pizza Hut, Boat, Himalaya, Axis Bank, etc. through digital marketing, influencer marketing, SEO, PR, and full-funnel strategy.
-
-                                    Your job is to write a cold email to the lead below and pick the **most relevant case study deck** from the provided list to include in your message. 
-
-                                    Make sure the email:
-                                    - Embeds the selected **deck link directly**
-                                    - Reflects their **persona traits** in tone, language, and content
-                                    - Feels human, light, and tailored — not robotic or stiff
-
-                                    --- Lead Info ---
-                                    Name: {entry['name']}
-                                    Title: {entry['title']}
-                                    Company: {entry['company']}
-                    
-                                    --- Persona Traits ---
-                                    Persona Type: {persona.get("persona_type", "-")}
-                                    Communication Style: {persona.get("communication_style", "-")}
-                                    Tone Profile: {persona.get("tone_profile", "-")}
-                                    Writing Style: {persona.get("writing_style", "-")}
-                                    Key Interests: {', '.join(persona.get("key_interests", []))}
-                                    Decision Drivers: {', '.join(persona.get("decision_drivers", []))}
-                                    Objection Style: {persona.get("objection_style", "-")}
-                                    Example Phrases: {', '.join(persona.get("example_phrases", []))}
-                                    Summary: {persona.get("summary", "-")}
-
-                                    --- Case Study Decks ---
-                                    {case_studies_str}
-
-
-                                    --- Requirements ---
-                                    - Carefully select **ONE** deck that is **highly relevant** to the lead’s industry, product type, and persona
-                                    - Do NOT pick decks unrelated to their business domain (e.g. don’t pick “retail” for a D2C food brand)
-                                    - Match persona tone
-                                    - Use the lead’s communication style and objections to guide how persuasive vs casual the email should be
-                                    - Use key interests or decision drivers to **anchor your pitch**
-                                    - Embed the selected **deck link** directly into the email
-                                    - Keep the email **under 150 words**
-                                    - Use a friendly, non-pushy closing CTA (e.g., “Want to see what we could cook up?”)
-
-                                    Always base your choice on the **tags and summaries** provided for each deck. Use the one that most **closely aligns with the lead’s interests, tone, and product type.**
-
-
-
-
-                                    --- Format ---
-                        
-                                    Deck Chosen: <deck_name>
-                                    Subject: ...
-                                    Body:
-                                    <cold email body here>
-                                    """
-
-
+                    email_key = f"email:{entry['path']}"
+                    if email_key in active_jobs:
+                        st.caption(f"Cold email job {active_jobs[email_key]['status']}; it appears here once written.")
+                    elif st.button(f"Generate Cold Email for {entry['name']}", key=f"email_btn_{row_key}"):
+                        job_queue.submit("email", {"date": entry["date"], "folder": entry["folder"]}, priority=10, dedupe_key=email_key)
+                        st.info("Cold email queued; it appears here once written.")
 
-                                response = client.chat.completions.create(
-                                    model="gpt-4-turbo",
-                                    messages=[{"role": "user", "content": prompt}],
-                                    temperature=0.7
-                                )
 
-                                full_reply = response.choices[0].message.content
 
-                                # Try to extract deck name
-                                lines = full_reply.strip().splitlines()
-                                deck_line = next((line for line in lines if line.lower().startswith("deck chosen:")), "")
-                                chosen_deck = deck_line.replace("Deck Chosen:", "").strip()
-
-                                # Match from CSV to get URL and summary
-                                matched_deck_row = case_study_df[case_study_df['deck_name'].str.strip().str.lower() == chosen_deck.lower()]
-                                if not matched_deck_row.empty:
-                                    deck_url = matched_deck_row.iloc[0]["deck_url"]
-                                    deck_summary = matched_deck_row.iloc[0]["deck_summary"]
-                                else:
-                                    deck_url = "Not found"
-                                    deck_summary = "Not found"
-
-                                # Save JSON
-                                email_status = {
-                                    "status": "cold",
-                                    "cold_email": full_reply,
-                                    "recommended_deck": chosen_deck,
-                                    "deck_url": deck_url,
-                                    "deck_summary": deck_summary,
-                                    "generated_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                }
-
-                                # Save email_status.json to Supabase
-                                email_status_path = f"{entry['date']}/{entry['name']}/email_status.json"
-                                supa_upload_json(bucket, email_status_path, email_status)
-
-                                # Save cold_email.txt to Supabase
-                                cold_email_txt_path = f"{entry['date']}/{entry['name']}/cold_email.txt"
-                                supa_upload_file(bucket, cold_email_txt_path, full_reply.encode("utf-8"), file_options={"content-type": "text/plain"})
-
-
-                                # UI Feedback
-                                st.success("Cold email generated and saved.")
-                                st.text_area("Cold Email", value=full_reply, height=220, key=f"textarea_{entry['name']}")
-                                st.download_button(
-                                    "Download Email",
-                                    full_reply,
-                                    file_name=f"{entry['name'].replace(' ', '_')}_cold_email.txt",
-                                    key=f"download_after_gen_{entry['name']}"
-                                )
-                                st.markdown(f"**Recommended Deck:** `{chosen_deck}`")
-
-                        except Exception as e:
-                            st.error(f"Email generation failed: {e}")
+@st.fragment
+def render_chat(entry, bucket="leads"):
+    # A fragment, so sending a message reruns only the conversation
+    chat_key = f"chat_{entry['path']}"
+    if chat_key not in st.session_state:
+        messages, next_seq = load_chat(bucket, entry["path"])
+        st.session_state[chat_key] = (messages, next_seq, load_chat_summary(bucket, entry["path"]))
+    messages, next_seq, summary = st.session_state[chat_key]
 
+    st.markdown("### Conversation")
+    for msg in messages:
+        with st.chat_message("user" if msg["role"] == "user" else "assistant"):
+            st.markdown(msg["content"])
+
+    user_input = st.chat_input("Your message:", key=f"talk_input_{entry['path']}")
+    if user_input and user_input.strip():
+        user_message = {"role": "user", "content": user_input.strip()}
+        with st.chat_message("user"):
+            st.markdown(user_message["content"])
+        try:
+            prompt = build_chat_context(entry, messages + [user_message], summary)
+            with st.chat_message("assistant"):
+                reply = st.write_stream(stream_chat_completion(prompt, model=CHAT_MODEL, temperature=0.7))
+            turn = [user_message, {"role": "assistant", "content": reply}]
+            next_seq = append_chat_turn(bucket, entry["path"], next_seq, turn)
+            messages = messages + turn
+            st.session_state[chat_key] = (messages, next_seq, summary)
+            # Runs after the reply is shown, and only every few turns
+            summary = fold_chat_history(bucket, entry["path"], entry, messages, summary)
+            st.session_state[chat_key] = (messages, next_seq, summary)
+        except Exception as e:
+            st.error(f"Conversation failed: {e}")
 
 
 with tab4:
     st.header("Talk To Leads")
 
-    bucket = "leads"
-    all_entries = []
-
-    for date_folder in sorted(supa_list_folders(bucket), reverse=True):
-        for lead_folder in supa_list_folders(bucket, prefix=f"{date_folder}/"):
-            lead_path = f"{date_folder}/{lead_folder}/lead.json"
-            persona_path = f"{date_folder}/{lead_folder}/persona.json"
-
-            lead = supa_load_json(bucket, lead_path)
-            persona = supa_load_json(bucket, persona_path)
-
-            if lead and persona:
-                full_name = f"{lead.get('first_name', '')} {lead.get('last_name', '')}"
-                all_entries.append({
-                    "name": full_name,
-                    "date": date_folder,
-                    "folder": lead_folder,
-                    "lead": lead,
-                    "persona": persona
-                })
+    all_entries = lead_catalog.with_persona()
 
     if not all_entries:
         st.warning("No leads with personas found.")
-        st.stop()
-
-    selected_label = st.selectbox("Choose a lead to talk to:", [f"{e['name']} ({e['date']})" for e in all_entries])
-    selected_entry = next(e for e in all_entries if f"{e['name']} ({e['date']})" == selected_label)
-
-    # Supabase chat path
-    chat_path = f"{selected_entry['date']}/{selected_entry['folder']}/chat.json"
-    messages = supa_load_json(bucket, chat_path)
-
-    if not messages:
-        messages = [{
-            "role": "system",
-            "content": f"""You are now simulating {selected_entry['name']}, a real-world professional based on detailed persona insights below.
-
-Only respond in the tone, style, and mindset of this person. Use their vocabulary, preferred sentence structure, and emotional tone.
-
---- Persona Snapshot ---
-{json.dumps(selected_entry['persona'], indent=2)}
-
---- Behavior Guidelines ---
-- Be authentic to this person’s communication style (e.g., concise, assertive, formal, friendly).
-- Reflect their interests and priorities when responding (e.g., ROI, efficiency, market trends).
-- If a question is irrelevant or off-topic, politely redirect or decline.
-- Keep your responses natural, as if you're typing on LinkedIn or replying to a thoughtful DM — not like an AI bot.
-
-Your job is to answer **as if you are this person**, staying completely in character.
-"""
-        }]
-
-    st.markdown("### Conversation")
-    for msg in messages[1:]:
-        if msg["role"] == "user":
-            st.markdown(f"**You:** {msg['content']}")
-        elif msg["role"] == "assistant":
-            st.markdown(f"**{selected_entry['name']}:** {msg['content']}")
-
-    user_input = st.text_input("Your message:", key="talk_input")
-
-    if st.button("Send") and user_input.strip():
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        messages.append({"role": "user", "content": user_input.strip()})
-        with st.spinner("Thinking..."):
-            try:
-                res = client.chat.completions.create(
-                    model="gpt-4-turbo",
-                    messages=messages,
-                    temperature=0.7
-                )
-                reply = res.choices[0].message.content
-                messages.append({"role": "assistant", "content": reply})
-
-                supa_upload_json(bucket, chat_path, messages)
-
-                st.experimental_rerun()
+    else:
+        selected_label = st.selectbox("Choose a lead to talk to:", [f"{e['name']} ({e['date']})" for e in all_entries])
+        selected_entry = next(e for e in all_entries if f"{e['name']} ({e['date']})" == selected_label)
 
-            except Exception as e:
-                st.error(f"Conversation failed: {e}")
+        render_chat(selected_entry)
 
 
 # ---------- footer  ----------
@@ -748,3 +525,37 @@ with col2:
         """,
         unsafe_allow_html=True
     )
+
+
+# ---------- startup timing ----------
+@st.cache_resource
+def first_run_timings():
+    # Filled in by the first script run of this process (the cold start)
+    return {}
+
+
+timings["total"] = time.perf_counter() - _script_started
+timings["render"] = timings["total"] - timings["imports"] - timings["catalog"]
+cold_start = first_run_timings()
+if not cold_start:
+    cold_start.update(timings)
+    print("[startup] first run: " + ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in timings.items()))
+
+with st.sidebar.expander("Startup timing"):
+    for label, run in (("First run", cold_start), ("This rerun", timings)):
+        st.caption(f"{label}: " + ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in run.items()))
+
+if st.sidebar.toggle("Show call metrics"):
+    # This session's spans since the rerun started, pool threads included
+    rerun_spans = metrics.since(metrics_mark, st.session_state["metrics_scope"])
+    rows = metrics.summarize(rerun_spans)
+    with st.sidebar.expander(f"Calls this rerun ({len(rerun_spans)})", expanded=True):
+        if rows:
+            st.dataframe(
+                [{**row, "total_ms": round(row["total_ms"], 1), "max_ms": round(row["max_ms"], 1)} for row in rows],
+                hide_index=True
+            )
+        else:
+            st.caption("No storage, HTTP or LLM calls.")
+        st.download_button("Prometheus metrics", metrics.to_prometheus(), "bd_metrics.prom", "text/plain")
+        st.download_button("This rerun as JSONL", metrics.to_jsonl(rerun_spans), "bd_rerun_spans.jsonl", "application/json")
@@ -0,0 +1,349 @@
+import io
+import json
+import time
+import random
+import threading
+from functools import lru_cache
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from synthetic_leads import synthetic_lead
+
+# One local HTTP server standing in for Supabase Storage (/storage/v1),
+# Apify (/v2), Relevance (/relevance), OpenAI (/v1) and lead photos
+# (/photos). Each service has a
+# Profile with injected latency, 5xx failures and 429 throttling. Storage
+# keeps objects in memory; Apify serves a dataset of synthetic leads; the
+# OpenAI stand-in answers persona, summary and email prompts in the shapes
+# the app parses; photo URLs in the dataset point back at this server so
+# thumbnail prefetching never leaves the machine. Every request is counted
+# per service and route.
+
+
+class Profile:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, failure_rate: float = 0, throttle_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+
+    def delay(self, rng):
+        return max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+
+PERSONA_REPLY = {
+    "persona_type": "Visionary Founder",
+    "communication_style": "Direct and concise",
+    "tone_profile": "Confident, warm",
+    "writing_style": "Short sentences, few adjectives",
+    "key_interests": ["brand growth", "digital marketing", "retail expansion"],
+    "decision_drivers": ["ROI", "speed to market"],
+    "objection_style": "Asks for proof and numbers",
+    "example_phrases": ["Show me the numbers", "What's the upside?"],
+    "summary": "Growth-focused founder who values measurable outcomes."
+}
+EMAIL_REPLY = "Subject: A quick idea for your brand\nBody:\nHi there,\n\nWe helped similar brands grow faster. Want to see what we could cook up?\n\nCheers"
+
+
+class FakeServices:
+    def __init__(self, dataset_size: int = 100, seed: int = 7, profiles: dict = None, host: str = "127.0.0.1", port: int = 0):
+        self.dataset_size = dataset_size
+        self.seed = seed
+        self.profiles = {name: Profile() for name in ("storage", "apify", "relevance", "openai", "photos")}
+        self.profiles.update(profiles or {})
+        self.objects = {}
+        self.runs = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        # Environment that points the app's clients at this server
+        return {
+            "SUPABASE_URL": self.url,
+            "SUPABASE_SERVICE_ROLE_KEY": "bench-key",
+            "APIFY_BASE_URL": f"{self.url}/v2",
+            "APIFY_TOKEN": "bench",
+            "RELEVANCE_BASE_URL": f"{self.url}/relevance",
+            "AUTH_TOKEN": "bench",
+            "AGENT_ID": "bench-agent",
+            "PROJECT": "bench",
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "OPENAI_API_KEY": "bench",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+    def _count(self, service: str, route: str):
+        with self._lock:
+            key = f"{service} {route}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _fault(self, service: str):
+        # Returns (status, headers) to inject, or None
+        profile = self.profiles[service]
+        with self._lock:
+            delay = profile.delay(self._rng)
+            roll = self._rng.random()
+        if delay:
+            time.sleep(delay)
+        if roll < profile.failure_rate:
+            return 503, {}
+        if roll < profile.failure_rate + profile.throttle_rate:
+            return 429, {"Retry-After": "0.1"}
+        return None
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _send(self, status: int, body=b"", headers: dict = None, content_type: str = "application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, method: str):
+                parsed = urlparse(self.path)
+                path = unquote(parsed.path)
+                body = self._body() if method in ("POST", "PUT", "DELETE") else b""
+                if path.startswith("/storage/v1/"):
+                    service, handle = "storage", services._storage
+                elif path.startswith("/v2/"):
+                    service, handle = "apify", services._apify
+                elif path.startswith("/relevance/"):
+                    service, handle = "relevance", services._relevance
+                elif path.startswith("/v1/"):
+                    service, handle = "openai", services._openai
+                elif path.startswith("/photos/"):
+                    service, handle = "photos", services._photos
+                else:
+                    return self._send(404, {"error": "unknown route"})
+
+                fault = services._fault(service)
+                if fault:
+                    services._count(service, f"{method} fault:{fault[0]}")
+                    return self._send(fault[0], {"statusCode": str(fault[0]), "error": "injected", "message": "injected fault"}, fault[1])
+                return handle(self, method, path, parse_qs(parsed.query), body)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        return Handler
+
+    # ----------------------------
+    # Supabase Storage
+    # ----------------------------
+    def _storage(self, handler, method, path, query, body):
+        rest = path[len("/storage/v1/"):]
+        if method == "POST" and rest.startswith("object/list/"):
+            self._count("storage", "list")
+            return handler._send(200, self._list(rest[len("object/list/"):], json.loads(body or b"{}")))
+        if method == "DELETE" and rest.startswith("object/"):
+            self._count("storage", "delete")
+            bucket = rest[len("object/"):].strip("/")
+            with self._lock:
+                for prefix in json.loads(body or b"{}").get("prefixes", []):
+                    self.objects.pop(f"{bucket}/{prefix}", None)
+            return handler._send(200, [])
+        if rest.startswith("object/"):
+            key = rest[len("object/"):]
+            if method in ("POST", "PUT"):
+                self._count("storage", "upload")
+                upsert = handler.headers.get("x-upsert", "false").lower() == "true"
+                content = _multipart_file(handler.headers.get("Content-Type", ""), body)
+                with self._lock:
+                    if key in self.objects and method == "POST" and not upsert:
+                        return handler._send(400, {"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"})
+                    self.objects[key] = (content, f'"{hash(content) & 0xffffffff:x}-{len(content)}"', time.time())
+                return handler._send(200, {"Key": key})
+            self._count("storage", "get")
+            with self._lock:
+                stored = self.objects.get(key)
+            if stored is None:
+                return handler._send(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            content, etag, _ = stored
+            if handler.headers.get("If-None-Match") == etag:
+                return handler._send(304, b"", {"ETag": etag})
+            return handler._send(200, content, {"ETag": etag}, "application/octet-stream")
+        return handler._send(404, {"error": "unknown storage route"})
+
+    def _list(self, bucket: str, options: dict):
+        prefix = (options.get("prefix") or "").strip("/")
+        base = f"{bucket}/{prefix}/" if prefix else f"{bucket}/"
+        names = {}
+        with self._lock:
+            for key, (content, etag, updated) in self.objects.items():
+                if not key.startswith(base):
+                    continue
+                parts = key[len(base):].split("/")
+                if len(parts) > 1:
+                    names.setdefault(parts[0], None)
+                else:
+                    names[parts[0]] = {
+                        "name": parts[0], "id": key, "updated_at": str(updated),
+                        "metadata": {"size": len(content), "eTag": etag}
+                    }
+        items = [value or {"name": name, "id": None, "metadata": None} for name, value in sorted(names.items())]
+        offset = options.get("offset", 0)
+        return items[offset:offset + options.get("limit", 100)]
+
+    # ----------------------------
+    # Apify
+    # ----------------------------
+    def _apify(self, handler, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if method == "POST" and parts[1] == "acts":
+            self._count("apify", "start_run")
+            payload = json.loads(body or b"{}")
+            run_id = f"run-{len(self.runs) + 1}"
+            size = min(payload.get("totalRecords") or self.dataset_size, self.dataset_size)
+            # Each run gets its own seed, so two scrapes never return the same people
+            self.runs[run_id] = {"size": size, "seed": self.seed + len(self.runs), "status": "RUNNING"}
+            return handler._send(201, {"data": {"id": run_id, "defaultDatasetId": run_id, "status": "RUNNING"}})
+        if parts[1] == "actor-runs":
+            self._count("apify", "get_run")
+            run = self.runs.get(parts[2])
+            if run is None:
+                return handler._send(404, {"error": "run not found"})
+            # Finishes on the first poll; all items are available immediately
+            run["status"] = "SUCCEEDED"
+            return handler._send(200, {"data": {"id": parts[2], "status": run["status"]}})
+        if parts[1] == "datasets":
+            self._count("apify", "dataset_items")
+            run = self.runs.get(parts[2])
+            if run is None:
+                return handler._send(404, {"error": "dataset not found"})
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            end = min(offset + limit, run["size"])
+            leads = [synthetic_lead(i, run["seed"]) for i in range(offset, end)]
+            for i, lead in enumerate(leads, offset):
+                lead["photo_url"] = f"{self.url}/photos/{run['seed']}-{i}.jpg"
+            return handler._send(200, leads)
+        return handler._send(404, {"error": "unknown apify route"})
+
+    # ----------------------------
+    # Photos
+    # ----------------------------
+    def _photos(self, handler, method, path, query, body):
+        self._count("photos", "get")
+        return handler._send(200, _photo_bytes(), content_type="image/jpeg")
+
+    # ----------------------------
+    # Relevance
+    # ----------------------------
+    def _relevance(self, handler, method, path, query, body):
+        self._count("relevance", "query")
+        inputs = json.loads(body or b"{}").get("inputs", {})
+        if "linkedin_url" in inputs and "company_name" not in inputs:
+            return handler._send(200, {"posts": [f"Post {i} about growth and brand building." for i in range(3)]})
+        return handler._send(200, {"output": f"Pain points for {inputs.get('company_name', '')}: slow growth, low brand recall."})
+
+    # ----------------------------
+    # OpenAI
+    # ----------------------------
+    def _openai(self, handler, method, path, query, body):
+        request = json.loads(body or b"{}")
+        prompt = "\n".join(m.get("content") or "" for m in request.get("messages", []))
+        if "persona modeling" in prompt:
+            content = json.dumps(PERSONA_REPLY)
+        elif "Update the running summary" in prompt:
+            content = "The lead asked about pricing and case studies."
+        elif "cold email" in prompt:
+            content = EMAIL_REPLY
+        else:
+            content = "Sounds interesting. What results have you seen with brands like ours?"
+
+        if request.get("stream"):
+            self._count("openai", "chat_stream")
+            return _send_stream(handler, request.get("model", ""), content)
+        self._count("openai", "chat")
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return handler._send(200, {
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": request.get("model", ""),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+
+@lru_cache(maxsize=1)
+def _photo_bytes():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 400), (240, 128, 32)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _multipart_file(content_type: str, body: bytes):
+    if "boundary=" not in content_type:
+        return body
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode("utf-8")
+    for part in body.split(b"--" + boundary):
+        head, _, data = part.partition(b"\r\n\r\n")
+        if b'name="file"' in head:
+            return data[:-2] if data.endswith(b"\r\n") else data
+    return body
+
+
+def _send_stream(handler, model: str, content: str):
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/event-stream")
+    handler.send_header("Transfer-Encoding", "chunked")
+    handler.end_headers()
+
+    def write(data: str):
+        raw = data.encode("utf-8")
+        handler.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+
+    for word in content.split(" "):
+        chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+        write(f"data: {json.dumps(chunk)}\n\n")
+    write("data: [DONE]\n\n")
+    handler.wfile.write(b"0\r\n\r\n")
@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+# End-to-end benchmarks against local fakes (fake_services.py): scrape
+# ingestion, persona and email batch throughput, and Streamlit rerun latency
+# per tab, at several lead counts. Each size runs in a fresh subprocess so
+# module-level clients and caches start cold. Results are written as JSON and
+# compared with a baseline run to flag regressions.
+#
+#   python benchmarks/run_benchmarks.py --sizes 100,1000,10000
+#   python benchmarks/run_benchmarks.py --sizes 100 --latency-ms 50 --failure-rate 0.02
+#   python benchmarks/run_benchmarks.py --save-baseline      # then later runs compare against it
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+
+SCRAPE_DATE = "2026-02-01"
+ENRICH_DATE = "2026-01-01"
+SEARCH_URL = "https://app.apollo.io/#/people?personLocations[]=Mumbai&qKeywords=D2C"
+
+# Changes smaller than this are noise whatever the relative change
+MIN_SECONDS_DELTA = 0.1
+# Background work whose request counts land in whichever scenario is running
+UNTRACKED_REQUESTS = ("photos ", "fault:")
+
+
+# ----------------------------
+# Child: one size, one process
+# ----------------------------
+def _configure_environment(fake, args, workdir):
+    os.environ.update(fake.env())
+    os.environ.update({
+        "BD_RESPONSE_CACHE": "0",
+        "BD_LEAD_STORE_DIR": os.path.join(workdir, "lead_store"),
+        "BD_PHOTO_CACHE_DIR": os.path.join(workdir, "photos"),
+        "BD_CACHE_DIR": os.path.join(workdir, "storage_cache"),
+        "BD_RESPONSE_CACHE_PATH": os.path.join(workdir, "response_cache.sqlite3"),
+        # The app's tabs submit jobs; keep them out of a real instance's queue
+        "BD_JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "BD_STORAGE_BACKEND": "local" if args.storage == "local" else "supabase",
+        "BD_LOCAL_STORAGE_DIR": os.path.join(workdir, "storage"),
+        "SUPABASE_RETRY_BACKOFF": "0.05",
+        # Client-side limiters would dominate the timings against instant fakes
+        "RELEVANCE_RPM": "100000",
+    })
+
+
+def _requests(fake, metrics, mark):
+    # Requests seen by the fakes plus the app's own span counts since mark
+    return {
+        "http": dict(sorted(fake.reset_counts().items())),
+        "calls": {f"{row['kind']} {row['op']}": row["calls"] for row in metrics.summarize(metrics.since(mark))},
+    }
+
+
+def _scrape(size, date):
+    from scrape_jobs import start_scrape_job, run_scrape_job
+
+    job = start_scrape_job(SEARCH_URL, total_records=size, date=date)
+    return run_scrape_job(job, poll_interval=0.1)
+
+
+def bench_ingestion(fake, metrics, size):
+    fake.reset_counts()
+    mark = metrics.mark()
+    started = time.perf_counter()
+    job = _scrape(size, SCRAPE_DATE)
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": seconds,
+        "leads": job["offset"],
+        "leads_per_s": job["offset"] / seconds if seconds else 0,
+        "failed_uploads": job.get("failed_uploads", 0),
+        "status": job["status"],
+        **_requests(fake, metrics, mark),
+    }
+
+
+def bench_enrichment(fake, metrics, size, args):
+    from lead_catalog import LeadCatalog
+    from personas import build_personas_batch
+    from cold_emails import generate_emails_batch
+
+    # Enrichment runs on its own, smaller scrape so 10k runs stay affordable
+    _scrape(min(size, args.enrich_max), ENRICH_DATE)
+    catalog = LeadCatalog("leads")
+    catalog.refresh(force=True)
+
+    results = {}
+    for name, run in (
+        ("personas", lambda: build_personas_batch(catalog, ENRICH_DATE, args.concurrency, rpm=100000, tpm=100000000)),
+        ("emails", lambda: generate_emails_batch(catalog, ENRICH_DATE, args.concurrency, rpm=100000, tpm=100000000)),
+    ):
+        fake.reset_counts()
+        mark = metrics.mark()
+        started = time.perf_counter()
+        stats = run()
+        seconds = time.perf_counter() - started
+        results[name] = {
+            "seconds": seconds,
+            "leads": stats["total"],
+            "done": stats["done"],
+            "failed": stats["failed"],
+            "leads_per_s": stats["done"] / seconds if seconds else 0,
+            "tokens": stats["tokens"],
+            **_requests(fake, metrics, mark),
+        }
+    return results
+
+
+def bench_reruns(fake, metrics):
+    from streamlit.testing.v1 import AppTest
+
+    # The app loads assets by relative path
+    os.chdir(REPO_DIR)
+    app = AppTest.from_file(os.path.join(REPO_DIR, "bd_engine_app.py"), default_timeout=600)
+    results = {}
+
+    def step(name, action):
+        fake.reset_counts()
+        mark = metrics.mark()
+        started = time.perf_counter()
+        action()
+        seconds = time.perf_counter() - started
+        errors = [e.value for e in app.exception]
+        results[name] = {"seconds": seconds, "errors": errors, **_requests(fake, metrics, mark)}
+
+    def first(elements, prefix):
+        return next((e for e in elements if (e.key or "").startswith(prefix)), None)
+
+    step("cold_start", app.run)
+    step("rerun", app.run)
+    step("dashboard_search", lambda: next(t for t in app.text_input if t.label.startswith("Search")).set_value("founder").run())
+    step("dashboard_clear_search", lambda: next(t for t in app.text_input if t.label.startswith("Search")).set_value("").run())
+    next_page = first(app.button, f"dashboard_{SCRAPE_DATE}_next")
+    if next_page is not None:
+        step("dashboard_next_page", next_page.click().run)
+    row = first(app.toggle, f"open_{SCRAPE_DATE}_")
+    if row is not None:
+        step("dashboard_open_row", lambda: row.set_value(True).run())
+    persona_row = first(app.toggle, "persona_open_")
+    if persona_row is not None:
+        step("persona_open_row", lambda: persona_row.set_value(True).run())
+    if app.chat_input:
+        step("talk_send_message", lambda: app.chat_input[0].set_value("What would you want from an agency?").run())
+    return results
+
+
+def run_size(args):
+    sys.path.insert(0, REPO_DIR)
+    from fake_services import FakeServices, Profile
+
+    profile = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate, throttle_rate=args.throttle_rate)
+    fake = FakeServices(dataset_size=args.size, profiles={name: Profile(**profile) for name in ("storage", "apify", "relevance", "openai")}).start()
+    workdir = tempfile.mkdtemp(prefix="bd_bench_")
+    _configure_environment(fake, args, workdir)
+
+    # App modules read the environment at import time
+    started = time.perf_counter()
+    from metrics import metrics
+    import scrape_jobs, personas, cold_emails, lead_catalog, lead_chat  # noqa: F401,E401
+    import_seconds = time.perf_counter() - started
+
+    try:
+        result = {"size": args.size, "import_seconds": import_seconds}
+        result["ingestion"] = bench_ingestion(fake, metrics, args.size)
+        result.update(bench_enrichment(fake, metrics, args.size, args))
+        result["reruns"] = bench_reruns(fake, metrics)
+    finally:
+        fake.stop()
+    return result
+
+
+# ----------------------------
+# Parent: sizes, results, regressions
+# ----------------------------
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten_timings(results: dict, prefix: str = ""):
+    # {"1000/ingestion/seconds": 1.2, ...} for every "seconds" and request count
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten_timings(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and (key == "seconds" or "/http/" in path):
+            flat[path] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, threshold: float):
+    # Slower timings beyond threshold, and any growth in requests per scenario
+    now, before = flatten_timings(current["sizes"]), flatten_timings(baseline["sizes"])
+    regressions = []
+    for path, value in sorted(now.items()):
+        old = before.get(path)
+        if old is None:
+            continue
+        if path.endswith("/seconds"):
+            if value > old * (1 + threshold) and value - old > MIN_SECONDS_DELTA:
+                regressions.append({"metric": path, "baseline": old, "current": value, "change": value / old - 1 if old else None})
+        elif value > old and not any(marker in path for marker in UNTRACKED_REQUESTS):
+            regressions.append({"metric": path, "baseline": old, "current": value, "change": value / old - 1 if old else None})
+    return regressions
+
+
+def print_summary(results: dict):
+    for size, result in results["sizes"].items():
+        print(f"\n== {size} leads (imports {result['import_seconds'] * 1000:.0f} ms)")
+        for name in ("ingestion", "personas", "emails"):
+            scenario = result[name]
+            requests_made = sum(scenario["http"].values())
+            print(f"  {name:<10} {scenario['seconds']:8.2f} s  {scenario['leads_per_s']:8.1f} leads/s  {requests_made:6d} requests")
+        for name, step in result["reruns"].items():
+            requests_made = sum(step["http"].values())
+            errors = f"  errors: {step['errors']}" if step["errors"] else ""
+            print(f"  rerun {name:<24} {step['seconds'] * 1000:8.0f} ms  {requests_made:6d} requests{errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BD Engine benchmarks against local fake services")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated lead counts")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Injected latency per request, all services")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0, help="Share of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Share of requests answered with 429")
+    parser.add_argument("--storage", choices=("fake", "local"), default="fake", help="Fake Supabase over HTTP, or the local-disk backend")
+    parser.add_argument("--enrich-max", type=int, default=200, help="Leads per persona/email batch")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--out", help="Results file (default: results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before a timing counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write this run as the baseline")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size:
+        # Child mode: one size, result JSON on the last line of stdout
+        print(json.dumps(run_size(args), default=str))
+        return 0
+
+    results = {
+        "run_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("size", "out", "baseline", "save_baseline", "fail_on_regression")},
+        "sizes": {},
+    }
+    child_args = list(sys.argv[1:])
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"[bench] {size} leads ...", flush=True)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), *child_args, "--size", str(size)], cwd=REPO_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stdout[-2000:], proc.stderr[-4000:])
+            print(f"[bench] {size} leads failed")
+            return 1
+        results["sizes"][str(size)] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print_summary(results)
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        results["baseline"] = {"path": args.baseline, "revision": baseline.get("revision"), "regressions": regressions}
+        print(f"\nCompared with {args.baseline} ({baseline.get('revision')}): {len(regressions)} regression(s)")
+        changed = {k for k in results["config"] if k != "sizes" and baseline.get("config", {}).get(k) != results["config"][k]}
+        if changed:
+            print(f"  note: baseline ran with different settings ({', '.join(sorted(changed))})")
+        for r in regressions:
+            print(f"  {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    for path in [out] + ([args.baseline] if args.save_baseline else []):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+    print(f"\nResults written to {out}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+import csv
+import random
+from functools import lru_cache
+
+# Apollo-shaped lead payloads for benchmarks. Value pools come from the
+# columns of enriched_leads.csv (names, titles, companies, seniority,
+# departments, locations, photo and LinkedIn URL shapes); fields that export
+# leaves empty (industry, skills, tags) are filled from small fixed lists.
+# Lead i is the same for a given seed, so runs are comparable.
+ENRICHED_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "enriched_leads.csv")
+
+INDUSTRIES = ["retail", "financial services", "information technology & services", "marketing & advertising",
+              "consumer goods", "hospitality", "real estate", "health, wellness & fitness", "education", "automotive"]
+SKILLS = ["digital marketing", "seo", "brand strategy", "social media", "sales", "leadership", "ecommerce",
+          "product management", "analytics", "content strategy", "public relations", "growth hacking"]
+TAGS = ["b2b", "b2c", "d2c", "saas", "startup", "enterprise", "agency"]
+
+
+@lru_cache(maxsize=1)
+def value_pools(csv_path: str = ENRICHED_CSV):
+    columns = {
+        "first_name": "First Name", "last_name": "Last Name", "headline": "Headline", "title": "Job Title",
+        "company": "Company Name", "seniority": "Seniority", "departments": "Departments",
+        "city": "City", "state": "State", "country": "Country", "photo_url": "Photo URL"
+    }
+    pools = {field: [] for field in columns}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for field, column in columns.items():
+                value = (row.get(column) or "").strip()
+                if value:
+                    pools[field].append(value)
+    return {field: values or [""] for field, values in pools.items()}
+
+
+def synthetic_lead(i: int, seed: int = 7):
+    rng = random.Random(seed * 1_000_003 + i)
+    pools = value_pools()
+    first = rng.choice(pools["first_name"])
+    last = f"{rng.choice(pools['last_name'])}{i}"
+    company = rng.choice(pools["company"])
+    domain = "".join(c for c in company.lower() if c.isalnum())[:20] or f"company{i}"
+    industry = rng.choice(INDUSTRIES)
+    title = rng.choice(pools["title"])
+    return {
+        "id": f"bench-{seed}-{i}",
+        "first_name": first,
+        "last_name": last,
+        "name": f"{first} {last}",
+        "headline": rng.choice(pools["headline"]),
+        "title": title,
+        "email": f"{first.lower()}.{i}@{domain}.com",
+        "email_status": rng.choice(["verified", "verified", "unavailable"]),
+        "linkedin_url": f"http://www.linkedin.com/in/{first.lower()}-{last.lower()}-{i}",
+        "photo_url": rng.choice(pools["photo_url"]),
+        "seniority": rng.choice(pools["seniority"]),
+        "departments": [d.strip() for d in rng.choice(pools["departments"]).split(",")],
+        "skills": rng.sample(SKILLS, 4),
+        "tags": rng.sample(TAGS, 2),
+        "industry": industry,
+        "city": rng.choice(pools["city"]),
+        "state": rng.choice(pools["state"]),
+        "country": rng.choice(pools["country"]),
+        "phone_numbers": [{"number": f"+91 98{rng.randrange(10**8):08d}"}],
+        "employment_history": [
+            {"current": True, "title": title, "organization_name": company},
+            {"current": False, "title": "Manager", "organization_name": rng.choice(pools["company"])}
+        ],
+        "organization": {
+            "name": company,
+            "primary_domain": f"{domain}.com",
+            "industry": industry,
+            "estimated_num_employees": rng.choice([10, 50, 200, 1000, 5000]),
+            "keywords": rng.sample(SKILLS, 5)
+        }
+    }
+
+
+def synthetic_leads(n: int, seed: int = 7, start: int = 0):
+    return [synthetic_lead(i, seed) for i in range(start, start + n)]
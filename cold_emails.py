@@ -0,0 +1,207 @@
+import time
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from supabase_utils import supa_download_json, supa_upload_many
+from llm_utils import RateLimiter, chat_completion, default_limiter
+from lead_lease import LeaseHeld, acquire_lease, lease_owner, shard_order
+
+EMAIL_MODEL = "gpt-4-turbo"
+# Generated emails are uploaded and indexed in groups of this size
+FLUSH_EVERY = 10
+
+
+@lru_cache(maxsize=1)
+def email_system_prompt():
+    # Everything that is the same for every lead lives in this fixed prefix so
+    # provider-side prompt caching can reuse it across requests.
+    return """You are a creative strategist and cold outreach expert working for Team Pumpkin, a high-performance digital marketing agency.
+
+Team Pumpkin helps brands like Tata AIG, Pizza Hut, Boat, Himalaya, Axis Bank, etc. through digital marketing, influencer marketing, SEO, PR, and full-funnel strategy.
+
+Your job is to write a cold email to the lead given by the user, featuring the case study deck selected for them.
+
+Make sure the email:
+- Embeds the selected **deck link directly**
+- Reflects their **persona traits** in tone, language, and content
+- Feels human, light, and tailored — not robotic or stiff
+
+--- Requirements ---
+- Match persona tone
+- Use the lead’s communication style and objections to guide how persuasive vs casual the email should be
+- Use key interests or decision drivers to **anchor your pitch**, and tie them to what the deck shows
+- Embed the selected **deck link** directly into the email
+- Keep the email **under 150 words**
+- Use a friendly, non-pushy closing CTA (e.g., “Want to see what we could cook up?”)
+
+--- Format ---
+
+Subject: ...
+Body:
+<cold email body here>
+"""
+
+
+def build_email_messages(entry: dict, deck: dict):
+    persona = entry["persona"]
+    lead_prompt = f"""--- Lead Info ---
+Name: {entry['name']}
+Title: {entry['title']}
+Company: {entry['company']}
+
+--- Persona Traits ---
+Persona Type: {persona.get("persona_type", "-")}
+Communication Style: {persona.get("communication_style", "-")}
+Tone Profile: {persona.get("tone_profile", "-")}
+Writing Style: {persona.get("writing_style", "-")}
+Key Interests: {', '.join(persona.get("key_interests", []))}
+Decision Drivers: {', '.join(persona.get("decision_drivers", []))}
+Objection Style: {persona.get("objection_style", "-")}
+Example Phrases: {', '.join(persona.get("example_phrases", []))}
+Summary: {persona.get("summary", "-")}
+
+--- Selected Case Study Deck ---
+Deck: {deck['deck_name']}
+Link: {deck['deck_url']}
+About: {deck['deck_summary']}
+"""
+    return [
+        {"role": "system", "content": email_system_prompt()},
+        {"role": "user", "content": lead_prompt}
+    ]
+
+
+def choose_deck(entry: dict):
+    # Imported here: the recommender pulls in pandas/numpy and the case studies
+    from deck_recommender import recommend_deck
+    # Entries indexed before company_keywords existed match on the persona alone
+    return recommend_deck(entry["persona"], entry.get("industry", ""), entry.get("company_keywords", []))
+
+
+def build_email_status(full_reply: str, deck: dict):
+    return {
+        "status": "cold",
+        "cold_email": full_reply,
+        "recommended_deck": deck["deck_name"],
+        "deck_url": deck["deck_url"],
+        "deck_summary": deck["deck_summary"],
+        "generated_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def generate_cold_email(entry: dict, limiter: RateLimiter = None):
+    # The deck is picked locally first, so the prompt carries one deck, not the catalogue
+    deck = choose_deck(entry)
+    response = chat_completion(build_email_messages(entry, deck), model=EMAIL_MODEL, temperature=0.7, limiter=limiter, expected_output_tokens=300, cache_kind="email")
+    usage = getattr(response, "usage", None)
+    return build_email_status(response.choices[0].message.content, deck), (usage.total_tokens if usage else 0)
+
+
+def email_uploads(entry: dict, email_status: dict):
+    return {
+        f"{entry['path']}/email_status.json": email_status,
+        f"{entry['path']}/cold_email.txt": email_status["cold_email"]
+    }
+
+
+def save_cold_emails(catalog, results: list):
+    # results is a list of (entry, email_status); one batched upload, one index write per date
+    uploads = {}
+    by_date = {}
+    for entry, email_status in results:
+        uploads.update(email_uploads(entry, email_status))
+        by_date.setdefault(entry["date"], {})[entry["folder"]] = {"email_status": email_status}
+    upload_results = supa_upload_many(catalog.bucket, uploads)
+    for date, updates in by_date.items():
+        catalog.update_entries(date, updates)
+    return [path for path, result in upload_results.items() if not result["ok"]]
+
+
+# ----------------------------
+# Batch generation
+# ----------------------------
+def generate_emails_batch(catalog, date: str = None, concurrency: int = 4, rpm: int = None, tpm: int = None, on_progress=None,
+                          limiter: RateLimiter = None):
+    entries = catalog.without_email_status(date)
+    stats = {"total": len(entries), "done": 0, "failed": 0, "skipped": 0, "tokens": 0, "failed_uploads": 0, "errors": {}}
+    if not entries:
+        return stats
+
+    limiter = limiter or (RateLimiter(rpm, tpm) if (rpm or tpm) else default_limiter())
+    # Built here, not by whichever pool thread picks its deck first
+    from deck_recommender import get_deck_recommender
+    get_deck_recommender()
+    # Each lead is claimed with a lease that is held until its email is
+    # saved, so processes running the same batch never write one twice
+    owner = lease_owner()
+    leases = {}
+
+    def generate(entry):
+        lease = acquire_lease(catalog.bucket, entry["path"], "email", owner=owner)
+        if lease is None:
+            raise LeaseHeld("Another process is writing this email")
+        try:
+            if supa_download_json(catalog.bucket, f"{entry['path']}/email_status.json", fresh=True):
+                raise LeaseHeld("Email already written by another process")
+            result = generate_cold_email(entry, limiter)
+        except BaseException:
+            lease.release()
+            raise
+        leases[entry["path"]] = lease
+        return result
+
+    def flush(results):
+        # Only emails whose lease is still ours are written
+        held = [(entry, email_status) for entry, email_status in results if leases[entry["path"]].held()]
+        stats["skipped"] += len(results) - len(held)
+        stats["done"] -= len(results) - len(held)
+        try:
+            stats["failed_uploads"] += len(save_cold_emails(catalog, held))
+        finally:
+            for entry, _ in results:
+                leases.pop(entry["path"]).release()
+
+    started = time.time()
+    pending = []
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {pool.submit(generate, entry): entry for entry in shard_order(entries, owner)}
+        for future in as_completed(futures):
+            entry = futures.pop(future)
+            try:
+                email_status, tokens = future.result()
+                pending.append((entry, email_status))
+                stats["done"] += 1
+                stats["tokens"] += tokens
+            except LeaseHeld:
+                stats["skipped"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                stats["errors"][entry["name"]] = str(e)
+
+            if len(pending) >= FLUSH_EVERY:
+                flush(pending)
+                pending = []
+
+            elapsed = time.time() - started
+            stats["elapsed"] = elapsed
+            stats["per_minute"] = stats["done"] / elapsed * 60 if elapsed else 0
+            stats["throttled"] = limiter.throttled
+            if on_progress:
+                on_progress(stats)
+    finally:
+        # Emails already paid for are saved even if on_progress stopped the
+        # batch, including ones that were still in flight when it stopped
+        pool.shutdown(wait=True, cancel_futures=True)
+        for future, entry in futures.items():
+            if not future.cancelled() and future.exception() is None:
+                email_status, tokens = future.result()
+                pending.append((entry, email_status))
+                stats["done"] += 1
+                stats["tokens"] += tokens
+        if pending:
+            flush(pending)
+        for lease in list(leases.values()):
+            lease.release()
+    return stats
@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CASE_STUDIES_CSV = "case_studies.csv"
+# Tags are curated keywords, so they count more than words in the summary
+TAG_WEIGHT = 2
+
+# Used when nothing in the persona overlaps any deck
+DEFAULT_DECK = "Integrated Services"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ical", "ial", "ing", "ies", "es", "s", "e")
+
+
+def stem(word: str):
+    # Crude suffix stripping so "finance"/"financial" and "service"/"services" meet
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str):
+    return [stem(w) for w in _TOKEN_RE.findall((text or "").lower())]
+
+
+class DeckRecommender:
+    # TF-IDF index over the case-study decks, built once and scored with NumPy
+    def __init__(self, decks: pd.DataFrame):
+        self.decks = decks.reset_index(drop=True)
+        docs = [self._deck_terms(row) for _, row in self.decks.iterrows()]
+
+        vocab = sorted({term for doc in docs for term in doc})
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+
+        tf = np.zeros((len(docs), len(vocab)))
+        for row, doc in enumerate(docs):
+            for term in doc:
+                tf[row, self.vocab[term]] += 1
+        df = (tf > 0).sum(axis=0)
+        self.idf = np.log((1 + len(docs)) / (1 + df)) + 1
+        self.matrix = self._normalize(tf * self.idf)
+
+    @staticmethod
+    def _deck_terms(row):
+        tags = [t.strip() for t in str(row["tags"]).split(",") if t.strip()]
+        terms = tokenize(row["deck_name"]) + tokenize(row["deck_summary"])
+        for tag in tags:
+            terms += tokenize(tag) * TAG_WEIGHT
+        return terms
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def vectorize(self, text: str):
+        vec = np.zeros(len(self.vocab))
+        for term in tokenize(text):
+            i = self.vocab.get(term)
+            if i is not None:
+                vec[i] += 1
+        return self._normalize(vec * self.idf)
+
+    def scores(self, text: str):
+        return self.matrix @ self.vectorize(text)
+
+    def recommend(self, persona: dict, industry: str = "", company_keywords=()):
+        query = " ".join([
+            # Industry is the strongest domain signal, so it is repeated
+            f"{industry} " * 3,
+            " ".join(persona.get("key_interests", [])),
+            " ".join(persona.get("decision_drivers", [])),
+            " ".join(company_keywords or []),
+        ])
+        scores = self.scores(query)
+        best = int(np.argmax(scores))
+        if scores[best] <= 0:
+            fallback = self.decks.index[self.decks["deck_name"] == DEFAULT_DECK]
+            best = int(fallback[0]) if len(fallback) else best
+        row = self.decks.iloc[best]
+        return {
+            "deck_name": row["deck_name"],
+            "deck_url": row["deck_url"],
+            "deck_summary": row["deck_summary"],
+            "score": float(scores[best])
+        }
+
+
+@lru_cache(maxsize=1)
+def get_deck_recommender():
+    return DeckRecommender(pd.read_csv(CASE_STUDIES_CSV))
+
+
+def recommend_deck(persona: dict, industry: str = "", company_keywords=()):
+    return get_deck_recommender().recommend(persona, industry, company_keywords)
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+# Durable job queue for the slow work (Apify scrapes, persona and email
+# generation), kept in a local SQLite file shared by the app and the worker
+# processes started with worker.py. The app submits jobs and polls them; a
+# worker claims the highest-priority queued job, heartbeats while running it
+# and records the result. Failed jobs are retried with backoff up to
+# max_attempts; jobs whose worker stopped heartbeating are put back in the
+# queue. Running jobs are cancelled cooperatively: the cancel flag is raised
+# from the job's next progress report. A job past its last such check
+# reports progress with cancellable: False.
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+HEARTBEAT_INTERVAL = 5
+STALE_AFTER = 60
+RETRY_BACKOFF = 30
+
+_COLUMNS = (
+    "id", "kind", "payload", "status", "priority", "dedupe_key", "attempts", "max_attempts",
+    "run_after", "created_at", "started_at", "finished_at", "heartbeat_at", "worker",
+    "progress", "result", "error", "cancel_requested"
+)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit; claims take an IMMEDIATE transaction so two workers
+            # can never both move the same job to running
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT, "
+                "status TEXT NOT NULL, priority INTEGER DEFAULT 0, dedupe_key TEXT, "
+                "attempts INTEGER DEFAULT 0, max_attempts INTEGER DEFAULT 3, run_after REAL DEFAULT 0, "
+                "created_at REAL, started_at REAL, finished_at REAL, heartbeat_at REAL, worker TEXT, "
+                "progress TEXT, result TEXT, error TEXT, cancel_requested INTEGER DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, pid INTEGER, host TEXT, "
+                "started_at REAL, heartbeat_at REAL, job_id INTEGER)"
+            )
+        return self._conn
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        for field in ("payload", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _query(self, sql: str, params=()):
+        # Rows are fetched under the lock; the connection is shared by threads
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._connect().execute(sql, params).rowcount
+
+    # ----------------------------
+    # Submitting / reading
+    # ----------------------------
+    def submit(self, kind: str, payload: dict = None, priority: int = 0, max_attempts: int = 3, dedupe_key: str = None):
+        # With a dedupe_key, a queued or running job with the same key is
+        # returned instead of adding a second one (e.g. a double click)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if dedupe_key:
+                    row = conn.execute(
+                        "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY id LIMIT 1",
+                        (dedupe_key, *ACTIVE_STATUSES)
+                    ).fetchone()
+                    if row:
+                        conn.execute("COMMIT")
+                        return row[0]
+                cursor = conn.execute(
+                    "INSERT INTO jobs (kind, payload, status, priority, dedupe_key, max_attempts, run_after, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                    (kind, json.dumps(payload or {}), QUEUED, priority, dedupe_key, max_attempts, now)
+                )
+                conn.execute("COMMIT")
+                return cursor.lastrowid
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: int):
+        rows = self._query(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        return self._row(rows[0]) if rows else None
+
+    def list(self, statuses=None, kinds=None, dedupe_key: str = None, since: float = None, limit: int = 50):
+        clauses, params = [], []
+        if dedupe_key:
+            clauses.append("dedupe_key = ?")
+            params.append(dedupe_key)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if kinds:
+            clauses.append(f"kind IN ({', '.join('?' * len(kinds))})")
+            params.extend(kinds)
+        if since is not None:
+            clauses.append("COALESCE(finished_at, created_at) >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._query(f"SELECT {', '.join(_COLUMNS)} FROM jobs {where} ORDER BY id DESC LIMIT ?", (*params, limit))
+        return [self._row(row) for row in rows]
+
+    def active(self):
+        # Queued and running jobs by dedupe_key, for showing per-lead state
+        return {job["dedupe_key"]: job for job in reversed(self.list(statuses=ACTIVE_STATUSES, limit=1000)) if job["dedupe_key"]}
+
+    def cancel(self, job_id: int):
+        # Queued jobs are cancelled at once; running ones when they next report progress
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?", (CANCELLED, now, job_id, QUEUED))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    # ----------------------------
+    # Worker side
+    # ----------------------------
+    def claim(self, worker: str, kinds=None):
+        now = time.time()
+        kind_filter = f"AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f"SELECT id FROM jobs WHERE status = ? AND run_after <= ? {kind_filter} ORDER BY priority DESC, id LIMIT 1",
+                    (QUEUED, now, *(kinds or ()))
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?, worker = ?, error = NULL "
+                    "WHERE id = ?",
+                    (RUNNING, now, now, worker, row[0])
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: int):
+        # Returns True when the job has been asked to cancel
+        rows = self._query("UPDATE jobs SET heartbeat_at = ? WHERE id = ? RETURNING cancel_requested", (time.time(), job_id))
+        return bool(rows and rows[0][0])
+
+    def report_progress(self, job_id: int, progress: dict):
+        # Called by job handlers; raises JobCancelled once a cancel was requested
+        rows = self._query(
+            "UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ? RETURNING cancel_requested",
+            (json.dumps(progress, default=str), time.time(), job_id)
+        )
+        if rows and rows[0][0]:
+            raise JobCancelled()
+
+    def complete(self, job_id: int, result: dict = None):
+        self._finish(job_id, SUCCEEDED, result=result)
+
+    def cancelled(self, job_id: int):
+        self._finish(job_id, CANCELLED, error="Cancelled")
+
+    def fail(self, job_id: int, error: str, retry: bool = True):
+        # Back to the queue with exponential backoff while attempts remain
+        job = self.get(job_id)
+        if job and retry and job["attempts"] < job["max_attempts"] and not job["cancel_requested"]:
+            delay = RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+            self._execute(
+                "UPDATE jobs SET status = ?, run_after = ?, error = ?, worker = NULL WHERE id = ? AND status = ?",
+                (QUEUED, time.time() + delay, error, job_id, RUNNING)
+            )
+            return
+        self._finish(job_id, CANCELLED if job and job["cancel_requested"] else FAILED, error=error)
+
+    def release(self, job_id: int):
+        # A worker shutting down hands its job back without using an attempt
+        self._execute(
+            "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), run_after = 0, worker = NULL WHERE id = ? AND status = ?",
+            (QUEUED, job_id, RUNNING)
+        )
+
+    def _finish(self, job_id: int, status: str, result: dict = None, error: str = None):
+        self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ? AND status = ?",
+            (status, time.time(), json.dumps(result, default=str) if result is not None else None, error, job_id, RUNNING)
+        )
+
+    def requeue_stale(self, stale_after: float = STALE_AFTER):
+        # Running jobs whose worker died; counted as a failed attempt
+        cutoff = time.time() - stale_after
+        rows = self._query("SELECT id FROM jobs WHERE status = ? AND heartbeat_at < ?", (RUNNING, cutoff))
+        for (job_id,) in rows:
+            self.fail(job_id, "Worker stopped responding")
+        return [job_id for (job_id,) in rows]
+
+    def purge(self, older_than: float = 7 * 86400):
+        cutoff = time.time() - older_than
+        statuses = ", ".join("?" * len(FINISHED_STATUSES))
+        return self._execute(f"DELETE FROM jobs WHERE status IN ({statuses}) AND finished_at < ?", (*FINISHED_STATUSES, cutoff))
+
+    # ----------------------------
+    # Worker registry
+    # ----------------------------
+    def register_worker(self, name: str):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, NULL)",
+            (name, os.getpid(), socket.gethostname(), now, now)
+        )
+
+    def worker_heartbeat(self, name: str, job_id: int = None):
+        self._execute("UPDATE workers SET heartbeat_at = ?, job_id = ? WHERE name = ?", (time.time(), job_id, name))
+
+    def unregister_worker(self, name: str):
+        self._execute("DELETE FROM workers WHERE name = ?", (name,))
+
+    def live_workers(self, stale_after: float = STALE_AFTER):
+        rows = self._query(
+            "SELECT name, pid, host, started_at, heartbeat_at, job_id FROM workers WHERE heartbeat_at >= ? ORDER BY name",
+            (time.time() - stale_after,)
+        )
+        return [dict(zip(("name", "pid", "host", "started_at", "heartbeat_at", "job_id"), row)) for row in rows]
+
+
+job_queue = JobQueue(path=os.getenv("BD_JOB_QUEUE_PATH", os.path.join(".data", "jobs.sqlite3")))
@@ -0,0 +1,171 @@
+import json
+import time
+import threading
+
+from supabase_utils import supa_list_all, supa_download_many, is_folder
+from storage_cache import storage_cache
+from lead_manifest import refresh_manifest
+from lead_search import LeadSearchIndex
+from lead_index import INDEX_VERSION, index_path, rebuild_lead_index, update_lead_index_many
+
+# In-memory view over every scrape's lead index. Built once per process and
+# shared by all tabs; new date folders are loaded incrementally on refresh().
+
+
+class LeadCatalog:
+    def __init__(self, bucket: str = "leads", refresh_interval: float = 30):
+        self.bucket = bucket
+        self.refresh_interval = refresh_interval
+        self._indexes = {}
+        self._search_indexes = {}
+        self._last_refresh = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @property
+    def dates(self):
+        return sorted(self._indexes, reverse=True)
+
+    def refresh(self, force: bool = False):
+        if not force and time.time() - self._last_refresh < self.refresh_interval:
+            return []
+        try:
+            # Unlike supa_list_folders, a failed listing raises: it must not
+            # read as an empty bucket and drop every cached date
+            dates = [item["name"] for item in supa_list_all(self.bucket) if is_folder(item)]
+        except Exception as e:
+            print(f"[lead_catalog] Could not list {self.bucket}; keeping cached dates: {e}")
+            return []
+        new_dates = [d for d in dates if force or d not in self._indexes]
+        self._load_dates(new_dates)
+        with self._lock:
+            for date in set(self._indexes) - set(dates):
+                del self._indexes[date]
+                self._search_indexes.pop(date, None)
+            self._last_refresh = time.time()
+        return new_dates
+
+    def reload(self, date: str, revalidate: bool = False):
+        # revalidate skips the storage cache's TTL, for indexes that another
+        # process (e.g. a worker) has just written
+        if revalidate:
+            storage_cache.invalidate(self.bucket, index_path(date))
+        self._load_dates([date])
+
+    def sync_with_manifest(self):
+        # Picks up writes made by other processes: reloads only the dates whose
+        # objects changed according to the bucket manifest's delta.
+        try:
+            manifest, diff, _ = refresh_manifest(self.bucket)
+        except Exception as e:
+            print(f"[lead_catalog] Could not refresh the manifest; keeping cached dates: {e}")
+            return []
+        changed = {path.split("/", 1)[0] for paths in diff.values() for path in paths}
+        changed |= set(manifest["dates"]) - set(self._indexes)
+        self._load_dates(sorted(changed))
+        with self._lock:
+            for date in set(self._indexes) - set(manifest["dates"]):
+                del self._indexes[date]
+                self._search_indexes.pop(date, None)
+            self._last_refresh = time.time()
+        return sorted(changed)
+
+    def _load_dates(self, dates):
+        if not dates:
+            return
+        results = supa_download_many(self.bucket, [index_path(d) for d in dates])
+        for date in dates:
+            result = results[index_path(date)]
+            try:
+                index = json.loads(result["data"].decode("utf-8")) if result["ok"] else None
+            except ValueError:
+                index = None
+            if index is None and not result["missing"]:
+                # A failed read keeps what was loaded before; never a rebuild
+                print(f"[lead_catalog] Could not load {index_path(date)}: {result['error'] or 'invalid JSON'}")
+                continue
+            if index is None or index.get("version") != INDEX_VERSION:
+                try:
+                    index = rebuild_lead_index(date, self.bucket)
+                except (RuntimeError, TimeoutError) as e:
+                    print(f"[lead_catalog] Could not rebuild {index_path(date)}: {e}")
+                    continue
+            entries = {}
+            for folder, entry in index.get("leads", {}).items():
+                entries[folder] = dict(entry, date=date)
+            with self._lock:
+                self._indexes[date] = entries
+                self._search_indexes.pop(date, None)
+
+    # ----------------------------
+    # Views
+    # ----------------------------
+    def index(self, date: str):
+        return self._indexes.get(date, {})
+
+    def get(self, date: str, folder: str):
+        return self._indexes.get(date, {}).get(folder)
+
+    def leads(self, date: str = None):
+        dates = [date] if date else self.dates
+        return [self._indexes[d][f] for d in dates if d in self._indexes for f in sorted(self._indexes[d])]
+
+    def search_index(self, date: str):
+        # Built on first use per date and dropped whenever that date changes
+        search_index = self._search_indexes.get(date)
+        if search_index is None:
+            search_index = LeadSearchIndex(self.leads(date))
+            self._search_indexes[date] = search_index
+        return search_index
+
+    @staticmethod
+    def _one_per_path(entries):
+        # An unchanged re-scrape links to the folder under an earlier date, so
+        # the same lead can appear on several dates; keep one entry per folder,
+        # preferring the date that owns it
+        by_path = {}
+        for e in entries:
+            path = e.get("path") or f"{e['date']}/{e['folder']}"
+            if path not in by_path or path.startswith(f"{e['date']}/"):
+                by_path[path] = e
+        return list(by_path.values())
+
+    def without_persona(self, date: str = None):
+        return self._one_per_path(e for e in self.leads(date) if not e.get("has_persona"))
+
+    def with_persona(self, date: str = None):
+        return self._one_per_path(e for e in self.leads(date) if e.get("has_persona"))
+
+    def with_email_status(self, date: str = None):
+        return self._one_per_path(e for e in self.leads(date) if e.get("has_email_status"))
+
+    def without_email_status(self, date: str = None):
+        return self._one_per_path(e for e in self.leads(date) if e.get("has_persona") and not e.get("has_email_status"))
+
+    # ----------------------------
+    # Writes
+    # ----------------------------
+    def update_entry(self, date: str, folder: str, **fields):
+        return self.update_entries(date, {folder: fields}).get(folder)
+
+    def update_entries(self, date: str, updates: dict):
+        # Persists to the date's index.json and mirrors the change in memory.
+        # Serialised so concurrent writers don't lose each other's index updates.
+        with self._write_lock:
+            updated = update_lead_index_many(date, updates, self.bucket)
+            with self._lock:
+                for folder, entry in updated.items():
+                    self._indexes.setdefault(date, {})[folder] = dict(entry, date=date)
+                self._search_indexes.pop(date, None)
+
+        # A lead linked to its folder under an earlier date (unchanged on
+        # re-scrape) is updated in that date's index too, which later scrapes
+        # read through linked_enrichment
+        linked = {}
+        for folder, entry in updated.items():
+            owner_date, _, owner_folder = (entry.get("path") or "").partition("/")
+            if owner_folder and owner_date != date:
+                linked.setdefault(owner_date, {})[owner_folder] = updates[folder]
+        for owner_date, owner_updates in linked.items():
+            self.update_entries(owner_date, owner_updates)
+        return updated
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import random
+
+from supabase_utils import supa_list_files, supa_download_many, supa_load_json, supa_upload_json, supa_upload_file
+from llm_utils import chat_completion, count_tokens, count_message_tokens
+
+# Talk To Leads conversations are stored as append-only segments beside the
+# lead: <lead path>/chat-000001.jsonl, chat-000002.jsonl, ... one per turn,
+# one JSON message per line. Sending a message uploads only the new turn.
+# Segments are created with upsert off, so two sessions appending to the same
+# lead never overwrite each other's turn: the later one takes the next number.
+# A chat.json written before segments existed is read as the first turn(s).
+LEGACY_CHAT_FILENAME = "chat.json"
+SEGMENT_PREFIX = "chat-"
+SEGMENT_SUFFIX = ".jsonl"
+CHAT_MODEL = "gpt-4-turbo"
+
+# Context budget: the prompt is the system prompt, a rolling summary of older
+# turns (<lead path>/chat_summary.json) and as many recent messages as fit in
+# CONTEXT_TOKENS. Once the unsummarized history outgrows the budget, its
+# oldest messages are folded into the summary until it is back to half, so
+# summarization runs every few turns rather than on each one.
+SUMMARY_FILENAME = "chat_summary.json"
+SUMMARY_MODEL = "gpt-3.5-turbo"
+CONTEXT_TOKENS = int(os.getenv("BD_CHAT_CONTEXT_TOKENS", "2000"))
+SUMMARY_MAX_TOKENS = 300
+
+
+def segment_name(seq: int):
+    return f"{SEGMENT_PREFIX}{seq:06d}{SEGMENT_SUFFIX}"
+
+
+def persona_system_prompt(entry: dict):
+    return f"""You are now simulating {entry['name']}, a real-world professional based on detailed persona insights below.
+
+Only respond in the tone, style, and mindset of this person. Use their vocabulary, preferred sentence structure, and emotional tone.
+
+--- Persona Snapshot ---
+{json.dumps(entry['persona'], separators=(",", ":"), ensure_ascii=False)}
+
+--- Behavior Guidelines ---
+- Be authentic to this person’s communication style (e.g., concise, assertive, formal, friendly).
+- Reflect their interests and priorities when responding (e.g., ROI, efficiency, market trends).
+- If a question is irrelevant or off-topic, politely redirect or decline.
+- Keep your responses natural, as if you're typing on LinkedIn or replying to a thoughtful DM — not like an AI bot.
+
+Your job is to answer **as if you are this person**, staying completely in character.
+"""
+
+
+# ----------------------------
+# Load / append
+# ----------------------------
+def _segment_seq(name: str):
+    return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def list_segments(bucket: str, lead_path: str):
+    names = supa_list_files(bucket, f"{lead_path}/")
+    return sorted(n for n in names if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+
+
+def load_chat(bucket: str, lead_path: str):
+    # Returns (messages without the system prompt, next segment number)
+    legacy = supa_load_json(bucket, f"{lead_path}/{LEGACY_CHAT_FILENAME}") or []
+    messages = [m for m in legacy if m.get("role") != "system"]
+
+    segments = list_segments(bucket, lead_path)
+    results = supa_download_many(bucket, [f"{lead_path}/{name}" for name in segments])
+    for name in segments:
+        result = results[f"{lead_path}/{name}"]
+        if not result["ok"]:
+            print(f"[lead_chat] Could not read {lead_path}/{name}: {result['error']}")
+            continue
+        messages.extend(json.loads(line) for line in result["data"].decode("utf-8").splitlines() if line.strip())
+
+    next_seq = _segment_seq(segments[-1]) + 1 if segments else 1
+    return messages, next_seq
+
+
+def append_chat_turn(bucket: str, lead_path: str, seq: int, messages: list, max_attempts: int = 20):
+    # Returns the next segment number after the one actually written
+    content = ("\n".join(json.dumps(m, ensure_ascii=False) for m in messages) + "\n").encode("utf-8")
+    for _ in range(max_attempts):
+        path = f"{lead_path}/{segment_name(seq)}"
+        if supa_upload_file(bucket, path, content, {"upsert": "false", "content-type": "application/x-ndjson"}):
+            return seq + 1
+        # Taken by another session (or a real failure, if it isn't there)
+        segments = list_segments(bucket, lead_path)
+        if segment_name(seq) not in segments:
+            break
+        seq = _segment_seq(segments[-1]) + 1
+        time.sleep(random.uniform(0, 0.1))
+    raise RuntimeError(f"Could not save chat turn to {path}")
+
+
+# ----------------------------
+# Context window + rolling summary
+# ----------------------------
+def load_chat_summary(bucket: str, lead_path: str):
+    # summarized_until: how many leading messages the summary covers
+    return supa_load_json(bucket, f"{lead_path}/{SUMMARY_FILENAME}") or {"summary": "", "summarized_until": 0}
+
+
+def build_chat_context(entry: dict, messages: list, summary: dict, budget: int = CONTEXT_TOKENS, model: str = CHAT_MODEL):
+    # messages excludes the system prompt and ends with the new user message
+    prompt = [{"role": "system", "content": persona_system_prompt(entry)}]
+    if summary.get("summary"):
+        prompt.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary['summary']}"})
+
+    window = []
+    used = 0
+    for message in reversed(messages[summary.get("summarized_until", 0):]):
+        tokens = count_message_tokens([message], model)
+        if window and used + tokens > budget:
+            break
+        window.insert(0, message)
+        used += tokens
+    return prompt + window
+
+
+def _summarize(entry: dict, previous: str, messages: list):
+    transcript = "\n".join(
+        f"{'Me' if m['role'] == 'user' else entry['name']}: {m['content']}" for m in messages
+    )
+    prompt = f"""Update the running summary of a sales conversation with {entry['name']}.
+Keep the facts, objections, commitments and open questions; drop small talk. At most {SUMMARY_MAX_TOKENS} tokens.
+
+--- Current summary ---
+{previous or "(none)"}
+
+--- New messages ---
+{transcript}
+"""
+    response = chat_completion(
+        [{"role": "user", "content": prompt}],
+        model=SUMMARY_MODEL,
+        temperature=0.2,
+        expected_output_tokens=SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content.strip()
+
+
+def fold_chat_history(bucket: str, lead_path: str, entry: dict, messages: list, summary: dict, budget: int = CONTEXT_TOKENS, model: str = CHAT_MODEL):
+    # Returns the summary, updated and saved when the history overflowed
+    start = summary.get("summarized_until", 0)
+    if count_message_tokens(messages[start:], model) <= budget:
+        return summary
+
+    end = start
+    remaining = count_message_tokens(messages[start:], model)
+    while remaining > budget // 2 and end < len(messages) - 2:
+        remaining -= count_message_tokens([messages[end]], model)
+        end += 1
+    if end == start:
+        return summary
+
+    text = _summarize(entry, summary.get("summary", ""), messages[start:end])
+    summary = {"summary": text, "summarized_until": end, "tokens": count_tokens(text, model)}
+    supa_upload_json(bucket, f"{lead_path}/{SUMMARY_FILENAME}", summary)
+    return summary
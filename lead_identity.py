@@ -0,0 +1,113 @@
+import json
+import hashlib
+from datetime import datetime
+
+from supabase_utils import supa_download_json, supa_upload_json
+from lead_index import lead_key, lead_folder_name, load_lead_index, ENRICHMENT_FIELDS
+from lead_lease import lease_lock
+
+# Cross-scrape identity index at leads/_identity.json: lead_key (LinkedIn
+# profile, else email) -> where the lead's files live and a hash of the last
+# payload stored there. Ingestion uses it to skip unchanged leads, point
+# re-scraped leads at their existing folder (and its persona/email), and give
+# same-name leads on one date distinct folders.
+#
+# A lead re-scraped unchanged on a later date keeps its original folder, so
+# its files (and persona/email) live under the earlier date. Enrichment built
+# for it later is written to that folder and to the index of the date it was
+# built from; LeadCatalog.update_entries also copies it to the owning date's
+# index, which is what linked_enrichment reads for the next scrape.
+IDENTITY_PATH = "_identity.json"
+IDENTITY_VERSION = 1
+
+NEW, CHANGED, UNCHANGED = "new", "changed", "unchanged"
+
+
+def content_hash(lead: dict):
+    payload = json.dumps(lead, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ----------------------------
+# Load / save
+# ----------------------------
+def identity_lock(bucket: str = "leads"):
+    # Held around an ingest's load -> resolve -> save of _identity.json, so
+    # concurrent scrapes don't overwrite each other's identity records
+    return lease_lock(bucket, "", "identity")
+
+
+def load_identity_index(bucket: str = "leads", fresh: bool = False):
+    index = supa_download_json(bucket, IDENTITY_PATH, fresh=fresh)
+    if not index or index.get("version") != IDENTITY_VERSION:
+        return {"version": IDENTITY_VERSION, "leads": {}}
+    return index
+
+
+def save_identity_index(index: dict, bucket: str = "leads"):
+    index["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    supa_upload_json(bucket, IDENTITY_PATH, index)
+    return index
+
+
+# ----------------------------
+# Resolution
+# ----------------------------
+def unique_folder(base: str, key: str, taken: dict):
+    # taken maps folder -> lead_key for one date. A lead without a key can't
+    # be told apart from a namesake, so it never reuses a taken folder.
+    folder, n = base, 2
+    while folder in taken and (key is None or taken[folder] != key):
+        folder = f"{base} ({n})"
+        n += 1
+    return folder
+
+
+def resolve_leads(identity: dict, date: str, leads: list, taken: dict):
+    # Returns one dict per lead: lead, key, hash, folder (under date), path
+    # (where its files live) and status new/changed/unchanged. Unchanged leads
+    # keep the path of their earlier scrape; everything else is written under
+    # date. identity and taken are updated in place.
+    resolved = []
+    for lead in leads:
+        key = lead_key(lead)
+        digest = content_hash(lead)
+        known = identity["leads"].get(key) if key else None
+
+        if known and known["hash"] == digest:
+            status = UNCHANGED
+            path = known["path"]
+            folder = path.split("/", 1)[1] if path.startswith(f"{date}/") else unique_folder(lead_folder_name(lead), key, taken)
+        else:
+            status = CHANGED if known else NEW
+            if known and known["path"].startswith(f"{date}/"):
+                folder = known["path"].split("/", 1)[1]
+            else:
+                folder = unique_folder(lead_folder_name(lead), key, taken)
+            path = f"{date}/{folder}"
+
+        taken[folder] = key
+        if key:
+            record = identity["leads"].setdefault(key, {"first_seen": date, "dates": []})
+            record.update({"path": path, "hash": digest, "last_seen": date})
+            if date not in record["dates"]:
+                record["dates"].append(date)
+        resolved.append({"lead": lead, "key": key, "hash": digest, "folder": folder, "path": path, "status": status})
+    return resolved
+
+
+def linked_enrichment(resolved: list, bucket: str = "leads"):
+    # Persona/email fields of the original index entry for leads whose files
+    # live under an earlier date, keyed by that path
+    by_date = {}
+    for item in resolved:
+        date, folder = item["path"].split("/", 1)
+        by_date.setdefault(date, []).append(folder)
+
+    enrichment = {}
+    for date, folders in by_date.items():
+        entries = (load_lead_index(date, bucket) or {}).get("leads", {})
+        for folder in folders:
+            entry = entries.get(folder) or {}
+            enrichment[f"{date}/{folder}"] = {k: entry[k] for k in ENRICHMENT_FIELDS if entry.get(k)}
+    return enrichment
@@ -0,0 +1,254 @@
+import json
+from datetime import datetime
+
+from supabase_utils import supa_list_all, is_folder, supa_download_json, supa_download_many, supa_upload_json
+from storage_cache import storage_cache
+from lead_lease import LeaseHeld, lease_lock
+
+# Per-scrape index stored at leads/<date>/index.json so a whole scrape can be
+# rendered from a single download instead of one lead.json/persona.json per lead.
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+# Holds the lease that serialises index.json read-modify-writes across processes
+INDEX_LOCK_FOLDER = "_index"
+
+
+def index_path(date: str):
+    return f"{date}/{INDEX_FILENAME}"
+
+
+def index_lock(date: str, bucket: str = "leads"):
+    return lease_lock(bucket, f"{date}/{INDEX_LOCK_FOLDER}", "index")
+
+
+def _check_index_lock(lock, date: str):
+    # Fencing: a writer whose lock expired mid-update must not save over the new holder
+    if not lock.held():
+        raise LeaseHeld(f"Lost the index lock for {date}; update not saved")
+
+
+# ----------------------------
+# Lead flattening
+# ----------------------------
+def current_employment(lead: dict):
+    return next((e for e in lead.get("employment_history", []) if e.get("current")), {})
+
+
+def lead_folder_name(lead: dict):
+    return f"{lead.get('first_name', '')} {lead.get('last_name', '')}".replace("/", "-")
+
+
+def normalize_linkedin_url(url: str):
+    url = (url or "").strip().lower().split("?")[0].rstrip("/")
+    for prefix in ("https://", "http://", "www."):
+        if url.startswith(prefix):
+            url = url[len(prefix):]
+    return url
+
+
+def lead_key(lead: dict):
+    # Stable identity across scrapes: LinkedIn profile, else email.
+    # Works on raw leads and on index entries (same field names).
+    linkedin = normalize_linkedin_url(lead.get("linkedin_url"))
+    if linkedin:
+        return f"li:{linkedin}"
+    email = (lead.get("email") or "").strip().lower()
+    return f"email:{email}" if email else None
+
+
+def flatten_lead(lead: dict):
+    emp = current_employment(lead)
+    phone_list = [p.get("number", "") for p in lead.get("phone_numbers", [])]
+    return {
+        "Full Name": lead_folder_name(lead),
+        "Title": emp.get("title", ""),
+        "Company": emp.get("organization_name", ""),
+        "Email": lead.get("email", ""),
+        "LinkedIn": lead.get("linkedin_url", ""),
+        "City": lead.get("city", ""),
+        "State": lead.get("state", ""),
+        "Country": lead.get("country", ""),
+        "Seniority": lead.get("seniority", ""),
+        "Department": ', '.join(lead.get("departments", [])),
+        "Industry": lead.get("industry", ""),
+        "Skills": ', '.join(lead.get("skills", [])),
+        "Tags": ', '.join(lead.get("tags", [])),
+        "Phone Numbers": ', '.join(phone_list)
+    }
+
+
+def build_index_entry(date: str, folder: str, lead: dict, persona: dict = None, email_status: dict = None):
+    emp = current_employment(lead)
+    org = lead.get("organization") or {}
+    return {
+        "folder": folder,
+        "path": f"{date}/{folder}",
+        "lead_key": lead_key(lead),
+        "name": f"{lead.get('first_name', '')} {lead.get('last_name', '')}",
+        "email": lead.get("email", ""),
+        "company": emp.get("organization_name", ""),
+        "title": emp.get("title", ""),
+        "photo_url": lead.get("photo_url") or "",
+        "linkedin_url": lead.get("linkedin_url") or "",
+        "city": lead.get("city", ""),
+        "state": lead.get("state", ""),
+        "country": lead.get("country", ""),
+        "seniority": lead.get("seniority", ""),
+        "industry": lead.get("industry", ""),
+        "departments": lead.get("departments", []),
+        "skills": lead.get("skills", []),
+        "tags": lead.get("tags", []),
+        # For deck matching, without downloading lead.json
+        "company_keywords": (org.get("keywords") or [])[:15],
+        "has_persona": bool(persona),
+        "persona": persona or None,
+        "has_email_status": bool(email_status),
+        "email_status": email_status or None,
+    }
+
+
+# ----------------------------
+# Load / save
+# ----------------------------
+def load_lead_index(date: str, bucket: str = "leads", fresh: bool = False):
+    index = supa_download_json(bucket, index_path(date), fresh=fresh)
+    if not index or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def save_lead_index(date: str, entries: dict, bucket: str = "leads"):
+    index = {
+        "version": INDEX_VERSION,
+        "date": date,
+        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "leads": entries
+    }
+    supa_upload_json(bucket, index_path(date), index)
+    return index
+
+
+def read_lead_index(date: str, bucket: str = "leads"):
+    # Fresh read that tells the cases apart: (index, missing). A failed read is
+    # (None, False), so it is never mistaken for a date without an index.
+    path = index_path(date)
+    storage_cache.invalidate(bucket, path)
+    result = supa_download_many(bucket, [path])[path]
+    if not result["ok"]:
+        return None, result["missing"]
+    try:
+        return json.loads(result["data"].decode("utf-8")), False
+    except ValueError:
+        return None, False
+
+
+def _scan_lead_folders(date: str, bucket: str = "leads"):
+    # Backfill for scrapes written before the index existed: pay the per-lead
+    # downloads once. Leads linked to an earlier date's folder have no folder
+    # here, which is why this never runs over an existing index. A failed
+    # listing or read raises: a partial scan saved as index.json would stick.
+    try:
+        items = supa_list_all(bucket, f"{date}/")
+    except Exception as e:
+        raise RuntimeError(f"Could not list {bucket}/{date}: {e}") from e
+    # Underscore folders hold the date's bookkeeping (index lock, CSV parts), not leads
+    folders = [item["name"] for item in items if is_folder(item) and not item["name"].startswith("_")]
+    paths = [f"{date}/{folder}/{name}" for folder in folders for name in ("lead.json", "persona.json", "email_status.json")]
+    results = supa_download_many(bucket, paths)
+    failed = [path for path, result in results.items() if not result["ok"] and not result["missing"]]
+    if failed:
+        raise RuntimeError(f"Could not read {len(failed)} lead files under {bucket}/{date}, e.g. {failed[0]}")
+    docs = {}
+    for path, result in results.items():
+        try:
+            docs[path] = json.loads(result["data"].decode("utf-8")) if result["ok"] else None
+        except ValueError:
+            docs[path] = None
+
+    entries = {}
+    for folder in folders:
+        lead = docs.get(f"{date}/{folder}/lead.json")
+        if not lead:
+            continue
+        persona = docs.get(f"{date}/{folder}/persona.json")
+        email_status = docs.get(f"{date}/{folder}/email_status.json")
+        entries[folder] = build_index_entry(date, folder, lead, persona, email_status)
+    return entries
+
+
+def _locked_lead_index(date: str, bucket: str = "leads"):
+    # The caller holds the index lock. The index is rebuilt only when it is
+    # confirmed missing or in an older format; a read error raises instead of
+    # overwriting another process's index with a partial rebuild.
+    index, missing = read_lead_index(date, bucket)
+    if index is not None and index.get("version") == INDEX_VERSION:
+        return index
+    if index is None and not missing:
+        raise RuntimeError(f"Could not read {bucket}/{index_path(date)}")
+    return save_lead_index(date, _scan_lead_folders(date, bucket), bucket)
+
+
+def rebuild_lead_index(date: str, bucket: str = "leads"):
+    with index_lock(date, bucket):
+        return _locked_lead_index(date, bucket)
+
+
+def get_lead_index(date: str, bucket: str = "leads"):
+    return load_lead_index(date, bucket) or rebuild_lead_index(date, bucket)
+
+
+# ----------------------------
+# Incremental updates
+# ----------------------------
+ENRICHMENT_FIELDS = ("has_persona", "persona", "has_email_status", "email_status")
+
+
+def merge_lead_index(date: str, new_entries: dict, bucket: str = "leads"):
+    # A re-scrape on the same day must not drop personas/emails already built
+    with index_lock(date, bucket) as lock:
+        existing, missing = read_lead_index(date, bucket)
+        if existing is None and not missing:
+            raise RuntimeError(f"Could not read {bucket}/{index_path(date)}")
+        entries = dict(existing.get("leads", {})) if existing and existing.get("version") == INDEX_VERSION else {}
+        for folder, entry in new_entries.items():
+            previous = entries.get(folder)
+            if previous:
+                entry.update({k: previous[k] for k in ENRICHMENT_FIELDS if previous.get(k)})
+            entries[folder] = entry
+        _check_index_lock(lock, date)
+        return save_lead_index(date, entries, bucket)
+
+
+def update_lead_index_many(date: str, updates: dict, bucket: str = "leads"):
+    # updates maps folder -> fields; one index read and one write for the lot.
+    # The read is fresh and under the index lock, so updates from other
+    # processes (replicas, workers) are never overwritten.
+    with index_lock(date, bucket) as lock:
+        index = _locked_lead_index(date, bucket)
+        entries = index.get("leads", {})
+        updated = {}
+        for folder, fields in updates.items():
+            entry = entries.get(folder)
+            if entry is None:
+                lead = supa_download_json(bucket, f"{date}/{folder}/lead.json")
+                if not lead:
+                    print(f"[update_lead_index] No lead.json for {date}/{folder}")
+                    continue
+                entry = build_index_entry(date, folder, lead)
+
+            fields = dict(fields)
+            if "persona" in fields:
+                fields["has_persona"] = bool(fields["persona"])
+            if "email_status" in fields:
+                fields["has_email_status"] = bool(fields["email_status"])
+            entry.update(fields)
+            entries[folder] = updated[folder] = entry
+
+        if updated:
+            _check_index_lock(lock, date)
+            save_lead_index(date, entries, bucket)
+    return updated
+
+
+def update_lead_index(date: str, folder: str, bucket: str = "leads", **fields):
+    return update_lead_index_many(date, {folder: fields}, bucket).get(folder)
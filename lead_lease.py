@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from supabase_utils import supa_list_files, supa_upload_file, supa_upload_json, supa_download_json, supa_delete_file
+
+# Claims on lead work shared by every app replica and worker process. A lease
+# is a small JSON object in the folder it guards, e.g.
+# <date>/<name>/persona.lease.<n>, created with upsert off so exactly one
+# process can create generation n. Only the highest generation counts and
+# generations only ever increase: releasing overwrites the holder's file with
+# a "released" tombstone rather than deleting it, and an acquirer only prunes
+# generations below the one it created and confirmed as the highest. The
+# holder renews its lease in the background; if it stops (crash, lost
+# network) the lease expires and the next process claims generation n+1. The
+# holder checks held() before writing results, so a process whose lease was
+# taken over never overwrites the new holder.
+# Expiry uses the writer's clock; hosts are assumed to be roughly in sync.
+LEASE_TTL = float(os.getenv("BD_LEASE_TTL", "120"))
+LEASE_MARKER = ".lease."
+
+
+class LeaseHeld(Exception):
+    pass
+
+
+def lease_owner():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _folder_prefix(folder: str):
+    # folder "" puts the lease at the bucket root, next to _identity.json
+    return f"{folder}/" if folder else ""
+
+
+def _generations(bucket: str, folder: str, task: str):
+    prefix = f"{task}{LEASE_MARKER}"
+    suffixes = (name[len(prefix):] for name in supa_list_files(bucket, _folder_prefix(folder)) if name.startswith(prefix))
+    return sorted(int(suffix) for suffix in suffixes if suffix.isdigit())
+
+
+def _lease_path(folder: str, task: str, generation: int):
+    return f"{_folder_prefix(folder)}{task}{LEASE_MARKER}{generation}"
+
+
+class Lease:
+    def __init__(self, bucket: str, folder: str, task: str, generation: int, owner: str, ttl: float = LEASE_TTL):
+        self.bucket = bucket
+        self.folder = folder
+        self.task = task
+        self.generation = generation
+        self.owner = owner
+        self.ttl = ttl
+        self.acquired_at = time.time()
+        self.expires_at = 0
+        self.released = False
+        # Renewals and release are serialised so a late renewal can't
+        # re-create a lease file that was just deleted
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return _lease_path(self.folder, self.task, self.generation)
+
+    def document(self, released: bool = False):
+        now = time.time()
+        return {
+            "owner": self.owner, "task": self.task, "generation": self.generation,
+            "acquired_at": self.acquired_at, "heartbeat_at": now,
+            "expires_at": 0 if released else now + self.ttl, "released": released
+        }
+
+    def _is_latest(self):
+        generations = _generations(self.bucket, self.folder, self.task)
+        return bool(generations) and generations[-1] == self.generation
+
+    def renew(self):
+        with self._lock:
+            # A superseded lease is not written again
+            if self.released or not self._is_latest():
+                return False
+            doc = self.document()
+            if supa_upload_json(self.bucket, self.path, doc):
+                self.expires_at = doc["expires_at"]
+                return True
+            return False
+
+    def held(self):
+        # Still ours: not expired and no later generation claimed since
+        if self.released or time.time() >= self.expires_at:
+            return False
+        return self._is_latest()
+
+    def release(self):
+        # The file stays as a tombstone so its generation is never reused
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+            lease_keeper.discard(self)
+            if self._is_latest():
+                supa_upload_json(self.bucket, self.path, self.document(released=True))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _is_live(doc):
+    return bool(doc) and not doc.get("released") and doc.get("expires_at", 0) > time.time()
+
+
+def acquire_lease(bucket: str, folder: str, task: str, ttl: float = LEASE_TTL, owner: str = None):
+    # Returns a Lease, or None while another process holds an unexpired one
+    owner = owner or lease_owner()
+    generations = _generations(bucket, folder, task)
+    if generations:
+        current = supa_download_json(bucket, _lease_path(folder, task, generations[-1]), fresh=True)
+        # A generation that can't be read was pruned by a newer holder
+        if current is None or _is_live(current):
+            return None
+
+    lease = Lease(bucket, folder, task, (generations[-1] if generations else 0) + 1, owner, ttl)
+    doc = lease.document()
+    created = supa_upload_file(bucket, lease.path, json.dumps(doc).encode("utf-8"), {"content-type": "application/json", "upsert": "false"})
+    if not created:
+        # Another process created this generation first, unless it was our
+        # own create whose response got lost
+        existing = supa_download_json(bucket, lease.path, fresh=True)
+        if not existing or existing.get("owner") != owner:
+            return None
+    lease.expires_at = doc["expires_at"]
+
+    # The listing above may be stale (e.g. this generation was pruned and
+    # re-created below a newer one): only the highest generation is valid
+    generations = _generations(bucket, folder, task)
+    if not generations or generations[-1] != lease.generation:
+        supa_delete_file(bucket, lease.path)
+        return None
+    for generation in generations[:-1]:
+        supa_delete_file(bucket, _lease_path(folder, task, generation))
+    lease_keeper.add(lease)
+    return lease
+
+
+def current_lease(bucket: str, folder: str, task: str):
+    # The live lease document, if any, e.g. to show who is working on a lead
+    generations = _generations(bucket, folder, task)
+    if not generations:
+        return None
+    doc = supa_download_json(bucket, _lease_path(folder, task, generations[-1]), fresh=True)
+    return doc if _is_live(doc) else None
+
+
+@contextmanager
+def lease_lock(bucket: str, folder: str, task: str, timeout: float = 60, ttl: float = 30, poll: float = 0.2):
+    # Blocking form for short critical sections, e.g. an index read-modify-write
+    deadline = time.time() + timeout
+    while True:
+        lease = acquire_lease(bucket, folder, task, ttl)
+        if lease is not None:
+            break
+        if time.time() >= deadline:
+            raise TimeoutError(f"{bucket}/{folder} is locked by another process ({task})")
+        time.sleep(poll + random.uniform(0, poll))
+    try:
+        yield lease
+    finally:
+        lease.release()
+
+
+def shard_order(entries, owner: str):
+    # A per-process order over the same entries, so N processes running one
+    # batch mostly start on different leads instead of queueing on leases
+    return sorted(entries, key=lambda e: hashlib.sha1(f"{owner}:{e['path']}".encode("utf-8")).hexdigest())
+
+
+class LeaseKeeper:
+    # One background thread renewing every lease this process holds once a
+    # third of its TTL has passed
+    def __init__(self, interval: float = 5):
+        self.interval = interval
+        self._leases = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, lease: Lease):
+        with self._lock:
+            self._leases.add(lease)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+                self._thread.start()
+
+    def discard(self, lease: Lease):
+        with self._lock:
+            self._leases.discard(lease)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                leases = list(self._leases)
+            now = time.time()
+            for lease in leases:
+                if not lease.released and lease.expires_at - now < lease.ttl * 2 / 3:
+                    lease.renew()
+
+
+lease_keeper = LeaseKeeper(interval=min(5, LEASE_TTL / 6))
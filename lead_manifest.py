@@ -0,0 +1,108 @@
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from supabase_utils import supa_list_all, supa_download_json, supa_upload_json, is_folder, MAX_WORKERS
+from lead_lease import LEASE_MARKER
+from metrics import metrics
+
+# Manifest of every object under the leads bucket (path, size, updated_at),
+# stored at leads/_manifest.json. A refresh lists the date folders, lists each
+# date's top level concurrently, and only re-walks the lead folders of dates
+# whose top-level listing changed since the manifest was written.
+MANIFEST_PATH = "_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _object_meta(item: dict):
+    metadata = item.get("metadata") or {}
+    return {
+        "size": metadata.get("size"),
+        "updated_at": item.get("updated_at"),
+        "etag": metadata.get("eTag")
+    }
+
+
+def _signature(items: list):
+    # index.json is rewritten on every persona/email update, so its
+    # updated_at moving is enough to mark the whole date as changed
+    parts = sorted(f"{item['name']}|{item.get('updated_at')}" for item in items)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _walk_date(bucket: str, date: str, top_level: list, pool: ThreadPoolExecutor):
+    objects = {}
+    folders = []
+    for item in top_level:
+        if is_folder(item):
+            folders.append(item["name"])
+        else:
+            objects[f"{date}/{item['name']}"] = _object_meta(item)
+
+    listings = pool.map(metrics.bind(lambda folder: (folder, supa_list_all(bucket, f"{date}/{folder}"))), folders)
+    for folder, items in listings:
+        for item in items:
+            # Lease files are coordination state, not lead data
+            if not is_folder(item) and LEASE_MARKER not in item["name"]:
+                objects[f"{date}/{folder}/{item['name']}"] = _object_meta(item)
+    return objects
+
+
+# ----------------------------
+# Load / save
+# ----------------------------
+def load_manifest(bucket: str = "leads"):
+    manifest = supa_download_json(bucket, MANIFEST_PATH)
+    if not manifest or manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "dates": {}}
+    return manifest
+
+
+def save_manifest(manifest: dict, bucket: str = "leads"):
+    manifest["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    supa_upload_json(bucket, MANIFEST_PATH, manifest)
+    return manifest
+
+
+def manifest_objects(manifest: dict):
+    return {path: meta for date in manifest["dates"].values() for path, meta in date["objects"].items()}
+
+
+# ----------------------------
+# Refresh with delta
+# ----------------------------
+def diff_objects(old: dict, new: dict):
+    return {
+        "added": sorted(set(new) - set(old)),
+        "removed": sorted(set(old) - set(new)),
+        "changed": sorted(p for p in set(old) & set(new) if old[p] != new[p])
+    }
+
+
+def refresh_manifest(bucket: str = "leads", full: bool = False, max_workers: int = None):
+    # Returns (manifest, diff, stats); diff lists object paths added/removed/changed.
+    # Listing errors raise rather than read as an empty bucket, so a failed
+    # refresh never saves a manifest with the dates it could not see.
+    manifest = load_manifest(bucket)
+    previous = manifest_objects(manifest)
+    dates = [item["name"] for item in supa_list_all(bucket) if is_folder(item)]
+    stats = {"dates": len(dates), "rewalked": 0}
+
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS) as pool:
+        top_levels = dict(pool.map(metrics.bind(lambda d: (d, supa_list_all(bucket, f"{d}/"))), dates))
+
+        new_dates = {}
+        for date in dates:
+            signature = _signature(top_levels[date])
+            known = manifest["dates"].get(date)
+            if not full and known and known["signature"] == signature:
+                new_dates[date] = known
+                continue
+            stats["rewalked"] += 1
+            new_dates[date] = {"signature": signature, "objects": _walk_date(bucket, date, top_levels[date], pool)}
+
+    manifest["dates"] = new_dates
+    diff = diff_objects(previous, manifest_objects(manifest))
+    if full or any(diff.values()) or stats["rewalked"]:
+        save_manifest(manifest, bucket)
+    return manifest, diff, stats
@@ -0,0 +1,90 @@
+import re
+from bisect import bisect_left
+
+# In-memory search over lead index entries: an inverted index from tokens to
+# lead ids, with a sorted vocabulary so prefix queries are a bisect plus a
+# range scan, and per-facet value -> ids sets for filtering and counts.
+SEARCH_FIELDS = ("name", "email", "company", "title", "skills", "tags")
+FACETS = ("seniority", "departments", "industry", "city", "country")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _values(entry: dict, field: str):
+    value = entry.get(field)
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class LeadSearchIndex:
+    def __init__(self, entries: list):
+        self.entries = list(entries)
+        self.postings = {}
+        self.facets = {facet: {} for facet in FACETS}
+
+        for i, entry in enumerate(self.entries):
+            for field in SEARCH_FIELDS:
+                for value in _values(entry, field):
+                    for token in tokenize(str(value)):
+                        self.postings.setdefault(token, set()).add(i)
+            email = (entry.get("email") or "").lower()
+            if email:
+                self.postings.setdefault(email, set()).add(i)
+            for facet in FACETS:
+                for value in _values(entry, facet):
+                    self.facets[facet].setdefault(str(value), set()).add(i)
+
+        self.vocab = sorted(self.postings)
+
+    def _prefix_ids(self, prefix: str):
+        ids = set()
+        start = bisect_left(self.vocab, prefix)
+        for token in self.vocab[start:]:
+            if not token.startswith(prefix):
+                break
+            ids |= self.postings[token]
+        return ids
+
+    def _query_ids(self, query: str):
+        # Every query token must prefix-match some token of the lead
+        terms = tokenize(query)
+        if not terms:
+            return set(range(len(self.entries)))
+        ids = None
+        for term in terms:
+            matched = self._prefix_ids(term)
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                break
+        return ids
+
+    def _filter_ids(self, ids: set, filters: dict, skip: str = None):
+        for facet, selected in (filters or {}).items():
+            if facet == skip or not selected:
+                continue
+            allowed = set()
+            for value in selected:
+                allowed |= self.facets.get(facet, {}).get(value, set())
+            ids = ids & allowed
+        return ids
+
+    def search(self, query: str = "", filters: dict = None):
+        # filters maps facet -> selected values (OR within a facet, AND across).
+        # Facet counts for a facet ignore that facet's own selection, so the
+        # other values stay visible with the counts they would yield.
+        base = self._query_ids(query)
+        ids = self._filter_ids(base, filters)
+        counts = {}
+        for facet in FACETS:
+            facet_ids = self._filter_ids(base, filters, skip=facet)
+            counts[facet] = {
+                value: len(members & facet_ids)
+                for value, members in self.facets[facet].items()
+                if members & facet_ids
+            }
+        return [self.entries[i] for i in sorted(ids)], counts
@@ -0,0 +1,311 @@
+import os
+import io
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from supabase_utils import supa_list_folders, supa_list_files, supa_download_many, supa_download_json_many, supa_upload_many
+from lead_index import current_employment, lead_folder_name, lead_key, get_lead_index
+
+# Columnar copy of the flattened lead fields. Each source writes one Parquet
+# file per scrape date: leads/<date>/<source>.parquet in storage, mirrored to
+# <BD_LEAD_STORE_DIR>/scrape_date=<date>/<source>.parquet locally, so queries
+# go through a hive-partitioned pyarrow dataset and only touch the columns
+# and dates they ask for. Rows from every source carry lead_key (LinkedIn
+# profile, else email) so scrapes and CSV exports join on the same id.
+STORE_DIR = os.getenv("BD_LEAD_STORE_DIR", os.path.join(".cache", "lead_store"))
+SCRAPE_SOURCE = "apollo"
+PARQUET_SUFFIX = ".parquet"
+
+_strings = pa.list_(pa.string())
+
+LEAD_SCHEMA = pa.schema([
+    ("lead_key", pa.string()),
+    ("source", pa.string()),
+    ("folder", pa.string()),
+    ("path", pa.string()),
+    ("first_name", pa.string()),
+    ("last_name", pa.string()),
+    ("name", pa.string()),
+    ("headline", pa.string()),
+    ("title", pa.string()),
+    ("seniority", pa.string()),
+    ("departments", _strings),
+    ("skills", _strings),
+    ("tags", _strings),
+    ("email", pa.string()),
+    ("email_verification", pa.string()),
+    ("phone_numbers", _strings),
+    ("linkedin_url", pa.string()),
+    ("photo_url", pa.string()),
+    ("city", pa.string()),
+    ("state", pa.string()),
+    ("country", pa.string()),
+    ("company", pa.string()),
+    ("company_domain", pa.string()),
+    ("industry", pa.string()),
+    ("company_size", pa.int64()),
+    ("has_persona", pa.bool_()),
+    ("persona_type", pa.string()),
+    ("has_email_status", pa.bool_()),
+    ("deck_name", pa.string()),
+    ("ingested_at", pa.timestamp("s")),
+])
+STORE_SCHEMA = LEAD_SCHEMA.append(pa.field("scrape_date", pa.string()))
+PARTITIONING = ds.partitioning(pa.schema([("scrape_date", pa.string())]), flavor="hive")
+
+# Column maps for the local CSV exports (header -> schema field)
+ENRICHED_CSV_COLUMNS = {
+    "First Name": "first_name",
+    "Last Name": "last_name",
+    "Full Name": "name",
+    "Photo URL": "photo_url",
+    "Headline": "headline",
+    "Seniority": "seniority",
+    "Departments": "departments",
+    "Tags": "tags",
+    "Skills": "skills",
+    "City": "city",
+    "State": "state",
+    "Country": "country",
+    "Job Title": "title",
+    "Company Name": "company",
+    "Company Domain": "company_domain",
+    "Company Industry": "industry",
+    "Company Size": "company_size",
+    "Work Email": "email",
+    "Phone Numbers": "phone_numbers",
+    "Email Status": "email_verification",
+    "LinkedIn URL": "linkedin_url",
+}
+SCRAPED_CSV_COLUMNS = {
+    "First Name": "first_name",
+    "Last Name": "last_name",
+    "Title": "title",
+    "Company": "company",
+    "Email": "email",
+    "Location": "location",
+    "LinkedIn": "linkedin_url",
+}
+LIST_FIELDS = ("departments", "skills", "tags", "phone_numbers")
+
+
+def partition_dir(date: str, store_dir: str = None):
+    return os.path.join(store_dir or STORE_DIR, f"scrape_date={date}")
+
+
+# ----------------------------
+# Records
+# ----------------------------
+def lead_record(lead: dict, folder: str = None, date: str = None, entry: dict = None):
+    # entry is the lead's index entry, if any, for the enrichment columns
+    emp = current_employment(lead)
+    org = lead.get("organization") or {}
+    entry = entry or {}
+    folder = folder or lead_folder_name(lead)
+    persona = entry.get("persona") or {}
+    email_status = entry.get("email_status") or {}
+    return {
+        "lead_key": lead_key(lead),
+        "source": SCRAPE_SOURCE,
+        "folder": folder,
+        "path": f"{date}/{folder}" if date else None,
+        "first_name": lead.get("first_name"),
+        "last_name": lead.get("last_name"),
+        "name": f"{lead.get('first_name', '')} {lead.get('last_name', '')}".strip(),
+        "headline": lead.get("headline"),
+        "title": emp.get("title") or lead.get("title"),
+        "seniority": lead.get("seniority"),
+        "departments": lead.get("departments") or [],
+        "skills": lead.get("skills") or [],
+        "tags": lead.get("tags") or [],
+        "email": lead.get("email"),
+        "email_verification": lead.get("email_status"),
+        "phone_numbers": [p.get("number", "") for p in lead.get("phone_numbers") or []],
+        "linkedin_url": lead.get("linkedin_url"),
+        "photo_url": lead.get("photo_url"),
+        "city": lead.get("city"),
+        "state": lead.get("state"),
+        "country": lead.get("country"),
+        "company": emp.get("organization_name") or org.get("name"),
+        "company_domain": org.get("primary_domain"),
+        "industry": lead.get("industry") or org.get("industry"),
+        "company_size": _to_int(org.get("estimated_num_employees")),
+        "has_persona": bool(persona),
+        "persona_type": persona.get("persona_type"),
+        "has_email_status": bool(email_status),
+        "deck_name": email_status.get("recommended_deck"),
+    }
+
+
+def csv_records(df, columns: dict, source: str):
+    records = []
+    for row in df.rename(columns=columns).to_dict(orient="records"):
+        record = {field: _clean(row.get(field)) for field in LEAD_SCHEMA.names if field in row}
+        for field in LIST_FIELDS:
+            if field in record:
+                record[field] = [v.strip() for v in (record[field] or "").split(",") if v.strip()]
+        if "location" in row and not record.get("city"):
+            parts = [p.strip() for p in str(_clean(row["location"]) or "").split(",")]
+            record["city"], record["state"] = (parts + [None, None])[:2]
+        record["company_size"] = _to_int(record.get("company_size"))
+        record["name"] = record.get("name") or f"{record.get('first_name') or ''} {record.get('last_name') or ''}".strip()
+        record["lead_key"] = lead_key(record)
+        record["source"] = source
+        records.append(record)
+    return records
+
+
+def _clean(value):
+    # pandas reads empty CSV cells as NaN
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value) if not isinstance(value, str) else value
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def build_table(records: list):
+    now = datetime.now().replace(microsecond=0)
+    rows = [{**{name: None for name in LEAD_SCHEMA.names}, "ingested_at": now, **r} for r in records]
+    return pa.Table.from_pylist(rows, schema=LEAD_SCHEMA)
+
+
+# ----------------------------
+# Write / sync
+# ----------------------------
+def _write_local(date: str, source: str, content: bytes, store_dir: str = None):
+    directory = partition_dir(date, store_dir)
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, source + PARQUET_SUFFIX)
+    # Dot-prefixed so a concurrent dataset scan skips the partial file
+    tmp_path = os.path.join(directory, f".{source}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def write_partition(date: str, records: list, source: str = SCRAPE_SOURCE, bucket: str = "leads", store_dir: str = None):
+    # Replaces the date's file for this source, in storage and locally
+    buffer = io.BytesIO()
+    pq.write_table(build_table(records), buffer, compression="zstd")
+    content = buffer.getvalue()
+
+    result = supa_upload_many(bucket, {f"{date}/{source}{PARQUET_SUFFIX}": content})
+    if not all(r["ok"] for r in result.values()):
+        print(f"[lead_store] Upload failed for {date}/{source}{PARQUET_SUFFIX}; kept local copy only")
+    return _write_local(date, source, content, store_dir)
+
+
+def upsert_partition(date: str, records: list, source: str = SCRAPE_SOURCE, bucket: str = "leads", store_dir: str = None):
+    # Merges records into the date's file, replacing rows with the same folder;
+    # used by scrape ingestion, which writes one page of leads at a time
+    local_path = os.path.join(partition_dir(date, store_dir), source + PARQUET_SUFFIX)
+    if not os.path.exists(local_path):
+        sync_partitions([date], bucket, store_dir)
+    if os.path.exists(local_path):
+        folders = {r["folder"] for r in records}
+        existing = pq.read_table(local_path, schema=LEAD_SCHEMA).to_pylist()
+        records = [r for r in existing if r["folder"] not in folders] + list(records)
+    return write_partition(date, records, source, bucket, store_dir)
+
+
+def build_partition(date: str, bucket: str = "leads", store_dir: str = None):
+    # Rebuilds a date's scrape partition from its index and lead.json files
+    entries = get_lead_index(date, bucket).get("leads", {})
+    leads = supa_download_json_many(bucket, [f"{e['path']}/lead.json" for e in entries.values()])
+    records = [
+        lead_record(leads[f"{e['path']}/lead.json"], folder, date, e)
+        for folder, e in entries.items()
+        if leads.get(f"{e['path']}/lead.json")
+    ]
+    return write_partition(date, records, SCRAPE_SOURCE, bucket, store_dir)
+
+
+def sync_partitions(dates: list = None, bucket: str = "leads", store_dir: str = None):
+    # Pulls Parquet files from storage into the local dataset. Downloads go
+    # through the storage cache, so unchanged files cost a conditional GET.
+    dates = dates if dates is not None else supa_list_folders(bucket)
+    paths = [
+        f"{date}/{name}"
+        for date in dates
+        for name in supa_list_files(bucket, f"{date}/")
+        if name.endswith(PARQUET_SUFFIX)
+    ]
+    synced = []
+    for path, result in supa_download_many(bucket, paths).items():
+        if not result["ok"]:
+            continue
+        date, name = path.split("/", 1)
+        local_path = os.path.join(partition_dir(date, store_dir), name)
+        if os.path.exists(local_path) and os.path.getsize(local_path) == len(result["data"]):
+            with open(local_path, "rb") as f:
+                if f.read() == result["data"]:
+                    continue
+        synced.append(_write_local(date, name[:-len(PARQUET_SUFFIX)], result["data"], store_dir))
+    return synced
+
+
+def import_csv(csv_path: str, date: str, columns: dict = None, source: str = None, bucket: str = "leads", store_dir: str = None):
+    # e.g. import_csv("enriched_leads.csv", "2025-07-14", ENRICHED_CSV_COLUMNS)
+    import pandas as pd
+
+    source = source or os.path.splitext(os.path.basename(csv_path))[0]
+    columns = columns or (ENRICHED_CSV_COLUMNS if "enriched" in source else SCRAPED_CSV_COLUMNS)
+    records = csv_records(pd.read_csv(csv_path), columns, source)
+    return write_partition(date, records, source, bucket, store_dir)
+
+
+# ----------------------------
+# Query
+# ----------------------------
+def lead_dataset(store_dir: str = None):
+    return ds.dataset(
+        store_dir or STORE_DIR,
+        schema=STORE_SCHEMA,
+        format="parquet",
+        partitioning=PARTITIONING
+    )
+
+
+def filter_expression(filters: dict):
+    # filters maps column -> value (equality), list/set/tuple (membership),
+    # or a ready pyarrow compute expression
+    expression = None
+    for column, value in (filters or {}).items():
+        if isinstance(value, pc.Expression):
+            condition = value
+        elif isinstance(value, (list, set, tuple)):
+            condition = pc.field(column).isin(list(value))
+        elif value is None:
+            condition = pc.field(column).is_null()
+        else:
+            condition = pc.field(column) == value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def query(columns: list = None, filters: dict = None, dates: list = None, store_dir: str = None):
+    # Projection and predicates are pushed into the Parquet scan; a dates
+    # filter prunes whole partitions before any file is opened
+    directory = store_dir or STORE_DIR
+    if not os.path.isdir(directory):
+        empty = STORE_SCHEMA.empty_table()
+        return empty.select(columns) if columns else empty
+    filters = dict(filters or {})
+    if dates is not None:
+        filters["scrape_date"] = list(dates)
+    return lead_dataset(directory).to_table(columns=columns, filter=filter_expression(filters))
+
+
+def query_df(columns: list = None, filters: dict = None, dates: list = None, store_dir: str = None):
+    return query(columns, filters, dates, store_dir).to_pandas()
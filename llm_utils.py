@@ -0,0 +1,202 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from response_cache import response_cache
+from metrics import metrics
+
+load_dotenv()
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    from openai import OpenAI
+    # Retries are handled here so 429s feed back into the shared rate limiter
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+
+def estimate_tokens(text: str):
+    return max(1, len(text) // 4)
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    # tiktoken is optional; without it counts fall back to estimate_tokens
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4"):
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text or "")
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def count_message_tokens(messages, model: str = "gpt-4"):
+    return sum(count_tokens(m.get("content") or "", model) + 4 for m in messages)
+
+
+# ----------------------------
+# Retry-After parsing
+# ----------------------------
+def parse_retry_after(headers):
+    if not headers:
+        return None
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# ----------------------------
+# RPM / TPM budget
+# ----------------------------
+class RateLimiter:
+    # Sliding one-minute window over requests and tokens, shared by every
+    # worker thread. A 429 pauses all callers until the server's Retry-After.
+    def __init__(self, rpm: int = None, tpm: int = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.throttled = 0
+        self._window = deque()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0):
+        while True:
+            with self._lock:
+                now = time.time()
+                while self._window and now - self._window[0][0] >= 60:
+                    self._window.popleft()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    used = sum(t for _, t in self._window)
+                    fits_rpm = not self.rpm or len(self._window) < self.rpm
+                    fits_tpm = not self.tpm or not self._window or used + tokens <= self.tpm
+                    if fits_rpm and fits_tpm:
+                        self._window.append((now, tokens))
+                        return
+                    wait = self._window[0][0] + 60 - now
+            time.sleep(max(wait, 0.05))
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+
+def with_rate_limit_retries(fn, limiter: RateLimiter = None, tokens: int = 0, max_retries: int = LLM_MAX_RETRIES):
+    # Calls fn(), backing off on 429/5xx. Retry-After from the response wins
+    # over the exponential schedule.
+    from openai import RateLimitError, APIStatusError, APIConnectionError
+
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire(tokens)
+        try:
+            return fn()
+        except (RateLimitError, APIStatusError, APIConnectionError) as e:
+            status = getattr(e, "status_code", None)
+            retryable = isinstance(e, (RateLimitError, APIConnectionError)) or (status or 0) >= 500
+            if not retryable or attempt == max_retries:
+                raise
+            metrics.retry("openai", "chat")
+            response = getattr(e, "response", None)
+            delay = parse_retry_after(response.headers if response is not None else None)
+            if delay is None:
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+            if limiter and status == 429:
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+
+def chat_completion(messages, model: str, temperature: float = 0.7, limiter: RateLimiter = None, expected_output_tokens: int = 500, cache_kind: str = None, validate=None):
+    # With cache_kind set, identical (model, messages, temperature) calls are
+    # answered from the response cache; validate(response) must pass before a
+    # fresh response is cached.
+    from openai.types.chat import ChatCompletion
+
+    client = get_openai_client()
+    tokens = message_tokens(messages) + expected_output_tokens
+
+    def create():
+        with metrics.span("openai", "chat", model) as span:
+            response = client.chat.completions.create(model=model, messages=messages, temperature=temperature)
+            usage = getattr(response, "usage", None)
+            span["tokens"] = usage.total_tokens if usage else 0
+        return response
+
+    def call():
+        return with_rate_limit_retries(create, limiter, tokens)
+
+    if not cache_kind:
+        return call()
+
+    data = response_cache.cached(
+        cache_kind,
+        model,
+        messages,
+        lambda: call().model_dump(mode="json"),
+        temperature=temperature,
+        validate=(lambda d: validate(ChatCompletion.model_validate(d))) if validate else None
+    )
+    return ChatCompletion.model_validate(data)
+
+
+def stream_chat_completion(messages, model: str, temperature: float = 0.7, limiter: RateLimiter = None, expected_output_tokens: int = 500):
+    # Yields the reply text as it arrives. Never cached; see response_cache.
+    client = get_openai_client()
+    parts = []
+    with metrics.span("openai", "chat_stream", model) as span:
+        stream = with_rate_limit_retries(
+            lambda: client.chat.completions.create(model=model, messages=messages, temperature=temperature, stream=True),
+            limiter,
+            message_tokens(messages) + expected_output_tokens
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        # Streamed responses carry no usage; count locally
+        span["tokens"] = count_message_tokens(messages, model) + count_tokens("".join(parts), model)
+
+
+def default_limiter():
+    return RateLimiter(
+        rpm=int(os.getenv("OPENAI_RPM", "60")),
+        tpm=int(os.getenv("OPENAI_TPM", "40000"))
+    )
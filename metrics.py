@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Process-wide call tracing for the hot paths: storage, Apify and Relevance
+# HTTP, OpenAI completions and the response cache. Every call becomes a span
+# (kind, op, latency, bytes, tokens, cache result, ok); recent spans are kept
+# in a ring buffer for the per-rerun panel and aggregated into counters and
+# latency histograms for the Prometheus exporter. With BD_METRICS_JSONL set,
+# every span is also appended to that file. Spans carry the scope that was
+# set when they ran (the app sets one per browser session), so one session's
+# panel does not show another's calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_SPANS = 5000
+
+_scope = contextvars.ContextVar("metrics_scope", default=None)
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True, jsonl_path: str = None, recent: int = RECENT_SPANS):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self._recent = deque(maxlen=recent)
+        self._seq = 0
+        self._series = {}
+        self._retries = {}
+        self._lock = threading.Lock()
+
+    def mark(self):
+        # Sequence number to pass to since(), e.g. at the start of a rerun
+        return self._seq
+
+    def since(self, mark: int, scope: str = None):
+        # With scope, only spans recorded under that scope
+        with self._lock:
+            return [s for s in self._recent if s["seq"] > mark and (scope is None or s.get("scope") == scope)]
+
+    def set_scope(self, scope: str):
+        # Tags the spans this thread records from now on
+        _scope.set(scope)
+
+    def bind(self, fn):
+        # fn, run under the caller's scope, for handing to a thread pool
+        scope = _scope.get()
+
+        def run(*args, **kwargs):
+            token = _scope.set(scope)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _scope.reset(token)
+        return run
+
+    @contextmanager
+    def span(self, kind: str, op: str, target: str = None, **fields):
+        # The yielded dict can be filled in by the caller (bytes, tokens, cache)
+        record = {"kind": kind, "op": op, "target": target, "bytes": 0, "tokens": 0, "cache": None, **fields}
+        if not self.enabled:
+            yield record
+            return
+        started = time.perf_counter()
+        try:
+            yield record
+            record.setdefault("ok", True)
+        except BaseException as e:
+            record["ok"] = False
+            record["error"] = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - started
+            self.record(record)
+
+    def event(self, kind: str, op: str, target: str = None, **fields):
+        # Zero-latency span, e.g. a cache lookup
+        if self.enabled:
+            self.record({"kind": kind, "op": op, "target": target, "bytes": 0, "tokens": 0, "cache": None, "ok": True, "seconds": 0.0, **fields})
+
+    def retry(self, kind: str, op: str):
+        if self.enabled:
+            with self._lock:
+                self._retries[(kind, op)] = self._retries.get((kind, op), 0) + 1
+
+    def record(self, span: dict):
+        span["ts"] = time.time()
+        span.setdefault("scope", _scope.get())
+        with self._lock:
+            self._seq += 1
+            span["seq"] = self._seq
+            self._recent.append(span)
+            self._aggregate(span)
+        if self.jsonl_path:
+            self._append_jsonl([span])
+
+    def _aggregate(self, span: dict):
+        key = (span["kind"], span["op"])
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {
+                "calls": 0, "errors": 0, "seconds": 0.0, "bytes": 0, "tokens": 0,
+                "cache": {}, "buckets": [0] * len(LATENCY_BUCKETS)
+            }
+        series["calls"] += 1
+        series["errors"] += 0 if span.get("ok", True) else 1
+        series["seconds"] += span["seconds"]
+        series["bytes"] += span.get("bytes") or 0
+        series["tokens"] += span.get("tokens") or 0
+        if span.get("cache"):
+            series["cache"][span["cache"]] = series["cache"].get(span["cache"], 0) + 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if span["seconds"] <= bound:
+                series["buckets"][i] += 1
+
+    # ----------------------------
+    # Summaries / exporters
+    # ----------------------------
+    def summarize(self, spans: list):
+        # Rows per (kind, op) for a table: calls, latency, bytes, tokens, cache
+        rows = {}
+        for span in spans:
+            row = rows.setdefault((span["kind"], span["op"]), {
+                "kind": span["kind"], "op": span["op"], "calls": 0, "errors": 0,
+                "total_ms": 0.0, "max_ms": 0.0, "bytes": 0, "tokens": 0, "cache_hits": 0
+            })
+            ms = span["seconds"] * 1000
+            row["calls"] += 1
+            row["errors"] += 0 if span.get("ok", True) else 1
+            row["total_ms"] += ms
+            row["max_ms"] = max(row["max_ms"], ms)
+            row["bytes"] += span.get("bytes") or 0
+            row["tokens"] += span.get("tokens") or 0
+            row["cache_hits"] += 1 if span.get("cache") in ("hit", "revalidated") else 0
+        return sorted(rows.values(), key=lambda r: -r["total_ms"])
+
+    def to_prometheus(self):
+        with self._lock:
+            series = {key: dict(value, cache=dict(value["cache"]), buckets=list(value["buckets"])) for key, value in self._series.items()}
+            retries = dict(self._retries)
+
+        lines = [
+            "# TYPE bd_calls_total counter",
+            "# TYPE bd_call_errors_total counter",
+            "# TYPE bd_call_bytes_total counter",
+            "# TYPE bd_call_tokens_total counter",
+            "# TYPE bd_call_cache_total counter",
+            "# TYPE bd_call_retries_total counter",
+            "# TYPE bd_call_seconds histogram",
+        ]
+        for (kind, op), s in sorted(series.items()):
+            labels = f'kind="{kind}",op="{op}"'
+            lines.append(f"bd_calls_total{{{labels}}} {s['calls']}")
+            lines.append(f"bd_call_errors_total{{{labels}}} {s['errors']}")
+            lines.append(f"bd_call_bytes_total{{{labels}}} {s['bytes']}")
+            lines.append(f"bd_call_tokens_total{{{labels}}} {s['tokens']}")
+            for result, count in sorted(s["cache"].items()):
+                lines.append(f'bd_call_cache_total{{{labels},result="{result}"}} {count}')
+            for bound, count in zip(LATENCY_BUCKETS, s["buckets"]):
+                lines.append(f'bd_call_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'bd_call_seconds_bucket{{{labels},le="+Inf"}} {s["calls"]}')
+            lines.append(f"bd_call_seconds_sum{{{labels}}} {s['seconds']:.6f}")
+            lines.append(f"bd_call_seconds_count{{{labels}}} {s['calls']}")
+        for (kind, op), count in sorted(retries.items()):
+            lines.append(f'bd_call_retries_total{{kind="{kind}",op="{op}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self, spans: list = None):
+        spans = spans if spans is not None else self.since(0)
+        return "".join(json.dumps(s, default=str) + "\n" for s in spans)
+
+    def _append_jsonl(self, spans: list):
+        try:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(self.to_jsonl(spans))
+        except OSError as e:
+            print(f"[metrics] Could not write {self.jsonl_path}: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._series.clear()
+            self._retries.clear()
+
+
+metrics = Metrics(
+    enabled=os.getenv("BD_METRICS", "1") != "0",
+    jsonl_path=os.getenv("BD_METRICS_JSONL") or None,
+)
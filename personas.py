@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from supabase_utils import supa_download_json, supa_download_json_many, supa_upload_json
+from lead_index import current_employment
+from llm_utils import RateLimiter, chat_completion, default_limiter
+from relevance_agent import fetch_linkedin_posts
+from lead_lease import LeaseHeld, acquire_lease, lease_owner, shard_order
+
+PERSONA_MODEL = "gpt-4"
+# Finished personas are written to persona.json immediately; the date's
+# index is rewritten every CHECKPOINT_EVERY completions.
+CHECKPOINT_EVERY = 10
+
+
+def build_persona_prompt(lead: dict, posts: list):
+    emp = current_employment(lead)
+    full_name = f"{lead.get('first_name', '')} {lead.get('last_name', '')}"
+    linkedin_url = lead.get("linkedin_url", "")
+    post_snippets = "\n".join(posts[:5]) if posts else "No public posts available."
+
+    org = lead.get("organization", {})
+    skills = ', '.join(lead.get("skills", [])[:10])
+    tags = ', '.join(lead.get("tags", [])[:10])
+    keywords = ', '.join(org.get("keywords", [])[:15])
+    bio = lead.get("summary", "") or lead.get("bio", "")
+
+    return f"""
+        You are an advanced persona modeling system for B2B outreach.
+
+        Given the full professional and public-facing information of a lead, construct a complete **behavioral persona** that can be used to simulate realistic conversations and generate personalized communication.
+
+        --- Personal Info ---
+        Name: {full_name}
+        Title: {emp.get("title", "")}
+        Seniority: {lead.get("seniority", "")}
+        Department: {', '.join(lead.get("departments", []))}
+        Skills: {skills}
+        Tags: {tags}
+        Bio: {bio}
+        Location: {lead.get("city", "")}, {lead.get("state", "")}, {lead.get("country", "")}
+        LinkedIn: {linkedin_url}
+
+        --- Company Info ---
+        Company: {emp.get("organization_name", "")}
+        Industry: {org.get("industry", "")}
+        Company Size: {org.get("estimated_num_employees", "")} employees
+        Company Keywords: {keywords}
+
+        --- Writing Samples from LinkedIn Posts ---
+        {post_snippets}
+
+        --- Output Format ---
+        {{
+        "persona_type": "...",
+        "communication_style": "...",
+        "tone_profile": "...",
+        "writing_style": "...",
+        "key_interests": [...],
+        "decision_drivers": [...],
+        "objection_style": "...",
+        "example_phrases": [...],
+        "summary": "..."
+        }}
+    """
+
+
+def parse_persona(content: str):
+    # Models sometimes wrap the JSON in a code fence or add a sentence around it
+    try:
+        return json.loads(content)
+    except ValueError:
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        if not match:
+            raise
+        return json.loads(match.group(0))
+
+
+def generate_persona(lead: dict, lead_path: str, limiter: RateLimiter = None, posts_limiter: RateLimiter = None, bucket: str = "leads", lease=None,
+                     before_save=None):
+    # lead_path is the lead's folder, e.g. "<date>/<name>". before_save() runs
+    # between generation and the upload, and may raise to discard the persona.
+    posts = fetch_linkedin_posts(lead.get("linkedin_url", ""), limiter=posts_limiter)
+    if posts:
+        supa_upload_json(bucket, f"{lead_path}/linkedin_posts.json", posts)
+
+    prompt = build_persona_prompt(lead, posts)
+    response = chat_completion(
+        [{"role": "user", "content": prompt}],
+        model=PERSONA_MODEL,
+        temperature=0.7,
+        limiter=limiter,
+        cache_kind="persona",
+        validate=lambda r: parse_persona(r.choices[0].message.content)
+    )
+    persona = parse_persona(response.choices[0].message.content)
+
+    # A process whose lease was taken over must not overwrite the new holder
+    if lease is not None and not lease.held():
+        raise LeaseHeld(f"Lease on {lead_path} was lost; persona discarded")
+    if before_save:
+        before_save()
+    supa_upload_json(bucket, f"{lead_path}/persona.json", persona)
+    usage = getattr(response, "usage", None)
+    return persona, (usage.total_tokens if usage else 0)
+
+
+# ----------------------------
+# Batch generation
+# ----------------------------
+def build_personas_batch(catalog, date: str, concurrency: int = 4, rpm: int = None, tpm: int = None, on_progress=None,
+                         limiter: RateLimiter = None):
+    entries = catalog.without_persona(date)
+    stats = {"total": len(entries), "done": 0, "failed": 0, "resumed": 0, "skipped": 0, "tokens": 0, "errors": {}}
+    if not entries:
+        return stats
+
+    # A limiter passed in is shared with other batches running alongside this one
+    limiter = limiter or (RateLimiter(rpm, tpm) if (rpm or tpm) else default_limiter())
+    posts_limiter = RateLimiter(rpm=int(os.getenv("RELEVANCE_RPM", "60")))
+    leads = supa_download_json_many(catalog.bucket, [f"{e['path']}/lead.json" for e in entries])
+
+    # Other processes may run the same batch: each lead is claimed with a
+    # lease first, and leads claimed elsewhere are skipped
+    owner = lease_owner()
+
+    def build(entry):
+        # A persona.json left by an interrupted batch is reused, not regenerated
+        existing = supa_download_json(catalog.bucket, f"{entry['path']}/persona.json")
+        if existing:
+            return existing, 0, True
+        lead = leads.get(f"{entry['path']}/lead.json")
+        if not lead:
+            raise ValueError("lead.json not found")
+        lease = acquire_lease(catalog.bucket, entry["path"], "persona", owner=owner)
+        if lease is None:
+            raise LeaseHeld("Another process is building this persona")
+        with lease:
+            # Checked again under the lease: the previous holder may have finished
+            existing = supa_download_json(catalog.bucket, f"{entry['path']}/persona.json", fresh=True)
+            if existing:
+                return existing, 0, True
+            persona, tokens = generate_persona(lead, entry["path"], limiter, posts_limiter, catalog.bucket, lease=lease)
+        return persona, tokens, False
+
+    started = time.time()
+    pending = {}
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {pool.submit(build, entry): entry for entry in shard_order(entries, owner)}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                persona, tokens, resumed = future.result()
+                pending[entry["folder"]] = {"persona": persona}
+                stats["done"] += 1
+                stats["resumed"] += int(resumed)
+                stats["tokens"] += tokens
+            except LeaseHeld:
+                stats["skipped"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                stats["errors"][entry["name"]] = str(e)
+
+            if len(pending) >= CHECKPOINT_EVERY:
+                catalog.update_entries(date, pending)
+                pending = {}
+
+            elapsed = time.time() - started
+            stats["elapsed"] = elapsed
+            stats["per_minute"] = stats["done"] / elapsed * 60 if elapsed else 0
+            stats["throttled"] = limiter.throttled + posts_limiter.throttled
+            if on_progress:
+                on_progress(stats)
+    finally:
+        # on_progress may raise to stop the batch (e.g. a cancelled job):
+        # queued leads are dropped and finished personas still checkpointed
+        pool.shutdown(wait=True, cancel_futures=True)
+        if pending:
+            catalog.update_entries(date, pending)
+    return stats
@@ -0,0 +1,120 @@
+import os
+import io
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from metrics import metrics
+
+# Local thumbnail store for lead photos. Each lead's LinkedIn photo is
+# downloaded once by a background pool, shrunk to a THUMBNAIL_SIZE JPEG and
+# kept on disk keyed by the lead's path, so renders read local bytes instead
+# of re-fetching the (expiring) signed media URL. A failed download leaves a
+# marker so an expired URL is not retried on every rerun.
+THUMBNAIL_SIZE = 100
+MISSING_TTL = 24 * 3600
+HTTP_TIMEOUT = 15
+
+
+class PhotoCache:
+    def __init__(self, cache_dir: str, size: int = THUMBNAIL_SIZE, max_workers: int = 8):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.stats = {"hits": 0, "fetched": 0, "failed": 0}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="photo-cache")
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key: str):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, digest[:2], digest)
+        return base + ".jpg", base + ".missing"
+
+    def _recently_failed(self, missing_path: str):
+        try:
+            return time.time() - os.path.getmtime(missing_path) < MISSING_TTL
+        except OSError:
+            return False
+
+    def read(self, key: str):
+        thumb_path, _ = self._paths(key)
+        try:
+            with open(thumb_path, "rb") as f:
+                data = f.read()
+            self.stats["hits"] += 1
+            return data
+        except OSError:
+            return None
+
+    def get(self, key: str, url: str, timeout: float = None):
+        # Returns the thumbnail bytes, or None while the download is pending
+        # (waiting up to timeout seconds for it) or after it has failed
+        data = self.read(key)
+        if data is not None or not url:
+            return data
+        future = self.schedule(key, url)
+        if future is None or not timeout:
+            return None
+        wait([future], timeout=timeout)
+        return self.read(key)
+
+    def schedule(self, key: str, url: str):
+        thumb_path, missing_path = self._paths(key)
+        if not url or os.path.exists(thumb_path) or self._recently_failed(missing_path):
+            return None
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(metrics.bind(self._fetch), key, url)
+                self._pending[key] = future
+        return future
+
+    def prefetch(self, entries):
+        # entries: lead index entries (path + photo_url)
+        return [f for f in (self.schedule(e["path"], e.get("photo_url")) for e in entries) if f]
+
+    def _fetch(self, key: str, url: str):
+        from PIL import Image
+
+        thumb_path, missing_path = self._paths(key)
+        try:
+            with metrics.span("photo", "download", key) as span:
+                res = self._session.get(url, timeout=HTTP_TIMEOUT)
+                span["bytes"] = len(res.content)
+                res.raise_for_status()
+            image = Image.open(io.BytesIO(res.content))
+            image.thumbnail((self.size, self.size))
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=85)
+
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            with open(thumb_path + ".tmp", "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(thumb_path + ".tmp", thumb_path)
+            if os.path.exists(missing_path):
+                os.remove(missing_path)
+            self.stats["fetched"] += 1
+        except Exception as e:
+            print(f"[photo_cache] Failed to cache photo for {key}: {e}")
+            self.stats["failed"] += 1
+            try:
+                os.makedirs(os.path.dirname(missing_path), exist_ok=True)
+                with open(missing_path, "w", encoding="utf-8") as f:
+                    f.write(str(e))
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+photo_cache = PhotoCache(
+    cache_dir=os.getenv("BD_PHOTO_CACHE_DIR", os.path.join(".cache", "photos")),
+    size=int(os.getenv("BD_THUMBNAIL_SIZE", str(THUMBNAIL_SIZE))),
+    max_workers=int(os.getenv("BD_PHOTO_WORKERS", "8")),
+)
@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Headless scrape -> persona -> email pipeline, the same stages the app runs
+# through the worker, for cron jobs and scripts:
+#
+#   python pipeline.py run --date 2026-10-18 --stages persona,email --concurrency 8
+#   python pipeline.py run --locations "Mumbai, Bangalore" --businesses D2C --titles "Founder, CMO"
+#
+# Stages run at the same time: personas are built for leads the scrape has
+# already ingested, and emails written for leads that already have a persona.
+# Everything resumes from storage, so a rerun (or a second replica, via the
+# lead leases) picks up where the last one stopped: an unfinished Apify run
+# is continued, a finished one is not scraped again, and leads that already
+# have a persona or email are skipped.
+BUCKET = "leads"
+STAGES = ("scrape", "persona", "email")
+FOLLOW_INTERVAL = 10
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+# ----------------------------
+# Stages
+# ----------------------------
+def run_scrape_stage(date: str, search_url: str = None, total_records: int = 500, on_progress=None,
+                     rerun: bool = False, bucket: str = BUCKET):
+    # Continues the date's unfinished Apify run for the same search; a finished
+    # one is only run again with rerun=True
+    from scrape_jobs import start_scrape_job, load_scrape_job, run_scrape_job, is_job_finished
+
+    job = load_scrape_job(date, bucket)
+    same_search = bool(job) and (search_url is None or job.get("search_url") == search_url)
+    if same_search and is_job_finished(job) and not rerun:
+        return dict(_scrape_result(job), resumed=job["offset"])
+    if not (same_search and not is_job_finished(job)):
+        search_url = search_url or (job or {}).get("search_url")
+        if not search_url:
+            raise ValueError(f"No scrape job for {date}; pass a search URL")
+        job = start_scrape_job(search_url, total_records=total_records, date=date, bucket=bucket)
+
+    job = run_scrape_job(job, on_progress=on_progress, bucket=bucket)
+    if job["status"] != "succeeded":
+        raise RuntimeError(f"Apify run ended with status {job['run_status']} after {job['offset']} leads")
+    return _scrape_result(job)
+
+
+def _scrape_result(job: dict):
+    return {"leads": job["offset"], "dedup": job.get("dedup", {}), "failed_uploads": job.get("failed_uploads", 0)}
+
+
+def _follow(run_pass, catalog, date: str, on_progress=None, upstream: threading.Event = None, stop: threading.Event = None,
+            interval: float = FOLLOW_INTERVAL):
+    # Runs batch passes while the upstream stage is still writing leads, then
+    # one last pass once it has finished. done/resumed/tokens add up over the
+    # passes; failed/skipped/errors are what the last pass left outstanding.
+    totals = {"done": 0, "resumed": 0, "tokens": 0, "passes": 0}
+    current = {}
+
+    def add(stats):
+        for field in ("done", "resumed", "tokens"):
+            totals[field] += stats.get(field, 0)
+        totals["passes"] += 1
+        totals.update(failed=stats.get("failed", 0), skipped=stats.get("skipped", 0), errors=stats.get("errors", {}))
+        totals.update({k: stats[k] for k in ("failed_uploads", "throttled") if k in stats})
+
+    def track(stats):
+        current["stats"] = stats
+        if on_progress:
+            on_progress(stats)
+
+    while True:
+        finished = upstream is None or upstream.is_set()
+        catalog.reload(date, revalidate=True)
+        current.clear()
+        try:
+            stats = run_pass(track)
+        except PipelineStopped:
+            # The batch saved what it finished before stopping; count it
+            add(current.get("stats", {}))
+            raise PipelineStopped(totals)
+        add(stats)
+        if finished or (stop is not None and stop.is_set()):
+            return totals
+        if not stats["done"]:
+            upstream.wait(interval)
+
+
+def run_persona_stage(catalog, date: str, concurrency: int = 4, limiter=None, on_progress=None, upstream=None, stop=None):
+    from personas import build_personas_batch
+    return _follow(
+        lambda track: build_personas_batch(catalog, date, concurrency, on_progress=track, limiter=limiter),
+        catalog, date, on_progress, upstream, stop
+    )
+
+
+def run_email_stage(catalog, date: str, concurrency: int = 4, limiter=None, on_progress=None, upstream=None, stop=None):
+    from cold_emails import generate_emails_batch
+    return _follow(
+        lambda track: generate_emails_batch(catalog, date, concurrency, on_progress=track, limiter=limiter),
+        catalog, date, on_progress, upstream, stop
+    )
+
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+def run_pipeline(date: str = None, stages=STAGES, concurrency: int = 4, search_url: str = None, total_records: int = 500,
+                 rpm: int = None, tpm: int = None, rerun_scrape: bool = False, on_progress=None, stop: threading.Event = None):
+    # Returns {"date", "seconds", "stages": {stage: {"status", "seconds", ...counts}}}.
+    # on_progress(stage, info) gets scrape jobs and batch stats as they change;
+    # setting stop ends every stage at its next progress report.
+    from lead_catalog import LeadCatalog
+    from llm_utils import RateLimiter, default_limiter
+
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    stages = [stage for stage in STAGES if stage in stages]
+    stop = stop or threading.Event()
+    catalog = LeadCatalog(BUCKET)
+    # Persona and email calls share one OpenAI budget
+    limiter = RateLimiter(rpm, tpm) if (rpm or tpm) else default_limiter()
+    finished = {stage: threading.Event() for stage in stages}
+
+    def progress(stage):
+        def report(info):
+            if stop.is_set():
+                raise PipelineStopped()
+            if on_progress:
+                on_progress(stage, info)
+        return report
+
+    def upstream(stage):
+        previous = STAGES[STAGES.index(stage) - 1] if stage != STAGES[0] else None
+        return finished.get(previous)
+
+    runners = {
+        "scrape": lambda: run_scrape_stage(date, search_url, total_records, progress("scrape"), rerun_scrape),
+        "persona": lambda: run_persona_stage(catalog, date, concurrency, limiter, progress("persona"), upstream("persona"), stop),
+        "email": lambda: run_email_stage(catalog, date, concurrency, limiter, progress("email"), upstream("email"), stop),
+    }
+
+    def run_stage(stage):
+        started = time.time()
+        try:
+            result = dict(runners[stage](), status="ok")
+        except PipelineStopped as e:
+            result = dict(e.args[0] if e.args else {}, status="stopped")
+        except Exception as e:
+            result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        finally:
+            # Downstream stages finish their last pass whether or not this one succeeded
+            finished[stage].set()
+        result["seconds"] = time.time() - started
+        return result
+
+    started = time.time()
+    pool = ThreadPoolExecutor(max_workers=len(stages) or 1, thread_name_prefix="pipeline")
+    try:
+        futures = {stage: pool.submit(run_stage, stage) for stage in stages}
+        results = {stage: future.result() for stage, future in futures.items()}
+    except KeyboardInterrupt:
+        # Stages stop at their next progress report; finished work is already saved
+        stop.set()
+        results = {stage: future.result() for stage, future in futures.items()}
+    finally:
+        pool.shutdown(wait=True)
+    return {"date": date, "seconds": time.time() - started, "stages": results}
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def format_summary(summary: dict, calls: list = None):
+    lines = [f"Pipeline for {summary['date']} finished in {summary['seconds']:.1f}s", ""]
+    lines.append(f"{'stage':<8} {'status':<8} {'seconds':>8} {'done':>6} {'resumed':>8} {'skipped':>8} {'failed':>7} {'tokens':>8}")
+    for stage, result in summary["stages"].items():
+        done = result.get("leads", result.get("done", 0))
+        lines.append(
+            f"{stage:<8} {result['status']:<8} {result['seconds']:>8.1f} {done:>6} {result.get('resumed', 0):>8} "
+            f"{result.get('skipped', 0):>8} {result.get('failed', 0):>7} {result.get('tokens', 0):>8}"
+        )
+    for stage, result in summary["stages"].items():
+        if result.get("error"):
+            lines.append(f"{stage}: {result['error']}")
+        if result.get("dedup"):
+            dedup = result["dedup"]
+            lines.append(f"scrape: {dedup.get('new', 0)} new, {dedup.get('changed', 0)} changed, {dedup.get('unchanged', 0)} unchanged")
+        for name, error in list(result.get("errors", {}).items())[:5]:
+            lines.append(f"{stage}: {name}: {error}")
+    if calls:
+        lines += ["", f"{'calls':<24} {'count':>6} {'errors':>6} {'total s':>8} {'max ms':>8}"]
+        for row in calls:
+            lines.append(f"{row['kind'] + ' ' + row['op']:<24} {row['calls']:>6} {row['errors']:>6} {row['total_ms'] / 1000:>8.1f} {row['max_ms']:>8.0f}")
+    return "\n".join(lines)
+
+
+def _progress_printer(interval: float = 5):
+    # At most one line per stage every few seconds
+    last = {}
+
+    def report(stage, info):
+        now = time.time()
+        if now - last.get(stage, 0) < interval:
+            return
+        last[stage] = now
+        if stage == "scrape":
+            print(f"[scrape] Apify run {info.get('run_status', '')}: {info['offset']} leads ingested", flush=True)
+        else:
+            print(f"[{stage}] {info['done']}/{info['total']} done, {info['failed']} failed, {info['skipped']} claimed elsewhere, "
+                  f"{info.get('per_minute', 0):.1f}/min", flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BD Engine pipeline runner")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run pipeline stages for one date")
+    run.add_argument("--date", help="Lead date folder (YYYY-MM-DD); default today")
+    run.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages ({', '.join(STAGES)})")
+    run.add_argument("--concurrency", type=int, default=4, help="Parallel LLM calls per stage")
+    run.add_argument("--rpm", type=int, help="OpenAI requests / min (default OPENAI_RPM)")
+    run.add_argument("--tpm", type=int, help="OpenAI tokens / min (default OPENAI_TPM)")
+    run.add_argument("--search-url", help="Apollo search URL to scrape")
+    run.add_argument("--locations", help="Comma-separated locations, to build the search URL")
+    run.add_argument("--businesses", help="Comma-separated business types, to build the search URL")
+    run.add_argument("--titles", help="Comma-separated job titles, to build the search URL")
+    run.add_argument("--total-records", type=int, default=500, help="Leads to scrape")
+    run.add_argument("--rescrape", action="store_true", help="Scrape again even if the date's scrape finished")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    # Like the worker: other processes write the same indexes
+    os.environ.setdefault("BD_CACHE_TTL", "0")
+    from dotenv import load_dotenv
+    load_dotenv()
+    from metrics import metrics
+
+    search_url = args.search_url
+    if not search_url and (args.locations or args.businesses or args.titles):
+        from scrape_jobs import build_apollo_url
+        split = lambda value: [x.strip() for x in (value or "").split(",") if x.strip()]
+        search_url = build_apollo_url(split(args.locations), split(args.businesses), split(args.titles))
+
+    mark = metrics.mark()
+    summary = run_pipeline(
+        args.date, stages, args.concurrency, search_url, args.total_records, args.rpm, args.tpm,
+        rerun_scrape=args.rescrape, on_progress=_progress_printer()
+    )
+    print()
+    print(format_summary(summary, metrics.summarize(metrics.since(mark))))
+    ok = all(r["status"] == "ok" and not r.get("failed") for r in summary["stages"].values())
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
 import os
+import time
+import random
+import asyncio
+from functools import lru_cache
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+from response_cache import response_cache, make_key
+from metrics import metrics
+
 load_dotenv()
 
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
@@ -11,28 +22,201 @@ PROJECT = os.getenv("PROJECT")
 # Replace with your actual Agent ID (from the shared link or dashboard)
 AGENT_ID = "99938bef-25f7-4f4b-a9ae-247b93bf5cf6"
 
-def fetch_pain_points(company_name, website="", linkedin_url=""):
-    endpoint = f"https://api-{PROJECT}.stack.tryrelevance.com/latest/agents/{PROJECT}/{AGENT_ID}/query"
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def pain_points_endpoint():
+    # RELEVANCE_BASE_URL points both agents at another host (e.g. a local fake)
+    base_url = os.getenv("RELEVANCE_BASE_URL") or f"https://api-{PROJECT}.stack.tryrelevance.com"
+    return f"{base_url}/latest/agents/{PROJECT}/{AGENT_ID}/query"
 
-    headers = {
-        "Authorization": f"Bearer {AUTH_TOKEN}",
-        "Content-Type": "application/json"
+
+def linkedin_posts_endpoint():
+    agent_id = os.getenv("AGENT_ID")
+    if not agent_id or not AUTH_TOKEN:
+        raise ValueError("Missing AGENT_ID or AUTH_TOKEN in environment variables")
+    base_url = os.getenv("RELEVANCE_BASE_URL") or "https://api.tryrelevance.com"
+    return f"{base_url}/latest/agents/{agent_id}/query"
+
+
+def _pain_point_result(company_name, output=None, error=None, status_code=None):
+    return {
+        "company_name": company_name,
+        "ok": error is None,
+        "output": output,
+        "error": error,
+        "status_code": status_code
     }
 
-    payload = {
-        "inputs": {
+
+def _pain_points_key(endpoint, inputs):
+    return make_key("pain_points", endpoint, {"inputs": inputs})
+
+
+def _status_of(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+class RelevanceClient:
+    # One keep-alive session per process. 5xx responses and connection/read
+    # failures are retried with backoff by urllib3; 429s are handled in
+    # query() so the caller's rate limiter can pause on Retry-After.
+    def __init__(self, auth_token: str = None, timeout: float = 30, retries: int = 3, backoff: float = 0.5, pool_size: int = 16):
+        self.auth_token = auth_token or AUTH_TOKEN
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self._headers())
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.auth_token}",
+            "Content-Type": "application/json"
+        }
+
+    def query(self, endpoint: str, inputs: dict, limiter=None):
+        from llm_utils import parse_retry_after
+
+        for attempt in range(self.retries + 1):
+            if limiter:
+                limiter.acquire()
+            with metrics.span("relevance", "query", endpoint) as span:
+                res = self.session.post(endpoint, json={"inputs": inputs}, timeout=self.timeout)
+                span["bytes"] = len(res.content)
+                span["status"] = res.status_code
+            if res.status_code == 429 and attempt < self.retries:
+                metrics.retry("relevance", "query")
+                delay = parse_retry_after(res.headers) or self.backoff * 2 ** attempt
+                if limiter:
+                    limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            res.raise_for_status()
+            return res.json()
+
+    # ----------------------------
+    # Pain points
+    # ----------------------------
+    def fetch_pain_points_result(self, company_name, website="", linkedin_url=""):
+        endpoint = pain_points_endpoint()
+        inputs = {
             "company_name": company_name,
             "website": website,
             "linkedin_url": linkedin_url
         }
-    }
 
-    try:
-        res = requests.post(endpoint, headers=headers, json=payload, timeout=30)
-        res.raise_for_status()
-        data = res.json()
+        def query():
+            # Assumes the pain point content is inside the 'output' key
+            return self.query(endpoint, inputs).get("output", "No response received.")
+
+        try:
+            # Only successful responses reach the cache; errors are retried next call
+            output = response_cache.cached("pain_points", endpoint, {"inputs": inputs}, query)
+            return _pain_point_result(company_name, output)
+        except Exception as e:
+            return _pain_point_result(company_name, error=str(e), status_code=_status_of(e))
+
+    async def _fetch_pain_points_async(self, client: httpx.AsyncClient, semaphore, endpoint, company: dict):
+        from llm_utils import parse_retry_after
+
+        company_name = company.get("company_name", "")
+        inputs = {
+            "company_name": company_name,
+            "website": company.get("website", ""),
+            "linkedin_url": company.get("linkedin_url", "")
+        }
+        cached = response_cache.get("pain_points", _pain_points_key(endpoint, inputs))
+        if cached is not None:
+            return _pain_point_result(company_name, cached)
+
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    with metrics.span("relevance", "query_async", endpoint) as span:
+                        res = await client.post(endpoint, json={"inputs": inputs})
+                        span["bytes"] = len(res.content)
+                        span["status"] = res.status_code
+                    if res.status_code in RETRY_STATUSES + (429,) and attempt < self.retries:
+                        raise httpx.HTTPStatusError("retryable", request=res.request, response=res)
+                    res.raise_for_status()
+                    output = res.json().get("output", "No response received.")
+                    response_cache.set("pain_points", _pain_points_key(endpoint, inputs), output)
+                    return _pain_point_result(company_name, output)
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    status = _status_of(e)
+                    retryable = status is None or status in RETRY_STATUSES + (429,)
+                    if not retryable or attempt == self.retries:
+                        return _pain_point_result(company_name, error=str(e), status_code=status)
+                    metrics.retry("relevance", "query_async")
+                    # A 429 waits as long as the server asks, like query()
+                    delay = parse_retry_after(e.response.headers) if status == 429 else None
+                    await asyncio.sleep(delay or self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+    async def fetch_pain_points_many(self, companies, concurrency: int = 8):
+        # companies: names, or dicts with company_name / website / linkedin_url.
+        # Results come back in input order, one structured result per company.
+        companies = [c if isinstance(c, dict) else {"company_name": c} for c in companies]
+        endpoint = pain_points_endpoint()
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(headers=self._headers(), timeout=self.timeout, limits=limits) as client:
+            return await asyncio.gather(*[
+                self._fetch_pain_points_async(client, semaphore, endpoint, company) for company in companies
+            ])
+
+    # ----------------------------
+    # LinkedIn posts
+    # ----------------------------
+    def fetch_linkedin_posts(self, linkedin_url, limiter=None):
+        endpoint = linkedin_posts_endpoint()
+        inputs = {"linkedin_url": linkedin_url}
+        return response_cache.cached(
+            "linkedin_posts",
+            endpoint,
+            {"inputs": inputs},
+            lambda: self.query(endpoint, inputs, limiter).get("posts", [])
+        )
+
 
-        # Assumes the pain point content is inside the 'output' key
-        return data.get("output", "No response received.")
+@lru_cache(maxsize=1)
+def get_relevance_client():
+    return RelevanceClient()
+
+
+def fetch_pain_points_result(company_name, website="", linkedin_url=""):
+    # {"company_name", "ok", "output", "error", "status_code"}
+    return get_relevance_client().fetch_pain_points_result(company_name, website, linkedin_url)
+
+
+def fetch_pain_points(company_name, website="", linkedin_url=""):
+    # The original string interface: the pain points, or an error message
+    result = fetch_pain_points_result(company_name, website, linkedin_url)
+    return result["output"] if result["ok"] else f"Error fetching pain points: {result['error']}"
+
+
+def fetch_pain_points_batch(companies, concurrency: int = 8):
+    # Synchronous entry point for scripts and the Streamlit thread
+    return asyncio.run(get_relevance_client().fetch_pain_points_many(companies, concurrency))
+
+
+def fetch_linkedin_posts(linkedin_url, limiter=None):
+    try:
+        return get_relevance_client().fetch_linkedin_posts(linkedin_url, limiter)
     except Exception as e:
-        return f"Error fetching pain points: {e}"
+        print("Post fetch error:", e)
+        return []
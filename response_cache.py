@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from metrics import metrics
+
+# Content-addressed cache for LLM and agent responses. Keys hash the call type,
+# model/endpoint, whitespace-normalised inputs and temperature; values are JSON.
+# Entries expire per call type and the file is kept under a byte cap by
+# evicting the least recently used rows. Interactive chat is not cached: a
+# sampled reply to a user's message should not be replayed to the next one.
+DEFAULT_TTLS = {
+    "persona": 30 * 86400,
+    "email": 7 * 86400,
+    "pain_points": 7 * 86400,
+    "linkedin_posts": 86400,
+}
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _WS_RE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(kind: str, model: str, inputs, temperature: float = None):
+    payload = json.dumps(
+        {"kind": kind, "model": model, "inputs": _normalize(inputs), "temperature": temperature},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, max_bytes: int, ttls: dict = None, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.enabled = enabled
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, kind TEXT, value TEXT, size INTEGER, "
+                "created_at REAL, accessed_at REAL, expires_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        return self._conn
+
+    def _count(self, kind: str, outcome: str):
+        counters = self.stats.setdefault(kind, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+        metrics.event("response_cache", kind, cache="hit" if outcome == "hits" else "miss")
+
+    def get(self, kind: str, key: str):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                self._count(kind, "misses")
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self._count(kind, "hits")
+        return json.loads(row[0])
+
+    def set(self, kind: str, key: str, value):
+        if not self.enabled:
+            return
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, data, len(data), now, now, now + self.ttls.get(kind, 86400))
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def delete(self, key: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until back under 90% of the cap
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def cached(self, kind: str, model: str, inputs, compute, temperature: float = None, validate=None):
+        # compute() runs on a miss; its result is stored only if validate (when
+        # given) accepts it, so an unusable response is never served twice.
+        key = make_key(kind, model, inputs, temperature)
+        value = self.get(kind, key)
+        if value is not None:
+            return value
+        value = compute()
+        if validate is not None:
+            validate(value)
+        self.set(kind, key, value)
+        return value
+
+
+response_cache = ResponseCache(
+    path=os.getenv("BD_RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3")),
+    max_bytes=int(os.getenv("BD_RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    enabled=os.getenv("BD_RESPONSE_CACHE", "1") != "0"
+)
@@ -0,0 +1,246 @@
+import os
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+import requests
+
+from supabase_utils import supa_download_json, supa_upload_json, supa_upload_many, supa_upload_csv, supa_list_files, supa_download_many
+from lead_index import merge_lead_index, build_index_entry, flatten_lead, load_lead_index, lead_key
+from lead_identity import identity_lock, load_identity_index, save_identity_index, resolve_leads, linked_enrichment, NEW, CHANGED, UNCHANGED
+from lead_lease import LeaseHeld
+from photo_cache import photo_cache
+from metrics import metrics
+
+# Scrapes run as asynchronous Apify actor runs. The dataset is paged while the
+# run is still producing items and each page is written to storage and the
+# lead index straight away. Job state (run id, dataset id, ingested offset)
+# lives at leads/<date>/scrape_job.json so an interrupted job can resume.
+# Each page's flattened rows go to their own part file under
+# leads/<date>/_combined/<run id>/; combined.csv is assembled from the parts
+# once the run ends, so a page costs the same bytes however far in it is.
+APIFY_BASE_URL = os.getenv("APIFY_BASE_URL", "https://api.apify.com/v2")
+APIFY_ACTOR = "code_crafter~apollo-io-scraper"
+JOB_FILENAME = "scrape_job.json"
+PAGE_SIZE = 100
+HTTP_TIMEOUT = 30
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT")
+
+
+def job_path(date: str):
+    return f"{date}/{JOB_FILENAME}"
+
+
+def combined_parts_prefix(job: dict):
+    return f"{job['date']}/_combined/{job['run_id']}/"
+
+
+# ----------------------------
+# Apollo search URL
+# ----------------------------
+def add_query_param(name, values, query_parts):
+    for v in values:
+        encoded = quote(v.strip())
+        query_parts.append(f"{name}[]={encoded}")
+
+
+def build_apollo_url(locations, businesses, job_titles):
+    query_parts = []
+    add_query_param("personLocations", locations, query_parts)
+    add_query_param("qOrganizationKeywordTags", businesses, query_parts)
+    add_query_param("personTitles", job_titles, query_parts)
+    query_parts += [
+        "sortByField=recommendations_score",
+        "sortAscending=false",
+        "page=1"
+    ]
+    return f"https://app.apollo.io/#/people?{'&'.join(query_parts)}"
+
+
+# ----------------------------
+# Apify API
+# ----------------------------
+def _apify_token():
+    return os.getenv("APIFY_TOKEN")
+
+
+def start_actor_run(search_url: str, total_records: int = 500):
+    payload = {
+        "getPersonalEmails": True,
+        "getWorkEmails": True,
+        "totalRecords": total_records,
+        "url": search_url
+    }
+    with metrics.span("apify", "start_run", APIFY_ACTOR) as span:
+        res = requests.post(
+            f"{APIFY_BASE_URL}/acts/{APIFY_ACTOR}/runs",
+            params={"token": _apify_token()},
+            json=payload,
+            timeout=HTTP_TIMEOUT
+        )
+        span["bytes"] = len(res.content)
+        res.raise_for_status()
+    return res.json()["data"]
+
+
+def get_actor_run(run_id: str):
+    with metrics.span("apify", "get_run", run_id) as span:
+        res = requests.get(f"{APIFY_BASE_URL}/actor-runs/{run_id}", params={"token": _apify_token()}, timeout=HTTP_TIMEOUT)
+        span["bytes"] = len(res.content)
+        res.raise_for_status()
+    return res.json()["data"]
+
+
+def fetch_dataset_page(dataset_id: str, offset: int, limit: int = PAGE_SIZE):
+    with metrics.span("apify", "dataset_page", dataset_id) as span:
+        res = requests.get(
+            f"{APIFY_BASE_URL}/datasets/{dataset_id}/items",
+            params={"token": _apify_token(), "offset": offset, "limit": limit, "clean": "true"},
+            timeout=HTTP_TIMEOUT
+        )
+        span["bytes"] = len(res.content)
+        res.raise_for_status()
+    return res.json()
+
+
+# ----------------------------
+# Job state
+# ----------------------------
+def load_scrape_job(date: str, bucket: str = "leads"):
+    return supa_download_json(bucket, job_path(date))
+
+
+def save_scrape_job(job: dict, bucket: str = "leads"):
+    job["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    supa_upload_json(bucket, job_path(job["date"]), job)
+    return job
+
+
+def start_scrape_job(search_url: str, total_records: int = 500, date: str = None, bucket: str = "leads"):
+    run = start_actor_run(search_url, total_records)
+    job = {
+        "run_id": run["id"],
+        "dataset_id": run["defaultDatasetId"],
+        "run_status": run.get("status", "READY"),
+        "date": date or datetime.now().strftime("%Y-%m-%d"),
+        "search_url": search_url,
+        "total_records": total_records,
+        "offset": 0,
+        "failed_uploads": 0,
+        "status": "running",
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    return save_scrape_job(job, bucket)
+
+
+def is_job_finished(job: dict):
+    return bool(job) and job.get("status") in ("succeeded", "failed")
+
+
+# ----------------------------
+# Ingestion
+# ----------------------------
+def ingest_page(job: dict, leads: list, bucket: str = "leads"):
+    import pandas as pd
+    from lead_store import lead_record, upsert_partition
+
+    date = job["date"]
+    rows = []
+    index_entries = {}
+    records = []
+    uploads = {}
+
+    # Folders already used on this date, so same-name leads get their own
+    existing_index = load_lead_index(date, bucket) or {}
+    taken = {folder: entry.get("lead_key") or lead_key(entry) for folder, entry in existing_index.get("leads", {}).items()}
+    # _identity.json is shared by every scrape: it is re-read fresh and saved
+    # under its lock, after this page's files are uploaded
+    with identity_lock(bucket) as lock:
+        identity = load_identity_index(bucket, fresh=True)
+        resolved = resolve_leads(identity, date, leads, taken)
+        linked = [item for item in resolved if not item["path"].startswith(f"{date}/")]
+        enrichment = linked_enrichment(linked, bucket) if linked else {}
+
+        counts = job.setdefault("dedup", {NEW: 0, CHANGED: 0, UNCHANGED: 0})
+        for item in resolved:
+            lead, folder, path = item["lead"], item["folder"], item["path"]
+            counts[item["status"]] += 1
+
+            row = flatten_lead(lead)
+            rows.append(row)
+            entry = build_index_entry(date, folder, lead)
+            # Unchanged leads seen on an earlier date point at that folder and
+            # carry its persona/email instead of being enriched again
+            entry["path"] = path
+            entry.update(enrichment.get(path, {}))
+            index_entries[folder] = entry
+            record = lead_record(lead, folder, date, entry)
+            record["path"] = path
+            records.append(record)
+
+            if item["status"] != UNCHANGED:
+                uploads[f"{path}/lead.json"] = lead
+                uploads[f"{path}/meta.csv"] = pd.DataFrame([row])
+
+        results = supa_upload_many(bucket, uploads)
+        failed = sum(1 for result in results.values() if not result["ok"])
+        if not lock.held():
+            raise LeaseHeld("Lost the identity lock; page will be ingested again")
+        save_identity_index(identity, bucket)
+
+    # Named by offset, so re-ingesting a page after a restart overwrites its part
+    legacy_rows = job.pop("rows", None)
+    if legacy_rows:
+        # Jobs started before part files kept their rows in the job document
+        supa_upload_csv(bucket, f"{combined_parts_prefix(job)}{0:08d}.csv", pd.DataFrame(legacy_rows))
+    if rows:
+        supa_upload_csv(bucket, f"{combined_parts_prefix(job)}{job['offset']:08d}.csv", pd.DataFrame(rows))
+    merge_lead_index(date, index_entries, bucket)
+    upsert_partition(date, records, bucket=bucket)
+    # Photo URLs are signed and expire, so thumbnails are cached while fresh
+    photo_cache.prefetch(index_entries.values())
+
+    job["offset"] += len(leads)
+    job["failed_uploads"] = job.get("failed_uploads", 0) + failed
+    return save_scrape_job(job, bucket)
+
+
+def write_combined_csv(job: dict, bucket: str = "leads"):
+    # One pass over the run's part files, in page order
+    import io
+    import pandas as pd
+
+    prefix = combined_parts_prefix(job)
+    parts = sorted(name for name in supa_list_files(bucket, prefix) if name.endswith(".csv"))
+    results = supa_download_many(bucket, [f"{prefix}{name}" for name in parts])
+    frames = [pd.read_csv(io.BytesIO(results[f"{prefix}{name}"]["data"])) for name in parts if results[f"{prefix}{name}"]["ok"]]
+    if len(frames) < len(parts):
+        print(f"[scrape_jobs] {len(parts) - len(frames)} combined.csv parts could not be read for {job['date']}")
+    if frames:
+        supa_upload_csv(bucket, f"{job['date']}/combined.csv", pd.concat(frames, ignore_index=True))
+
+
+def run_scrape_job(job: dict, on_progress=None, poll_interval: float = 5, bucket: str = "leads"):
+    # Drains the dataset from job["offset"]; safe to call again after a restart
+    while True:
+        page = fetch_dataset_page(job["dataset_id"], job["offset"])
+        if page:
+            job = ingest_page(job, page, bucket)
+            if on_progress:
+                on_progress(job)
+            continue
+
+        if job.get("run_status") in TERMINAL_STATUSES:
+            break
+        job["run_status"] = get_actor_run(job["run_id"]).get("status")
+        if job["run_status"] not in TERMINAL_STATUSES:
+            if on_progress:
+                on_progress(job)
+            time.sleep(poll_interval)
+
+    job["status"] = "succeeded" if job["run_status"] == "SUCCEEDED" else "failed"
+    write_combined_csv(job, bucket)
+    job = save_scrape_job(job, bucket)
+    if on_progress:
+        on_progress(job)
+    return job
@@ -0,0 +1,190 @@
+import os
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# Object storage behind supabase_utils. Every backend exposes the same
+# primitives with Supabase's semantics (listing shape, 304 on a matching
+# ETag, upsert vs create-only uploads), so the helpers, caches and lead
+# layout (<date>/<name>/lead.json, persona.json, ...) are backend agnostic.
+# BD_STORAGE_BACKEND selects "supabase" (default) or "local".
+
+
+class StorageBackend(ABC):
+    # A backend missing one of these fails when it is created
+    name = None
+
+    @abstractmethod
+    def list(self, bucket: str, prefix: str = "", limit: int = 1000, offset: int = 0):
+        # Items sorted by name. Folders: {"name", "id": None, "metadata": None};
+        # files: {"name", "id", "updated_at", "metadata": {"size", "eTag", ...}}
+        ...
+
+    @abstractmethod
+    def get(self, bucket: str, path: str, etag: str = None):
+        # Returns (content, etag, missing); content is None when etag matched
+        ...
+
+    @abstractmethod
+    def put(self, bucket: str, path: str, content: bytes, content_type: str = "application/octet-stream", upsert: bool = True):
+        # With upsert=False the write fails if the object already exists
+        ...
+
+    @abstractmethod
+    def delete(self, bucket: str, paths: list):
+        ...
+
+
+class SupabaseBackend(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, url: str, key: str):
+        if not url or not key:
+            raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in environment variables")
+        self.url = url
+        self.key = key
+
+    @property
+    def client(self):
+        return get_supabase()
+
+    def list(self, bucket: str, prefix: str = "", limit: int = 1000, offset: int = 0):
+        return self.client.storage.from_(bucket).list(
+            path=prefix,
+            options={"limit": limit, "offset": offset, "sortBy": {"column": "name", "order": "asc"}}
+        ) or []
+
+    def get(self, bucket: str, path: str, etag: str = None):
+        # Goes through the storage client's own HTTP session so a cached ETag can
+        # be sent as If-None-Match; storage3's download() has no way to do that.
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.client.storage.from_(bucket)._client.get(f"object/{bucket}/{path}", headers=headers)
+        if response.status_code == 304:
+            return None, etag, False
+        if response.status_code in (400, 404):
+            return None, None, True
+        response.raise_for_status()
+        return response.content, response.headers.get("etag"), False
+
+    def put(self, bucket: str, path: str, content: bytes, content_type: str = "application/octet-stream", upsert: bool = True):
+        # storage3 wants the header as a string; a bool is rejected
+        options = {"content-type": content_type, "upsert": "true" if upsert else "false"}
+        return self.client.storage.from_(bucket).upload(path, content, options)
+
+    def delete(self, bucket: str, paths: list):
+        return self.client.storage.from_(bucket).remove(list(paths))
+
+
+class LocalBackend(StorageBackend):
+    # <root>/<bucket>/<path> on local disk; dot-prefixed names are skipped
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, bucket: str, path: str):
+        full = os.path.normpath(os.path.join(self.root, bucket, path))
+        if not full.startswith(os.path.normpath(os.path.join(self.root, bucket))):
+            raise ValueError(f"Path escapes the bucket: {path}")
+        return full
+
+    @staticmethod
+    def _etag(stat):
+        return hashlib.sha1(f"{stat.st_mtime_ns}-{stat.st_size}".encode("utf-8")).hexdigest()
+
+    def list(self, bucket: str, prefix: str = "", limit: int = 1000, offset: int = 0):
+        directory = self._path(bucket, prefix.rstrip("/")) if prefix.strip("/") else os.path.join(self.root, bucket)
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+        items = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                items.append({"name": entry.name, "id": None, "metadata": None})
+                continue
+            stat = entry.stat()
+            items.append({
+                "name": entry.name,
+                "id": os.path.relpath(entry.path, self.root),
+                "updated_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+                "metadata": {"size": stat.st_size, "eTag": self._etag(stat)}
+            })
+        return items[offset:offset + limit]
+
+    def get(self, bucket: str, path: str, etag: str = None):
+        full = self._path(bucket, path)
+        try:
+            stat = os.stat(full)
+            current = self._etag(stat)
+            if etag and etag == current:
+                return None, etag, False
+            with open(full, "rb") as f:
+                return f.read(), current, False
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None, None, True
+
+    def put(self, bucket: str, path: str, content: bytes, content_type: str = "application/octet-stream", upsert: bool = True):
+        full = self._path(bucket, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        # Written to a dot-prefixed temp file first so readers never see a
+        # partial object; create-only writes link it in, which fails if the
+        # name exists (exactly one concurrent creator wins)
+        tmp = os.path.join(os.path.dirname(full), f".{os.path.basename(full)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(content)
+        if upsert:
+            os.replace(tmp, full)
+        else:
+            try:
+                os.link(tmp, full)
+            finally:
+                os.remove(tmp)
+        return {"Key": f"{bucket}/{path}"}
+
+    def delete(self, bucket: str, paths: list):
+        # Empty parent folders are removed too; object stores have none
+        bucket_dir = os.path.normpath(os.path.join(self.root, bucket))
+        for path in paths:
+            full = self._path(bucket, path)
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            parent = os.path.dirname(full)
+            while parent != bucket_dir:
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break
+                parent = os.path.dirname(parent)
+        return [{"name": path} for path in paths]
+
+
+@lru_cache(maxsize=1)
+def get_supabase():
+    # One client per process, built on first use so importing this module
+    # is cheap and does not fail before the environment is configured
+    from supabase import create_client
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in environment variables")
+    return create_client(url, key)
+
+
+@lru_cache(maxsize=1)
+def get_backend():
+    kind = os.getenv("BD_STORAGE_BACKEND", "supabase").lower()
+    if kind == "local":
+        return LocalBackend(os.getenv("BD_LOCAL_STORAGE_DIR", os.path.join(".data", "storage")))
+    if kind == "supabase":
+        return SupabaseBackend(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    raise ValueError(f"Unknown BD_STORAGE_BACKEND: {kind}")
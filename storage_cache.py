@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Two-tier cache for storage objects: a byte-bounded in-process LRU and an
+# optional on-disk tier. Entries carry the object's ETag so stale entries can
+# be revalidated with a conditional request instead of a full download.
+# A data value of None records that the object does not exist.
+
+
+class CacheEntry:
+    __slots__ = ("data", "etag", "fetched_at")
+
+    def __init__(self, data, etag=None, fetched_at=None):
+        self.data = data
+        self.etag = etag
+        self.fetched_at = fetched_at or time.time()
+
+    @property
+    def size(self):
+        return len(self.data) if self.data else 0
+
+
+class StorageCache:
+    def __init__(self, max_bytes: int, ttl: float, disk_dir: str = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def count(self, stat: str):
+        # Readers on pool threads share the counters
+        with self._lock:
+            self.stats[stat] += 1
+
+    def is_fresh(self, entry: CacheEntry):
+        return time.time() - entry.fetched_at < self.ttl
+
+    def get(self, bucket: str, path: str):
+        key = (bucket, path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._disk_read(bucket, path)
+            if entry is not None:
+                self._remember(key, entry)
+        return entry
+
+    def put(self, bucket: str, path: str, data, etag: str = None):
+        entry = CacheEntry(data, etag)
+        self._remember((bucket, path), entry)
+        self._disk_write(bucket, path, entry)
+        return entry
+
+    def touch(self, bucket: str, path: str, entry: CacheEntry):
+        # Revalidated against the server: restart the TTL without refetching
+        entry.fetched_at = time.time()
+        self._disk_write(bucket, path, entry)
+
+    def invalidate(self, bucket: str, path: str):
+        with self._lock:
+            entry = self._entries.pop((bucket, path), None)
+            if entry is not None:
+                self._bytes -= entry.size
+        if self.disk_dir:
+            for file_path in self._disk_paths(bucket, path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remember(self, key, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.stats["evictions"] += 1
+
+    # ----------------------------
+    # Disk tier
+    # ----------------------------
+    def _disk_paths(self, bucket: str, path: str):
+        digest = hashlib.sha1(f"{bucket}/{path}".encode("utf-8")).hexdigest()
+        base = os.path.join(self.disk_dir, digest[:2], digest)
+        return base + ".bin", base + ".meta.json"
+
+    def _disk_read(self, bucket: str, path: str):
+        if not self.disk_dir:
+            return None
+        data_path, meta_path = self._disk_paths(bucket, path)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            data = None
+            if not meta.get("missing"):
+                with open(data_path, "rb") as f:
+                    data = f.read()
+            return CacheEntry(data, meta.get("etag"), meta.get("fetched_at"))
+        except (OSError, ValueError):
+            return None
+
+    def _disk_write(self, bucket: str, path: str, entry: CacheEntry):
+        if not self.disk_dir:
+            return
+        data_path, meta_path = self._disk_paths(bucket, path)
+        try:
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            if entry.data is not None:
+                with open(data_path + ".tmp", "wb") as f:
+                    f.write(entry.data)
+                os.replace(data_path + ".tmp", data_path)
+            meta = {"etag": entry.etag, "fetched_at": entry.fetched_at, "missing": entry.data is None}
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            print(f"[storage_cache] Disk write failed for {bucket}/{path}: {e}")
+
+
+storage_cache = StorageCache(
+    max_bytes=int(os.getenv("BD_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("BD_CACHE_TTL", "60")),
+    disk_dir=os.getenv("BD_CACHE_DIR") or None,
+)
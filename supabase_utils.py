@@ -1,52 +1,171 @@
 import os
 import json
-from io import BytesIO
-import pandas as pd
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client
+
+from storage_cache import storage_cache
+from storage_backend import get_backend
+from metrics import metrics
 
 # Load environment variables
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# Every helper below goes through get_backend() (Supabase or local disk, per
+# BD_STORAGE_BACKEND). Bulk helpers share the backend's pooled connection.
+MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))
+RETRY_ATTEMPTS = int(os.getenv("SUPABASE_RETRY_ATTEMPTS", "3"))
+RETRY_BACKOFF = float(os.getenv("SUPABASE_RETRY_BACKOFF", "0.5"))
+
+# ----------------------------
+# Retries
+# ----------------------------
+def _is_retryable(exc: Exception):
+    if isinstance(exc, (httpx.TransportError, httpx.TimeoutException)):
+        return True
+    status = getattr(exc, "status", None)
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or status >= 500
+
+
+def _with_retries(fn, *args, **kwargs):
+    attempt = 1
+    while True:
+        try:
+            return fn(*args, **kwargs), attempt
+        except Exception as e:
+            if attempt >= RETRY_ATTEMPTS or not _is_retryable(e):
+                e.attempts = attempt
+                raise
+            metrics.retry("storage", getattr(fn, "__name__", "call").lstrip("_"))
+            time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1) + random.uniform(0, RETRY_BACKOFF))
+            attempt += 1
+
+
+def _upload_bytes(bucket: str, path: str, content: bytes, content_type: str):
+    with metrics.span("storage", "upload", f"{bucket}/{path}", bytes=len(content)):
+        response = get_backend().put(bucket, path, content, content_type)
+    # Write-through: the next read is served locally until the TTL lapses
+    storage_cache.put(bucket, path, content)
+    return response
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in environment variables")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# ----------------------------
+# Cached reads
+# ----------------------------
+def _fetch_object(bucket: str, path: str, etag: str = None):
+    # (content, etag, missing); content is None when the ETag still matches
+    return get_backend().get(bucket, path, etag)
+
+
+def _cached_download(bucket: str, path: str):
+    with metrics.span("storage", "get", f"{bucket}/{path}") as span:
+        entry = storage_cache.get(bucket, path)
+        if entry is not None and storage_cache.is_fresh(entry):
+            storage_cache.count("hits")
+            span["cache"] = "hit"
+            content = entry.data
+        else:
+            storage_cache.count("misses")
+            span["cache"] = "miss"
+            etag = entry.etag if entry is not None and entry.data is not None else None
+            content, new_etag, missing = _fetch_object(bucket, path, etag)
+            if missing:
+                storage_cache.put(bucket, path, None)
+            elif content is None:
+                storage_cache.count("revalidated")
+                span["cache"] = "revalidated"
+                storage_cache.touch(bucket, path, entry)
+                content = entry.data
+            else:
+                storage_cache.put(bucket, path, content, new_etag)
+        span["bytes"] = len(content) if content else 0
+    if content is None:
+        raise FileNotFoundError(f"{bucket}/{path} not found")
+    return content
+
+
+def _encode_payload(data):
+    if isinstance(data, bytes):
+        return data, "application/octet-stream"
+    if isinstance(data, str):
+        return data.encode("utf-8"), "text/plain"
+    if hasattr(data, "to_csv"):
+        return data.to_csv(index=False).encode("utf-8"), "text/csv"
+    return json.dumps(data, indent=2).encode("utf-8"), "application/json"
+
+# ----------------------------
+# Listing
+# ----------------------------
+LIST_PAGE_SIZE = 1000
+
+
+def is_folder(item: dict):
+    # Folders come back from storage.list with no id and no metadata
+    return item.get("id") is None and not item.get("metadata")
+
+
+def supa_list_all(bucket: str, prefix: str = ""):
+    # storage.list returns one page (100 items by default); page until short
+    items = []
+    offset = 0
+    while True:
+        with metrics.span("storage", "list", f"{bucket}/{prefix}") as span:
+            page, _ = _with_retries(get_backend().list, bucket, prefix, LIST_PAGE_SIZE, offset)
+            page = page or []
+            span["items"] = len(page)
+        items.extend(page)
+        if len(page) < LIST_PAGE_SIZE:
+            return items
+        offset += LIST_PAGE_SIZE
+
 
 # ----------------------------
 # List folders in a bucket
 # ----------------------------
 def supa_list_folders(bucket: str, prefix: str = ""):
-    response = supabase.storage.from_(bucket).list(path=prefix)
-    return [item['name'] for item in response if item['metadata'].get('mimetype') is None]
+    try:
+        return [item['name'] for item in supa_list_all(bucket, prefix) if is_folder(item)]
+    except Exception as e:
+        print(f"[supa_list_folders] Error listing '{prefix}': {e}")
+        return []
 
 # ----------------------------
 # List files in a folder
 # ----------------------------
 def supa_list_files(bucket: str, prefix: str):
-    response = supabase.storage.from_(bucket).list(path=prefix)
-    return [item['name'] for item in response if item['metadata'].get('mimetype') is not None]
+    try:
+        return [item['name'] for item in supa_list_all(bucket, prefix) if not is_folder(item)]
+    except Exception as e:
+        print(f"[supa_list_files] Error listing '{prefix}': {e}")
+        return []
 
 # ----------------------------
 # Download JSON
 # ----------------------------
-def supa_download_json(bucket: str, path: str):
+def supa_download_json(bucket: str, path: str, fresh: bool = False):
+    # fresh skips the cache TTL, for objects other processes write (leases)
+    if fresh:
+        storage_cache.invalidate(bucket, path)
     try:
-        res = supabase.storage.from_(bucket).download(path)
+        res, _ = _with_retries(_cached_download, bucket, path)
         return json.loads(res.decode("utf-8"))
     except Exception:
         return None
 
 def supa_load_json(bucket: str, path: str):
     try:
-        response = supabase.storage.from_(bucket).download(path)
-        if isinstance(response, bytes):
-            return json.loads(response.decode("utf-8"))
-        elif isinstance(response, BytesIO):
-            return json.load(response)
+        response, _ = _with_retries(_cached_download, bucket, path)
+        return json.loads(response.decode("utf-8"))
+    except FileNotFoundError:
+        return None
     except Exception as e:
         print(f"Failed to load {path}: {e}")
         return None
@@ -56,8 +175,7 @@ def supa_load_json(bucket: str, path: str):
 # ----------------------------
 def supa_upload_json(bucket: str, path: str, data: dict):
     try:
-        buffer = BytesIO(json.dumps(data, indent=2).encode("utf-8"))
-        supabase.storage.from_(bucket).upload(path, buffer, {"content-type": "application/json", "upsert": True})
+        _with_retries(_upload_bytes, bucket, path, json.dumps(data, indent=2).encode("utf-8"), "application/json")
         return True
     except Exception as e:
         print(f"[supa_upload_json] Error: {e}")
@@ -68,8 +186,7 @@ def supa_upload_json(bucket: str, path: str, data: dict):
 # ----------------------------
 def supa_upload_text(bucket: str, path: str, content: str):
     try:
-        buffer = BytesIO(content.encode("utf-8"))
-        supabase.storage.from_(bucket).upload(path, buffer, {"content-type": "text/plain", "upsert": True})
+        _with_retries(_upload_bytes, bucket, path, content.encode("utf-8"), "text/plain")
         return True
     except Exception as e:
         print(f"[supa_upload_text] Error: {e}")
@@ -77,7 +194,7 @@ def supa_upload_text(bucket: str, path: str, content: str):
 
 def supa_download_text(bucket: str, path: str):
     try:
-        res = supabase.storage.from_(bucket).download(path)
+        res, _ = _with_retries(_cached_download, bucket, path)
         return res.decode("utf-8")
     except Exception:
         return None
@@ -85,11 +202,10 @@ def supa_download_text(bucket: str, path: str):
 # ----------------------------
 # Upload CSV
 # ----------------------------
-def supa_upload_csv(bucket: str, path: str, df: pd.DataFrame):
+def supa_upload_csv(bucket: str, path: str, df):
     try:
         csv_str = df.to_csv(index=False)
-        buffer = BytesIO(csv_str.encode("utf-8"))
-        supabase.storage.from_(bucket).upload(path, buffer, {"content-type": "text/csv", "upsert": True})
+        _with_retries(_upload_bytes, bucket, path, csv_str.encode("utf-8"), "text/csv")
         return True
     except Exception as e:
         print(f"[supa_upload_csv] Error: {e}")
@@ -100,8 +216,13 @@ def supa_upload_csv(bucket: str, path: str, df: pd.DataFrame):
 # ----------------------------
 def supa_upload_file(bucket: str, path: str, content: bytes, file_options: dict = None):
     try:
-        file_options = file_options or {"content-type": "application/octet-stream"}
-        supabase.storage.from_(bucket).upload(path, content, file_options=file_options)
+        # Like storage3's upload: no upsert unless file_options asks for it
+        file_options = file_options or {}
+        content_type = file_options.get("content-type", "application/octet-stream")
+        upsert = str(file_options.get("upsert", "false")).lower() == "true"
+        with metrics.span("storage", "upload", f"{bucket}/{path}", bytes=len(content)):
+            _with_retries(get_backend().put, bucket, path, content, content_type, upsert)
+        storage_cache.invalidate(bucket, path)
         print(f"[✓] Uploaded to {bucket}/{path}")
         return True
     except Exception as e:
@@ -113,8 +234,64 @@ def supa_upload_file(bucket: str, path: str, content: bytes, file_options: dict
 # ----------------------------
 def supa_delete_file(bucket: str, path: str):
     try:
-        supabase.storage.from_(bucket).remove([path])
+        with metrics.span("storage", "delete", f"{bucket}/{path}"):
+            get_backend().delete(bucket, [path])
+        storage_cache.invalidate(bucket, path)
         return True
     except Exception as e:
         print(f"[supa_delete_file] Error: {e}")
         return False
+
+# ----------------------------
+# Bulk download / upload
+# ----------------------------
+def _run_batch(fn, keys, max_workers: int = None):
+    # Build the backend (and its client) once so worker threads share it
+    get_backend()
+    results = {}
+
+    def run(key):
+        try:
+            data, attempts = _with_retries(fn, key)
+            return key, {"ok": True, "data": data, "error": None, "missing": False, "attempts": attempts}
+        except Exception as e:
+            # missing tells a confirmed-absent object apart from a failed read
+            return key, {"ok": False, "data": None, "error": str(e), "missing": isinstance(e, FileNotFoundError),
+                         "attempts": getattr(e, "attempts", 1)}
+
+    keys = list(keys)
+    if not keys:
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers or MAX_WORKERS, len(keys))) as pool:
+        for key, result in pool.map(metrics.bind(run), keys):
+            results[key] = result
+    return results
+
+
+def supa_download_many(bucket: str, paths, max_workers: int = None):
+    return _run_batch(lambda path: _cached_download(bucket, path), paths, max_workers)
+
+
+def supa_download_json_many(bucket: str, paths, max_workers: int = None):
+    parsed = {}
+    for path, result in supa_download_many(bucket, paths, max_workers).items():
+        try:
+            parsed[path] = json.loads(result["data"].decode("utf-8")) if result["ok"] else None
+        except ValueError:
+            parsed[path] = None
+    return parsed
+
+
+def supa_upload_many(bucket: str, items: dict, max_workers: int = None):
+    # items maps path -> bytes / str / DataFrame (CSV) / JSON-serialisable data
+    encoded = {path: _encode_payload(data) for path, data in items.items()}
+
+    def upload(path):
+        content, content_type = encoded[path]
+        return _upload_bytes(bucket, path, content, content_type)
+
+    results = _run_batch(upload, encoded, max_workers)
+    failed = [path for path, result in results.items() if not result["ok"]]
+    if failed:
+        print(f"[supa_upload_many] {len(failed)}/{len(results)} uploads failed, e.g. {failed[0]}: {results[failed[0]]['error']}")
+    return results
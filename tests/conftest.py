@@ -0,0 +1,17 @@
+import pytest
+
+from storage_backend import get_backend
+from storage_cache import storage_cache
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    # The local-disk backend under tmp_path, with an empty, zero-TTL cache
+    monkeypatch.setenv("BD_STORAGE_BACKEND", "local")
+    monkeypatch.setenv("BD_LOCAL_STORAGE_DIR", str(tmp_path / "storage"))
+    get_backend.cache_clear()
+    storage_cache.clear()
+    monkeypatch.setattr(storage_cache, "ttl", 0)
+    yield tmp_path / "storage"
+    get_backend.cache_clear()
+    storage_cache.clear()
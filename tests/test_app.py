@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in its own process: the app's storage, queue and cache singletons are
+# configured from the environment at import time
+RESCRAPED_APP = """
+import json
+from scrape_jobs import ingest_page
+from lead_catalog import LeadCatalog
+from streamlit.testing.v1 import AppTest
+
+lead = {
+    "id": "1", "first_name": "Asha", "last_name": "Rao", "name": "Asha Rao", "title": "Founder",
+    "email": "asha@example.com", "linkedin_url": "https://www.linkedin.com/in/asha-rao",
+    "organization": {"name": "Acme", "primary_domain": "acme.com"},
+}
+ingest_page({"date": "2026-01-01", "run_id": "r1", "offset": 0}, [lead])
+catalog = LeadCatalog("leads")
+catalog.refresh(force=True)
+catalog.update_entry("2026-01-01", "Asha Rao", persona={"persona_type": "Founder"})
+# Unchanged on the second scrape: links to 2026-01-01/Asha Rao
+ingest_page({"date": "2026-01-02", "run_id": "r1", "offset": 0}, [lead])
+catalog.refresh(force=True)
+
+at = AppTest.from_file("bd_engine_app.py", default_timeout=60).run()
+print(json.dumps({
+    "linked_path": catalog.get("2026-01-02", "Asha Rao")["path"],
+    "with_persona": [e["date"] for e in catalog.with_persona()],
+    "without_email_status": [e["date"] for e in catalog.without_email_status()],
+    "exceptions": [str(e.value) for e in at.exception],
+    "persona_rows": [t.key for t in at.toggle if (t.key or "").startswith("persona_open_")],
+}))
+"""
+
+
+def test_app_renders_a_lead_linked_by_an_unchanged_rescrape(tmp_path):
+    env = dict(os.environ, BD_STORAGE_BACKEND="local", BD_LOCAL_STORAGE_DIR=str(tmp_path / "storage"),
+               BD_JOB_QUEUE_PATH=str(tmp_path / "jobs.sqlite3"), BD_LEAD_STORE_DIR=str(tmp_path / "lead_store"),
+               BD_PHOTO_CACHE_DIR=str(tmp_path / "photos"), BD_CACHE_DIR=str(tmp_path / "cache"),
+               BD_RESPONSE_CACHE="0", BD_CACHE_TTL="0", BD_METRICS="0", PYTHONPATH=ROOT)
+    run = subprocess.run([sys.executable, "-c", RESCRAPED_APP], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, run.stderr
+    result = json.loads(run.stdout.strip().splitlines()[-1])
+
+    assert result["linked_path"] == "2026-01-01/Asha Rao"
+    assert result["with_persona"] == ["2026-01-01"]
+    assert result["without_email_status"] == ["2026-01-01"]
+    assert result["exceptions"] == []
+    assert result["persona_rows"] == ["persona_open_2026-01-01/Asha Rao"]
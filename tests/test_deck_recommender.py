@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cold_emails import choose_deck
+from deck_recommender import DeckRecommender, DEFAULT_DECK, CASE_STUDIES_CSV
+from lead_index import build_index_entry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def recommender():
+    return DeckRecommender(pd.read_csv(os.path.join(ROOT, CASE_STUDIES_CSV)))
+
+
+def test_industry_picks_the_matching_deck(recommender):
+    deck = recommender.recommend({"key_interests": ["growth"]}, industry="Banking")
+    assert deck["deck_name"] == "Banking and Finance" and deck["score"] > 0
+
+
+def test_no_overlap_falls_back_to_the_default_deck(recommender):
+    assert recommender.recommend({}, industry="zzz")["deck_name"] == DEFAULT_DECK
+
+
+def test_company_keywords_reach_the_query(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    lead = {"first_name": "Asha", "last_name": "Rao", "organization": {"keywords": ["skincare", "influencer marketing"]}}
+    entry = dict(build_index_entry("2026-01-01", "Asha Rao", lead), persona={"key_interests": []})
+    assert choose_deck(entry)["deck_name"] == "Skincare and Personal Care"
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from job_queue import JobQueue, JobCancelled, QUEUED, RUNNING, FAILED, CANCELLED
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claim_takes_highest_priority_once(queue):
+    low = queue.submit("email", {"n": 1})
+    high = queue.submit("persona", {"n": 2}, priority=5)
+    assert queue.submit("persona", {"n": 3}, priority=5, dedupe_key="k") == queue.submit("persona", dedupe_key="k")
+
+    job = queue.claim("w1")
+    assert job["id"] == high and job["status"] == RUNNING and job["attempts"] == 1
+    assert queue.claim("w2", kinds=["email"])["id"] == low
+
+
+def test_failed_job_is_retried_with_backoff_then_fails(queue):
+    job_id = queue.submit("email", max_attempts=2)
+    queue.claim("w1")
+    queue.fail(job_id, "503")
+    job = queue.get(job_id)
+    assert job["status"] == QUEUED and job["run_after"] > job["created_at"]
+    # Not claimable until its backoff has passed
+    assert queue.claim("w1") is None
+
+    queue._execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+    assert queue.claim("w1")["attempts"] == 2
+    queue.fail(job_id, "503")
+    assert queue.get(job_id)["status"] == FAILED
+
+
+def test_cancel(queue):
+    queued = queue.submit("email")
+    running = queue.submit("email")
+    queue._execute("UPDATE jobs SET priority = 1 WHERE id = ?", (running,))
+    queue.claim("w1")
+
+    queue.cancel(queued)
+    queue.cancel(running)
+    assert queue.get(queued)["status"] == CANCELLED
+    assert queue.get(running)["status"] == RUNNING and queue.heartbeat(running) is True
+    with pytest.raises(JobCancelled):
+        queue.report_progress(running, {"done": 1})
+    # A failure after a cancel is not retried
+    queue.fail(running, "stopped")
+    assert queue.get(running)["status"] == CANCELLED
+
+
+# A single-lead handler that checks progress between its steps stops there
+# once the job is cancelled, and the worker records it as cancelled
+WORKER = """
+import json, sys
+import worker
+from job_queue import job_queue
+
+steps = []
+
+def handler(payload, progress):
+    progress({"message": "Generating"})
+    steps.append("generated")
+    job_queue.cancel(job["id"])
+    progress({"message": "Saving", "cancellable": False})
+    steps.append("saved")
+    return {}
+
+worker.JOB_HANDLERS["email"] = handler
+job_id = job_queue.submit("email")
+job = job_queue.claim("w1")
+worker.run_job("w1", job)
+print(json.dumps({"status": job_queue.get(job_id)["status"], "steps": steps}))
+"""
+
+
+def test_worker_stops_a_cancelled_job_between_steps(tmp_path):
+    env = dict(os.environ, BD_JOB_QUEUE_PATH=str(tmp_path / "jobs.sqlite3"), BD_STORAGE_BACKEND="local",
+               BD_LOCAL_STORAGE_DIR=str(tmp_path / "storage"), BD_METRICS="0", PYTHONPATH=ROOT)
+    run = subprocess.run([sys.executable, "-c", WORKER], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert run.returncode == 0, run.stderr
+    result = json.loads(run.stdout.strip().splitlines()[-1])
+    assert result == {"status": CANCELLED, "steps": ["generated"]}
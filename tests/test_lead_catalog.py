@@ -0,0 +1,21 @@
+import lead_catalog
+from lead_catalog import LeadCatalog
+from lead_index import build_index_entry, save_lead_index
+
+LEAD = {"first_name": "Asha", "last_name": "Rao", "name": "Asha Rao", "title": "Founder",
+        "linkedin_url": "https://www.linkedin.com/in/asha-rao"}
+
+
+def _failing_list(bucket, prefix=""):
+    raise ConnectionError("storage unavailable")
+
+
+def test_refresh_keeps_cached_dates_when_listing_fails(local_storage, monkeypatch):
+    save_lead_index("2026-01-01", {"Asha Rao": build_index_entry("2026-01-01", "Asha Rao", LEAD)})
+    catalog = LeadCatalog("leads")
+    assert catalog.refresh(force=True) == ["2026-01-01"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(lead_catalog, "supa_list_all", _failing_list)
+        assert catalog.refresh(force=True) == []
+    assert catalog.get("2026-01-01", "Asha Rao")["name"] == "Asha Rao"
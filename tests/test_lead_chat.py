@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+import lead_chat
+from lead_chat import append_chat_turn, build_chat_context, fold_chat_history, load_chat, load_chat_summary
+from llm_utils import message_tokens, estimate_tokens
+
+ENTRY = {"name": "Asha Rao", "persona": {"persona_type": "Founder"}}
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # 100-character messages are 29 tokens each, with no tiktoken download
+    monkeypatch.setattr(lead_chat, "count_message_tokens", lambda messages, model=None: message_tokens(messages))
+    monkeypatch.setattr(lead_chat, "count_tokens", lambda text, model=None: estimate_tokens(text))
+
+
+def _messages(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:03d}" + "x" * 97} for i in range(n)]
+
+
+def test_context_keeps_the_newest_messages_that_fit():
+    messages = _messages(10)
+    prompt = build_chat_context(ENTRY, messages, {"summary": "", "summarized_until": 0}, budget=100)
+    assert prompt[0]["role"] == "system"
+    assert prompt[1:] == messages[-3:]
+
+
+def test_context_starts_after_the_summary():
+    messages = _messages(10)
+    prompt = build_chat_context(ENTRY, messages, {"summary": "Asked about pricing", "summarized_until": 8}, budget=1000)
+    assert "Asked about pricing" in prompt[1]["content"]
+    assert prompt[2:] == messages[8:]
+
+
+def test_fold_summarizes_the_oldest_messages_down_to_half_the_budget(local_storage, monkeypatch):
+    summarized = []
+
+    def fake_completion(messages, **kwargs):
+        summarized.append(messages[0]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" Pricing objection. "))])
+
+    monkeypatch.setattr(lead_chat, "chat_completion", fake_completion)
+    messages = _messages(10)
+    empty = {"summary": "", "summarized_until": 0}
+
+    assert fold_chat_history("leads", "2026-01-01/Asha Rao", ENTRY, messages, empty, budget=1000) is empty
+    summary = fold_chat_history("leads", "2026-01-01/Asha Rao", ENTRY, messages, empty, budget=200)
+    # 290 tokens of history; folding the oldest 7 leaves 87, under half the budget
+    assert summary["summarized_until"] == 7 and summary["summary"] == "Pricing objection."
+    assert len(summarized) == 1 and "000" in summarized[0]
+    assert load_chat_summary("leads", "2026-01-01/Asha Rao") == summary
+
+
+def test_appends_at_the_same_number_take_the_next_one(local_storage):
+    first = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    second = [{"role": "user", "content": "Pricing?"}, {"role": "assistant", "content": "Depends"}]
+    # Both sessions loaded the chat when it was empty, so both try segment 1
+    assert append_chat_turn("leads", "2026-01-01/Asha Rao", 1, first) == 2
+    assert append_chat_turn("leads", "2026-01-01/Asha Rao", 1, second) == 3
+    assert load_chat("leads", "2026-01-01/Asha Rao") == (first + second, 3)
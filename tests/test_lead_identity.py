@@ -0,0 +1,37 @@
+from lead_identity import NEW, CHANGED, UNCHANGED, resolve_leads, unique_folder
+
+
+def lead(name, linkedin=None, title="Founder"):
+    first, last = name.split()
+    return {"first_name": first, "last_name": last, "name": name, "title": title, "linkedin_url": linkedin}
+
+
+def empty_identity():
+    return {"version": 1, "leads": {}}
+
+
+def test_unique_folder_reuses_only_the_same_key():
+    taken = {"Asha Rao": "li:asha"}
+    assert unique_folder("Asha Rao", "li:asha", taken) == "Asha Rao"
+    assert unique_folder("Asha Rao", "li:other", taken) == "Asha Rao (2)"
+
+
+def test_keyless_namesakes_get_their_own_folders():
+    taken = {}
+    resolved = resolve_leads(empty_identity(), "2026-01-01", [lead("Asha Rao"), lead("Asha Rao")], taken)
+    assert [item["folder"] for item in resolved] == ["Asha Rao", "Asha Rao (2)"]
+    assert all(item["status"] == NEW for item in resolved)
+
+
+def test_rescrape_links_unchanged_and_rewrites_changed():
+    identity = empty_identity()
+    first = [lead("Asha Rao", "https://www.linkedin.com/in/asha"), lead("Ravi Iyer", "https://www.linkedin.com/in/ravi")]
+    resolve_leads(identity, "2026-01-01", first, {})
+
+    second = [first[0], lead("Ravi Iyer", "https://www.linkedin.com/in/ravi", title="CEO")]
+    resolved = resolve_leads(identity, "2026-01-02", second, {})
+    assert [(item["status"], item["path"]) for item in resolved] == [
+        (UNCHANGED, "2026-01-01/Asha Rao"),
+        (CHANGED, "2026-01-02/Ravi Iyer"),
+    ]
+    assert identity["leads"][resolved[0]["key"]]["dates"] == ["2026-01-01", "2026-01-02"]
@@ -0,0 +1,60 @@
+import pytest
+
+import lead_index
+import lead_catalog
+from lead_catalog import LeadCatalog
+from lead_index import build_index_entry, load_lead_index, rebuild_lead_index, save_lead_index, update_lead_index_many
+from supabase_utils import supa_upload_json
+
+LEAD = {"first_name": "Asha", "last_name": "Rao", "name": "Asha Rao", "title": "Founder",
+        "linkedin_url": "https://www.linkedin.com/in/asha-rao"}
+
+
+def test_rebuild_backfills_a_missing_index(local_storage):
+    supa_upload_json("leads", "2026-01-01/Asha Rao/lead.json", LEAD)
+    index = rebuild_lead_index("2026-01-01")
+    assert list(index["leads"]) == ["Asha Rao"]
+    assert load_lead_index("2026-01-01")["leads"]["Asha Rao"]["name"] == "Asha Rao"
+
+
+def test_rebuild_keeps_an_existing_index(local_storage):
+    # A linked entry has no folder under its date; a rescan would drop it
+    linked = dict(build_index_entry("2026-01-02", "Asha Rao", LEAD), path="2026-01-01/Asha Rao")
+    save_lead_index("2026-01-02", {"Asha Rao": linked})
+    index = rebuild_lead_index("2026-01-02")
+    assert index["leads"]["Asha Rao"]["path"] == "2026-01-01/Asha Rao"
+
+
+def test_read_error_is_not_treated_as_missing(local_storage, monkeypatch):
+    linked = dict(build_index_entry("2026-01-02", "Asha Rao", LEAD), path="2026-01-01/Asha Rao")
+    save_lead_index("2026-01-02", {"Asha Rao": linked})
+    catalog = LeadCatalog("leads")
+    catalog.reload("2026-01-02")
+
+    failed = {"ok": False, "data": None, "error": "503", "missing": False, "attempts": 3}
+    with monkeypatch.context() as patch:
+        patch.setattr(lead_index, "supa_download_many", lambda bucket, paths: {p: failed for p in paths})
+        patch.setattr(lead_catalog, "supa_download_many", lambda bucket, paths: {p: failed for p in paths})
+        with pytest.raises(RuntimeError):
+            rebuild_lead_index("2026-01-02")
+        with pytest.raises(RuntimeError):
+            update_lead_index_many("2026-01-02", {"Asha Rao": {"persona": {"persona_type": "Founder"}}})
+        # The catalog keeps what it had instead of rebuilding
+        catalog.reload("2026-01-02")
+
+    assert catalog.get("2026-01-02", "Asha Rao")["path"] == "2026-01-01/Asha Rao"
+    assert load_lead_index("2026-01-02", fresh=True)["leads"]["Asha Rao"]["path"] == "2026-01-01/Asha Rao"
+
+
+def test_failed_listing_does_not_save_an_empty_index(local_storage, monkeypatch):
+    supa_upload_json("leads", "2026-01-01/Asha Rao/lead.json", LEAD)
+
+    def failing_list(bucket, prefix=""):
+        raise ConnectionError("storage unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(lead_index, "supa_list_all", failing_list)
+        with pytest.raises(RuntimeError):
+            rebuild_lead_index("2026-01-01")
+    assert load_lead_index("2026-01-01", fresh=True) is None
+    assert list(rebuild_lead_index("2026-01-01")["leads"]) == ["Asha Rao"]
@@ -0,0 +1,44 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each process takes the same lease_lock repeatedly and logs entering and
+# leaving the critical section; the log must never show two holders at once
+CONTENDER = """
+import os, sys, time
+from lead_lease import lease_lock
+log, rounds = sys.argv[1], int(sys.argv[2])
+for _ in range(rounds):
+    with lease_lock("leads", "2026-01-01/_index", "index", timeout=120, ttl=30, poll=0.01):
+        with open(log, "a") as f:
+            f.write(f"enter {os.getpid()}\\n")
+        time.sleep(0.005)
+        with open(log, "a") as f:
+            f.write(f"exit {os.getpid()}\\n")
+"""
+
+
+def test_lease_lock_is_exclusive_across_processes(tmp_path):
+    log = tmp_path / "sections.log"
+    env = dict(os.environ, BD_STORAGE_BACKEND="local", BD_LOCAL_STORAGE_DIR=str(tmp_path / "storage"),
+               BD_CACHE_TTL="0", BD_METRICS="0", PYTHONPATH=ROOT)
+    processes = [
+        subprocess.Popen([sys.executable, "-c", CONTENDER, str(log), "15"], cwd=ROOT, env=env,
+                         stdout=subprocess.DEVNULL)
+        for _ in range(8)
+    ]
+    assert all(p.wait(timeout=300) == 0 for p in processes)
+
+    lines = log.read_text().split()
+    events = list(zip(lines[::2], lines[1::2]))
+    assert len(events) == 2 * 8 * 15
+    holder = None
+    for event, pid in events:
+        if event == "enter":
+            assert holder is None, f"{pid} entered while {holder} held the lock"
+            holder = pid
+        else:
+            assert holder == pid
+            holder = None
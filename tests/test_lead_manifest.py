@@ -0,0 +1,47 @@
+import pytest
+
+import lead_manifest
+from lead_catalog import LeadCatalog
+from lead_index import build_index_entry, save_lead_index
+from lead_manifest import diff_objects, load_manifest, refresh_manifest
+from supabase_utils import supa_upload_json
+
+LEAD = {"first_name": "Asha", "last_name": "Rao", "name": "Asha Rao", "linkedin_url": "https://www.linkedin.com/in/asha-rao"}
+
+
+def _failing_list(bucket, prefix=""):
+    raise ConnectionError("storage unavailable")
+
+
+def test_diff_objects():
+    old = {"a": {"size": 1}, "b": {"size": 2}, "c": {"size": 3}}
+    new = {"a": {"size": 1}, "b": {"size": 5}, "d": {"size": 4}}
+    assert diff_objects(old, new) == {"added": ["d"], "removed": ["c"], "changed": ["b"]}
+
+
+def test_refresh_reports_only_what_changed(local_storage):
+    supa_upload_json("leads", "2026-01-01/Asha Rao/lead.json", LEAD)
+    _, diff, stats = refresh_manifest()
+    assert diff["added"] == ["2026-01-01/Asha Rao/lead.json"]
+
+    _, diff, stats = refresh_manifest()
+    assert not any(diff.values()) and stats["rewalked"] == 0
+
+    supa_upload_json("leads", "2026-01-02/Ravi Iyer/lead.json", LEAD)
+    _, diff, stats = refresh_manifest()
+    assert diff == {"added": ["2026-01-02/Ravi Iyer/lead.json"], "removed": [], "changed": []}
+    assert stats["rewalked"] == 1
+
+
+def test_failed_listing_keeps_manifest_and_cached_dates(local_storage, monkeypatch):
+    save_lead_index("2026-01-01", {"Asha Rao": build_index_entry("2026-01-01", "Asha Rao", LEAD)})
+    catalog = LeadCatalog("leads")
+    assert catalog.sync_with_manifest() == ["2026-01-01"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(lead_manifest, "supa_list_all", _failing_list)
+        with pytest.raises(ConnectionError):
+            refresh_manifest()
+        assert catalog.sync_with_manifest() == []
+    assert list(load_manifest()["dates"]) == ["2026-01-01"]
+    assert catalog.get("2026-01-01", "Asha Rao")["name"] == "Asha Rao"
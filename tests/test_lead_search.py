@@ -0,0 +1,29 @@
+from lead_search import LeadSearchIndex
+
+ENTRIES = [
+    {"name": "Asha Rao", "email": "asha@acme.com", "company": "Acme", "title": "Founder", "skills": ["Growth"],
+     "seniority": "founder", "industry": "retail", "departments": ["master_marketing"], "city": "Mumbai"},
+    {"name": "Ravi Iyer", "email": "ravi@beta.in", "company": "Beta Foods", "title": "CMO", "skills": ["Brand"],
+     "seniority": "c_suite", "industry": "food", "departments": ["master_marketing"], "city": "Bangalore"},
+    {"name": "Meera Shah", "email": "meera@acme.com", "company": "Acme", "title": "Head of Growth",
+     "seniority": "head", "industry": "retail", "city": "Mumbai"},
+]
+
+
+def test_every_query_term_must_prefix_match():
+    index = LeadSearchIndex(ENTRIES)
+    names = lambda query, filters=None: [e["name"] for e in index.search(query, filters)[0]]
+    assert names("acm gro") == ["Asha Rao", "Meera Shah"]
+    assert names("acme cmo") == []
+    assert names("ravi@beta.in") == ["Ravi Iyer"]
+    assert names("") == ["Asha Rao", "Ravi Iyer", "Meera Shah"]
+
+
+def test_facet_counts_ignore_their_own_selection():
+    index = LeadSearchIndex(ENTRIES)
+    results, counts = index.search("", {"city": ["Mumbai"], "seniority": ["head"]})
+    assert [e["name"] for e in results] == ["Meera Shah"]
+    # Seniority counts apply the city filter but not the seniority one
+    assert counts["seniority"] == {"founder": 1, "head": 1}
+    assert counts["city"] == {"Mumbai": 1}
+    assert counts["departments"] == {}
@@ -0,0 +1,37 @@
+from cold_emails import build_email_status
+from lead_store import lead_record
+
+LEAD = {
+    "first_name": "Asha", "last_name": "Rao", "name": "Asha Rao", "title": "Founder",
+    "email": "asha@example.com", "linkedin_url": "https://www.linkedin.com/in/asha-rao",
+    "organization": {"name": "Acme", "primary_domain": "acme.com", "estimated_num_employees": 40},
+}
+DECK = {"deck_name": "D2C Growth", "deck_url": "https://example.com/deck", "deck_summary": "Growth playbook"}
+
+
+def test_lead_record_reads_deck_from_saved_email_status():
+    entry = {"persona": {"persona_type": "Founder"}, "email_status": build_email_status("Hi Asha", DECK)}
+    record = lead_record(LEAD, "Asha Rao", "2026-01-01", entry)
+    assert record["has_email_status"] is True
+    assert record["deck_name"] == "D2C Growth"
+    assert record["persona_type"] == "Founder"
+
+
+def test_lead_record_without_enrichment():
+    record = lead_record(LEAD, "Asha Rao", "2026-01-01")
+    assert record["has_email_status"] is False
+    assert record["deck_name"] is None
+
+
+def test_source_filter_excludes_a_csv_imported_for_the_same_date(local_storage):
+    import pandas as pd
+    from lead_store import write_partition, csv_records, query_df, SCRAPE_SOURCE
+
+    store_dir = str(local_storage.parent / "lead_store")
+    write_partition("2026-01-01", [lead_record(LEAD, "Asha Rao", "2026-01-01")], store_dir=store_dir)
+    export = pd.DataFrame([{"first_name": "Asha", "last_name": "Rao", "linkedin_url": LEAD["linkedin_url"], "seniority": "founder"}])
+    write_partition("2026-01-01", csv_records(export, {}, "apollo_export"), "apollo_export", store_dir=store_dir)
+
+    assert len(query_df(dates=["2026-01-01"], store_dir=store_dir)) == 2
+    scraped = query_df(columns=["lead_key"], filters={"source": SCRAPE_SOURCE}, dates=["2026-01-01"], store_dir=store_dir)
+    assert list(scraped["lead_key"]) == [lead_record(LEAD)["lead_key"]]
@@ -0,0 +1,27 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics
+
+
+def test_since_with_scope_keeps_sessions_apart():
+    metrics = Metrics()
+    mark = metrics.mark()
+
+    def session(name):
+        metrics.set_scope(name)
+        with metrics.span("storage", "get", name):
+            pass
+        # Pool threads record under the scope of the thread that bound them
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(metrics.bind(lambda i: metrics.event("storage", "list", f"{name}/{i}")), range(3)))
+
+    threads = [threading.Thread(target=session, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(metrics.since(mark)) == 8
+    spans = metrics.since(mark, "a")
+    assert len(spans) == 4 and all(span["target"].startswith("a") for span in spans)
@@ -0,0 +1,48 @@
+import llm_utils
+from llm_utils import RateLimiter, parse_retry_after
+
+
+class FakeClock:
+    # time.time / time.sleep for llm_utils; sleeping advances the clock
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_rpm_window_makes_the_next_call_wait(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_utils, "time", clock)
+    limiter = RateLimiter(rpm=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.slept == []
+    limiter.acquire()
+    assert sum(clock.slept) >= 60
+
+
+def test_tpm_budget_and_pause(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_utils, "time", clock)
+    limiter = RateLimiter(tpm=1000)
+    limiter.acquire(800)
+    limiter.acquire(300)
+    assert sum(clock.slept) >= 60
+
+    clock.slept.clear()
+    limiter.pause(5)
+    limiter.acquire(10)
+    assert 5 <= sum(clock.slept) < 6 and limiter.throttled == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    assert parse_retry_after({"retry-after": "3"}) == 3.0
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,53 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import relevance_agent
+from relevance_agent import RelevanceClient, fetch_pain_points
+from response_cache import response_cache
+
+
+class FakeAgent(BaseHTTPRequestHandler):
+    # Answers from the server's queue of (status, headers, body) responses
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        status, headers, body = self.server.responses.pop(0)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAgent)
+    server.responses = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("RELEVANCE_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(response_cache, "enabled", False)
+    yield server
+    server.shutdown()
+
+
+def test_async_429_waits_for_retry_after(agent):
+    agent.responses = [(429, {"Retry-After": "0.5"}, {}), (200, {}, {"output": "Slow onboarding"})]
+    client = RelevanceClient(auth_token="t", retries=2, backoff=0.01)
+    started = time.time()
+    [result] = asyncio.run(client.fetch_pain_points_many(["Acme"]))
+    assert result["ok"] and result["output"] == "Slow onboarding"
+    assert time.time() - started >= 0.5
+
+
+def test_fetch_pain_points_still_returns_a_string(agent, monkeypatch):
+    monkeypatch.setattr(relevance_agent, "get_relevance_client", lambda: RelevanceClient(auth_token="t", retries=0))
+    agent.responses = [(200, {}, {"output": "Slow onboarding"}), (400, {}, {"error": "bad input"})]
+    assert fetch_pain_points("Acme") == "Slow onboarding"
+    assert fetch_pain_points("Acme").startswith("Error fetching pain points:")
@@ -0,0 +1,48 @@
+import time
+
+from response_cache import ResponseCache, make_key
+
+
+def test_make_key_ignores_whitespace_but_not_temperature():
+    key = make_key("email", "gpt-4", [{"role": "user", "content": "Hi  Asha\n"}], 0.7)
+    assert key == make_key("email", "gpt-4", [{"role": "user", "content": "Hi Asha"}], 0.7)
+    assert key != make_key("email", "gpt-4", [{"role": "user", "content": "Hi Asha"}], 0)
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=250)
+    for key in ("a", "b"):
+        cache.set("email", key, "x" * 100)
+        time.sleep(0.01)
+    # Reading a makes b the least recently used
+    assert cache.get("email", "a") == "x" * 100
+    time.sleep(0.01)
+    cache.set("email", "c", "x" * 100)
+    assert cache.get("email", "b") is None
+    assert cache.get("email", "a") is not None and cache.get("email", "c") is not None
+
+
+def test_expired_rows_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=10_000, ttls={"email": -1})
+    cache.set("email", "a", "reply")
+    assert cache.get("email", "a") is None
+    assert cache.stats["email"] == {"hits": 0, "misses": 1}
+
+
+def test_cached_does_not_store_a_response_that_fails_validation(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=10_000)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "not json"
+
+    def validate(value):
+        raise ValueError(value)
+
+    for _ in range(2):
+        try:
+            cache.cached("persona", "gpt-4", "prompt", compute, validate=validate)
+        except ValueError:
+            pass
+    assert len(calls) == 2
@@ -0,0 +1,27 @@
+import io
+
+import pandas as pd
+
+import lead_store
+from scrape_jobs import ingest_page, write_combined_csv, load_scrape_job
+from supabase_utils import supa_download_many
+
+PAGE_1 = [{"first_name": "Asha", "last_name": "Rao", "name": "Asha Rao", "linkedin_url": "https://www.linkedin.com/in/asha-rao"},
+          {"first_name": "Ravi", "last_name": "Iyer", "name": "Ravi Iyer", "linkedin_url": "https://www.linkedin.com/in/ravi-iyer"}]
+PAGE_2 = [{"first_name": "Meera", "last_name": "Shah", "name": "Meera Shah", "linkedin_url": "https://www.linkedin.com/in/meera-shah"}]
+
+
+def test_pages_write_parts_and_combined_csv_is_written_once(local_storage, monkeypatch):
+    monkeypatch.setattr(lead_store, "STORE_DIR", str(local_storage.parent / "lead_store"))
+    job = {"date": "2026-01-01", "run_id": "r1", "offset": 0, "status": "running"}
+    job = ingest_page(job, PAGE_1)
+    job = ingest_page(job, PAGE_2)
+
+    # Rows live in part files, not in the job document
+    assert "rows" not in load_scrape_job("2026-01-01")
+    assert supa_download_many("leads", ["2026-01-01/combined.csv"])["2026-01-01/combined.csv"]["missing"]
+
+    write_combined_csv(job)
+    result = supa_download_many("leads", ["2026-01-01/combined.csv"])["2026-01-01/combined.csv"]
+    combined = pd.read_csv(io.BytesIO(result["data"]))
+    assert list(combined["Full Name"]) == ["Asha Rao", "Ravi Iyer", "Meera Shah"]
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from storage_cache import StorageCache, storage_cache
+from supabase_utils import supa_upload_json, supa_download_json
+
+
+def test_lru_stays_under_its_byte_cap():
+    cache = StorageCache(max_bytes=250, ttl=60)
+    cache.put("leads", "a", b"x" * 100)
+    cache.put("leads", "b", b"x" * 100)
+    cache.get("leads", "a")
+    cache.put("leads", "c", b"x" * 100)
+    assert cache.get("leads", "b") is None
+    assert cache.get("leads", "a") is not None and cache.get("leads", "c") is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_counts_from_many_threads_are_not_lost():
+    cache = StorageCache(max_bytes=1000, ttl=60)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cache.count("hits"), range(2000)))
+    assert cache.stats["hits"] == 2000
+
+
+def test_stale_entry_is_revalidated_by_etag(local_storage, monkeypatch):
+    supa_upload_json("leads", "2026-01-01/index.json", {"v": 1})
+    storage_cache.clear()
+    monkeypatch.setattr(storage_cache, "stats", {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0})
+
+    monkeypatch.setattr(storage_cache, "ttl", 60)
+    assert supa_download_json("leads", "2026-01-01/index.json") == {"v": 1}
+    assert supa_download_json("leads", "2026-01-01/index.json") == {"v": 1}
+    assert (storage_cache.stats["misses"], storage_cache.stats["hits"]) == (1, 1)
+
+    # Past the TTL, an unchanged object costs a conditional request only
+    monkeypatch.setattr(storage_cache, "ttl", 0)
+    assert supa_download_json("leads", "2026-01-01/index.json") == {"v": 1}
+    assert storage_cache.stats["revalidated"] == 1
+
+    # Written by another process: the ETag no longer matches
+    (local_storage / "leads" / "2026-01-01" / "index.json").write_text('{"v": 22}')
+    assert supa_download_json("leads", "2026-01-01/index.json") == {"v": 22}
+    assert storage_cache.stats["revalidated"] == 1
@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import traceback
+import multiprocessing
+from functools import lru_cache
+
+# Other processes write the same lead indexes, so every storage read is
+# revalidated (a cheap 304 when nothing changed) instead of trusting the TTL
+os.environ.setdefault("BD_CACHE_TTL", "0")
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from job_queue import job_queue, JobCancelled, HEARTBEAT_INTERVAL
+from lead_lease import LeaseHeld, acquire_lease
+from metrics import metrics
+
+# Runs the jobs the app submits to job_queue: Apify scrapes and persona /
+# cold-email generation, one lead or a whole batch at a time.
+#
+#   python worker.py                      # one worker process
+#   python worker.py --processes 4        # four, sharing the queue
+#   python worker.py --kinds scrape       # only scrapes
+#   python worker.py --once               # drain the queue and exit
+BUCKET = "leads"
+MAX_ERRORS_IN_RESULT = 20
+
+
+@lru_cache(maxsize=1)
+def get_catalog():
+    from lead_catalog import LeadCatalog
+    return LeadCatalog(BUCKET)
+
+
+def _batch_progress(stats: dict):
+    return {
+        "done": stats["done"] + stats["failed"] + stats["skipped"],
+        "total": stats["total"],
+        "message": f"{stats['done']} done, {stats['failed']} failed, {stats['skipped']} claimed by other processes, "
+                   f"{stats.get('per_minute', 0):.1f}/min, {stats['tokens']} tokens"
+    }
+
+
+def _batch_result(stats: dict, dates):
+    errors = dict(list(stats["errors"].items())[:MAX_ERRORS_IN_RESULT])
+    return dict(stats, errors=errors, dates=sorted(dates))
+
+
+def _catalog_entry(date: str, folder: str):
+    catalog = get_catalog()
+    catalog.reload(date)
+    entry = catalog.get(date, folder)
+    if entry is None:
+        raise ValueError(f"Lead {date}/{folder} not found")
+    return catalog, entry
+
+
+# ----------------------------
+# Job handlers: (payload, progress) -> result
+# ----------------------------
+def run_scrape(payload: dict, progress):
+    from pipeline import run_scrape_stage
+
+    def report(job):
+        dedup = job.get("dedup", {})
+        progress({
+            "done": job["offset"],
+            "total": job.get("total_records"),
+            "message": f"Apify run {job.get('run_status', '')}: {job['offset']} leads ingested "
+                       f"({dedup.get('new', 0)} new, {dedup.get('changed', 0)} changed, {dedup.get('unchanged', 0)} unchanged)"
+        })
+
+    # A retried or resumed job continues the same Apify run; a finished one is
+    # scraped again, since the app only submits a scrape when asked to
+    result = run_scrape_stage(
+        payload["date"], payload["search_url"], payload.get("total_records", 500), on_progress=report, rerun=True, bucket=BUCKET
+    )
+    return dict(result, dates=[payload["date"]])
+
+
+def run_persona(payload: dict, progress):
+    from supabase_utils import supa_download_json
+    from personas import generate_persona
+
+    catalog, entry = _catalog_entry(payload["date"], payload["folder"])
+    if entry.get("has_persona"):
+        return {"dates": [payload["date"]], "skipped": True}
+    lead = supa_download_json(BUCKET, f"{entry['path']}/lead.json")
+    if not lead:
+        raise ValueError("lead.json not found")
+    # Held elsewhere (another replica's worker): the retry finds it built
+    lease = acquire_lease(BUCKET, entry["path"], "persona")
+    if lease is None:
+        raise LeaseHeld("Another process is building this persona")
+    with lease:
+        progress({"message": "Generating persona"})
+        persona = supa_download_json(BUCKET, f"{entry['path']}/persona.json", fresh=True)
+        tokens = 0
+        if not persona:
+            # Last chance to cancel; once saved, the persona is kept
+            persona, tokens = generate_persona(
+                lead, entry["path"], bucket=BUCKET, lease=lease,
+                before_save=lambda: progress({"message": "Saving persona", "cancellable": False})
+            )
+    catalog.update_entry(payload["date"], payload["folder"], persona=persona)
+    return {"dates": [payload["date"]], "tokens": tokens}
+
+
+def run_persona_batch(payload: dict, progress):
+    from personas import build_personas_batch
+
+    catalog = get_catalog()
+    catalog.reload(payload["date"])
+    stats = build_personas_batch(
+        catalog, payload["date"], payload.get("concurrency", 4), payload.get("rpm"), payload.get("tpm"),
+        on_progress=lambda stats: progress(_batch_progress(stats))
+    )
+    return _batch_result(stats, [payload["date"]])
+
+
+def run_email(payload: dict, progress):
+    from supabase_utils import supa_download_json
+    from cold_emails import generate_cold_email, save_cold_emails
+
+    catalog, entry = _catalog_entry(payload["date"], payload["folder"])
+    if entry.get("has_email_status"):
+        return {"dates": [payload["date"]], "skipped": True}
+    if not entry.get("persona"):
+        raise ValueError("Lead has no persona yet")
+    lease = acquire_lease(BUCKET, entry["path"], "email")
+    if lease is None:
+        raise LeaseHeld("Another process is writing this email")
+    with lease:
+        progress({"message": "Writing cold email"})
+        email_status = supa_download_json(BUCKET, f"{entry['path']}/email_status.json", fresh=True)
+        tokens = 0
+        if not email_status:
+            email_status, tokens = generate_cold_email(entry)
+            if not lease.held():
+                raise LeaseHeld(f"Lease on {entry['path']} was lost; email discarded")
+        # Last chance to cancel; once saved, the email is kept
+        progress({"message": "Saving cold email", "cancellable": False})
+        failed = save_cold_emails(catalog, [(entry, email_status)])
+    if failed:
+        raise RuntimeError(f"Failed to upload {', '.join(failed)}")
+    return {"dates": [payload["date"]], "tokens": tokens}
+
+
+def run_email_batch(payload: dict, progress):
+    from cold_emails import generate_emails_batch
+
+    catalog = get_catalog()
+    date = payload.get("date")
+    if date:
+        catalog.reload(date)
+    else:
+        catalog.refresh(force=True)
+    dates = {e["date"] for e in catalog.without_email_status(date)}
+    stats = generate_emails_batch(
+        catalog, date, payload.get("concurrency", 4), payload.get("rpm"), payload.get("tpm"),
+        on_progress=lambda stats: progress(_batch_progress(stats))
+    )
+    return _batch_result(stats, dates)
+
+
+JOB_HANDLERS = {
+    "scrape": run_scrape,
+    "persona": run_persona,
+    "persona_batch": run_persona_batch,
+    "email": run_email,
+    "email_batch": run_email_batch,
+}
+
+
+# ----------------------------
+# Worker loop
+# ----------------------------
+def run_job(name: str, job: dict):
+    handler = JOB_HANDLERS.get(job["kind"])
+    if handler is None:
+        job_queue.fail(job["id"], f"Unknown job kind: {job['kind']}", retry=False)
+        return
+
+    # Heartbeats come from a side thread, so a handler blocked on a slow call
+    # (or sleeping between Apify polls) is not mistaken for a dead worker.
+    # A cancel seen there stops the handler at its next progress report.
+    done = threading.Event()
+    cancel = threading.Event()
+
+    def heartbeat():
+        while not done.wait(HEARTBEAT_INTERVAL):
+            if job_queue.heartbeat(job["id"]):
+                cancel.set()
+            job_queue.worker_heartbeat(name, job["id"])
+
+    def progress(info):
+        if cancel.is_set():
+            raise JobCancelled()
+        job_queue.report_progress(job["id"], info)
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    job_queue.worker_heartbeat(name, job["id"])
+    print(f"[worker {name}] job {job['id']} {job['kind']} started (attempt {job['attempts']}/{job['max_attempts']})")
+    try:
+        with metrics.span("job", job["kind"], str(job["id"])):
+            result = handler(job["payload"] or {}, progress)
+        job_queue.complete(job["id"], result)
+        print(f"[worker {name}] job {job['id']} {job['kind']} succeeded")
+    except JobCancelled:
+        job_queue.cancelled(job["id"])
+        print(f"[worker {name}] job {job['id']} {job['kind']} cancelled")
+    except (KeyboardInterrupt, SystemExit):
+        job_queue.release(job["id"])
+        print(f"[worker {name}] job {job['id']} {job['kind']} handed back to the queue")
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        job_queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        print(f"[worker {name}] job {job['id']} {job['kind']} failed: {e}")
+    finally:
+        done.set()
+        job_queue.worker_heartbeat(name)
+
+
+def worker_main(kinds=None, poll_interval: float = 2, once: bool = False):
+    # SIGTERM stops the worker like Ctrl-C: the running job goes back to the queue
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    job_queue.register_worker(name)
+    if not kinds or {"email", "email_batch"} & set(kinds):
+        # The deck index is built once at startup, not inside the first email job
+        from deck_recommender import get_deck_recommender
+        get_deck_recommender()
+    print(f"[worker {name}] waiting for {', '.join(kinds) if kinds else 'all'} jobs")
+    try:
+        while True:
+            job_queue.requeue_stale()
+            job = job_queue.claim(name, kinds)
+            if job is None:
+                if once:
+                    break
+                job_queue.worker_heartbeat(name)
+                time.sleep(poll_interval)
+                continue
+            run_job(name, job)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        job_queue.unregister_worker(name)
+        print(f"[worker {name}] stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BD Engine background worker")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to run")
+    parser.add_argument("--kinds", help=f"Comma-separated job kinds to run ({', '.join(JOB_HANDLERS)}); default all")
+    parser.add_argument("--poll-interval", type=float, default=2, help="Seconds between queue polls when idle")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()] if args.kinds else None
+    if args.processes <= 1:
+        worker_main(kinds, args.poll_interval, args.once)
+        return
+
+    processes = [
+        multiprocessing.Process(target=worker_main, args=(kinds, args.poll_interval, args.once), daemon=False)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Children got the same Ctrl-C; wait for them to hand back their jobs
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()